@@ -0,0 +1,112 @@
+#!/usr/bin/env python2
+"""Benchmark of the whole event status lifecycle executed by LocalScheduler
+
+Events are saved to datastore stub, weekly scheduling job creates tasks changing
+their status to present, virtual clock is moved hour by hour and all status tasks
+are executed in process, at the end throughput and latency of tasks are printed.
+
+Usage:
+    python benchmarks/event_lifecycle.py <PATH FROM GCLOUD INFO> --events 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def setup_environment(sdk_path):
+    """Make google.appengine modules and libraries of the project importable"""
+    from runner import fixup_paths
+    if os.path.exists(os.path.join(sdk_path, 'platform/google_appengine')):
+        sdk_path = os.path.join(sdk_path, 'platform/google_appengine')
+    fixup_paths(sdk_path)
+    import dev_appserver
+    dev_appserver.fix_sys_path()
+    import appengine_config
+    (appengine_config)
+
+
+def create_events(number, start, days):
+    """Save number of events starting during days after start and return time it took"""
+    from google.appengine.ext import ndb
+    from ewentts.models import Event, User
+
+    organiser = User(id="benchmark", user_names=["Benchmark", "User"], user_email="benchmark@ewentts.com")
+    organiser.put()
+    started = time.time()
+    step = timedelta(days=days).total_seconds() / number
+    events = []
+    for i in range(number):
+        start_datetime = start + timedelta(seconds=60 + i * step)
+        events += [Event(event_name="Event {}".format(i),
+                         status="future",
+                         start_datetime=start_datetime,
+                         end_datetime=start_datetime + timedelta(hours=2),
+                         latitude=49.0 + (i % 1000) / 1000.0,
+                         longitude=15.0 + (i % 997) / 1000.0,
+                         private=False,
+                         organiser=organiser.key)]
+        if len(events) == 500:
+            ndb.put_multi(events)
+            events = []
+    ndb.put_multi(events)
+    return time.time() - started
+
+
+def main(sdk_path, number, days):
+    setup_environment(sdk_path)
+    from google.appengine.datastore import datastore_stub_util
+    from google.appengine.ext import testbed
+    from ewentts import create_app
+    from ewentts.models import Event
+    from ewentts.scheduler import LocalScheduler, ScheduledTask, set_scheduler
+    from ewentts.search.index import InMemoryBackend, set_backend
+
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.setup_env(overwrite=True)
+    policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1)
+    bed.init_datastore_v3_stub(consistency_policy=policy)
+    bed.init_memcache_stub()
+
+    start = datetime.utcnow()
+    scheduler = LocalScheduler.for_app(create_app(), now=start)
+    set_scheduler(scheduler)
+    set_backend(InMemoryBackend())
+
+    print("creating {} events".format(number))
+    print("events created in {:.1f} s".format(create_events(number, start, days)))
+
+    started = time.time()
+    scheduler.add("events-status-scheduling",
+                  ScheduledTask("/tasks/create_change_status_for_next_week", params={"now": start.isoformat()}))
+    scheduler.run_until(start)
+    print("status tasks scheduled in {:.1f} s, {} tasks pending".format(time.time() - started, scheduler.pending()))
+
+    started = time.time()
+    end = start + timedelta(days=days + 1)
+    while scheduler.now < end:
+        scheduler.advance(timedelta(hours=1))
+    print("lifecycle executed in {:.1f} s".format(time.time() - started))
+
+    for key, value in sorted(scheduler.stats().items()):
+        print("{}: {}".format(key, value))
+    print("events past: {} of {}".format(Event.query(Event.status == "past").count(), number))
+    bed.deactivate()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        'sdk_path',
+        help='The path to the Google App Engine SDK or the Google Cloud SDK.')
+    parser.add_argument('--events', type=int, default=100000, help='Number of events, defaults to 100000.')
+    parser.add_argument('--days', type=int, default=7, help='Number of days during which events start.')
+    args = parser.parse_args()
+    main(args.sdk_path, args.events, args.days)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python2
+"""Benchmark of geodesic functions used by location search
+
+Compares computing of bounding box by four geopy destinations with memoized closed form
+of ewentts.geo and scoring of candidates by geopy great_circle with vectorized haversine.
+
+Usage:
+    python benchmarks/geo_benchmark.py --candidates 10000 --repeat 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from geopy import Point, distance
+
+from ewentts import geo
+
+
+def geopy_bounding_box(point, range_km):
+    """Return bounding box computed by geopy like the original location search did"""
+    if hasattr(distance, "VincentyDistance"):
+        dist = distance.VincentyDistance(kilometers=range_km)
+    else:
+        dist = distance.geodesic(kilometers=range_km)
+    start = Point(point)
+    return {"maxlatitude": dist.destination(point=start, bearing=0).latitude,
+            "maxlongitude": dist.destination(point=start, bearing=90).longitude,
+            "minlatitude": dist.destination(point=start, bearing=180).latitude,
+            "minlongitude": dist.destination(point=start, bearing=270).longitude}
+
+
+def measure(function, repeat):
+    """Return seconds per call of function"""
+    started = time.time()
+    for _ in range(repeat):
+        function()
+    return (time.time() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=10000, help="number of scored candidates")
+    parser.add_argument("--repeat", type=int, default=1000, help="number of computed bounding boxes")
+    args = parser.parse_args()
+
+    random.seed(0)
+    origins = [(random.uniform(-60, 60), random.uniform(-180, 180)) for _ in range(args.repeat)]
+    iterator = iter(origins * 2)
+    geopy_box = measure(lambda: geopy_bounding_box(next(iterator), 10), args.repeat)
+    iterator = iter(origins)
+    geo_box_cold = measure(lambda: geo.bounding_box(next(iterator), 10), args.repeat)
+    iterator = iter(origins)
+    geo_box_warm = measure(lambda: geo.bounding_box(next(iterator), 10), args.repeat)
+    print("bounding box geopy:        {:.1f} us".format(geopy_box * 1e6))
+    print("bounding box geo (cold):   {:.1f} us".format(geo_box_cold * 1e6))
+    print("bounding box geo (cached): {:.1f} us".format(geo_box_warm * 1e6))
+
+    point = (49.39547, 15.59095)
+    latitudes = [point[0] + random.uniform(-0.5, 0.5) for _ in range(args.candidates)]
+    longitudes = [point[1] + random.uniform(-0.5, 0.5) for _ in range(args.candidates)]
+    started = time.time()
+    expected = [distance.great_circle(point, (latitudes[i], longitudes[i])).km for i in range(args.candidates)]
+    geopy_seconds = time.time() - started
+    started = time.time()
+    scalar = [geo.distance_km(point, (latitudes[i], longitudes[i])) for i in range(args.candidates)]
+    scalar_seconds = time.time() - started
+    started = time.time()
+    vectorized = geo.distances_km(point, latitudes, longitudes)
+    vectorized_seconds = time.time() - started
+    error = max(abs(vectorized[i] - expected[i]) / expected[i] for i in range(args.candidates) if expected[i])
+    scalar_difference = max(abs(vectorized[i] - scalar[i]) for i in range(args.candidates))
+    print("{} distances geopy:        {:.2f} ms".format(args.candidates, geopy_seconds * 1e3))
+    print("{} distances scalar:       {:.2f} ms".format(args.candidates, scalar_seconds * 1e3))
+    print("{} distances vectorized:   {:.2f} ms".format(args.candidates, vectorized_seconds * 1e3))
+    print("maximal relative difference from geopy: {:.2e}".format(error))
+    print("maximal difference of scalar and vectorized: {:.2e} km".format(scalar_difference))
+
+
+if __name__ == "__main__":
+    main()
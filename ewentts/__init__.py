@@ -25,6 +25,8 @@ def create_app():
     from ewentts.feed.routes import feed
     from ewentts.errors.handlers import errors
     from ewentts.datastore_generator.generator import generator
+    from ewentts.tasks.routes import tasks
+    from ewentts.reminders.routes import reminders
     app.register_blueprint(main)
     app.register_blueprint(users)
     app.register_blueprint(events)
@@ -33,5 +35,10 @@ def create_app():
     app.register_blueprint(feed)
     app.register_blueprint(errors)
     app.register_blueprint(generator)
+    app.register_blueprint(tasks)
+    app.register_blueprint(reminders)
+
+    from ewentts.search.index import send_pending_index_updates
+    app.after_request(send_pending_index_updates)
 
     return app
@@ -22,7 +22,8 @@ from flask import Blueprint, jsonify, request
 from firebase_admin import auth
 from google.appengine.ext import ndb
 
-from ewentts.utils import return_event, create_task_change_status_to_present, create_task_change_status_to_past
+from ewentts.utils import return_event, create_task_change_status_to_past, status_task_version, requires_task
+from ewentts.tasks.utils import add_task, schedule_status_slice, SCHEDULING_QUEUE
 from ewentts.events.utils import create_event
 from ewentts.models import User, Event
 from ewentts.users.utils import create_user
@@ -164,41 +165,78 @@ def generate():
     return jsonify(guest_list=["1234", "123"]), 201
 
 
-@generator.route('/tasks/create_change_status_for_next_week', methods=["GET"])
+@generator.route('/tasks/create_change_status_for_next_week', methods=["GET", "POST"])
+@requires_task
 def create_change_status_for_next_week():
-    """Create task for each event happening next week to change it's status"""
-    query = Event.query()
-    events = query.filter(Event.start_datetime > datetime.now(), Event.start_datetime < datetime.now()
-                          + timedelta(days=7))
-    for event in events:
-        create_task_change_status_to_present(event)
+    """Create task for each event happening next week to change it's status
+
+    Called by cron without properties, every task creates tasks for one slice of events
+    and chains the next slice until all events starting in next 7 days are processed.
+
+    Properties:
+        now: iso datetime used by all tasks of one run, optional
+        cursor: websafe cursor of the slice of events, optional
+    """
+    cursor = request.values.get("cursor")
+    now = request.values.get("now")
+    now = parse(now) if now else datetime.utcnow()
+    scheduled, next_cursor = schedule_status_slice(now, cursor)
+    logger.info("tasks changing status of {} events created".format(scheduled))
+    if next_cursor:
+        add_task("/tasks/create_change_status_for_next_week", {"now": now.isoformat(), "cursor": next_cursor},
+                 queue_name=SCHEDULING_QUEUE)
     return "done"
 
 
+def return_event_for_status_task(event_id, version, due_property):
+    """Return event if task changing its status is not stale, otherwise None
+
+    Properties:
+        event_id: id of the event
+        version: version of the task, compared with version of current due datetime of the event
+        due_property: name of the property of the event when the task is due
+    """
+    event = ndb.Key(Event, event_id).get()
+    if not event:
+        logger.warning("event {} does not exist anymore".format(event_id))
+        return None
+    if version and version != status_task_version(getattr(event, due_property)):
+        logger.info("task changing status of event {} is stale".format(event_id))
+        return None
+    return event
+
+
 @generator.route('/tasks/change_status_to_present', methods=["GET"])
+@requires_task
 def change_status_to_present():
     """Change event status to present"""
     event_id = request.args.get("event_id")
     event_id = int(event_id)
-    event = return_event(event_id)
+    event = return_event_for_status_task(event_id, request.args.get("version"), "start_datetime")
+    if not event:
+        return "done"
     event.status = "present"
     event.put()
-    create_task_change_status_to_past(event_id)
+    create_task_change_status_to_past(event)
     return "done"
 
 
 @generator.route('/tasks/change_status_to_past', methods=["GET"])
+@requires_task
 def change_status_to_past():
     """Change event status to past"""
     event_id = request.args.get("event_id")
     event_id = int(event_id)
-    event = return_event(event_id)
+    event = return_event_for_status_task(event_id, request.args.get("version"), "end_datetime")
+    if not event:
+        return "done"
     event.status = "past"
     event.put()
     return "done"
 
 
 @generator.route('/tasks/search_api_test', methods=["GET"])
+@requires_task
 def search_api_test():
     """test for search API, development only"""
     event_id = 1234
@@ -0,0 +1,123 @@
+"""Module containing functions computing local day buckets of events
+
+Every event stores iso dates of all days in its timezone during which it takes place,
+so search for events happening on a day becomes equality lookup on the index and
+can be combined with other equality filters. Requested days are resolved in timezone
+of the client given by its offset from UTC in minutes.
+
+Attributes:
+    DEFAULT_TIMEZONE: timezone of events which did not receive any
+    MAX_EVENT_DAYS: maximal number of days stored for one event, longer events are found by their first days
+    MAX_DAY_RANGE: maximal number of days in one requested range
+    MIN_TZ_OFFSET: minimal offset of client timezone from UTC in minutes
+    MAX_TZ_OFFSET: maximal offset of client timezone from UTC in minutes
+    RANGE_SEPARATOR: separator of first and last day of requested range
+
+"""
+
+from datetime import datetime, timedelta
+
+import pytz
+from dateutil.parser import parse
+
+DEFAULT_TIMEZONE = "UTC"
+MAX_EVENT_DAYS = 31
+MAX_DAY_RANGE = 14
+MIN_TZ_OFFSET = -12 * 60
+MAX_TZ_OFFSET = 14 * 60
+RANGE_SEPARATOR = ".."
+
+
+def validate_timezone(name):
+    """Return name if it is name of timezone from tz database
+
+    Raises:
+        ValueError: if name is not known timezone
+    """
+    try:
+        pytz.timezone(name)
+    except (pytz.UnknownTimeZoneError, AttributeError):
+        raise ValueError("timezone {} is not name of timezone from tz database".format(name))
+    return name
+
+
+def local_days(start_datetime, end_datetime=None, timezone=None):
+    """Return iso dates of days in timezone during which the event takes place
+
+    Properties:
+        start_datetime: naive datetime in UTC
+        end_datetime: naive datetime in UTC, if None only day of start is returned
+        timezone: name of timezone of the event, DEFAULT_TIMEZONE if None
+
+    Returns:
+        list of at most MAX_EVENT_DAYS iso dates, event ending at midnight does not take place on the next day
+    """
+    if start_datetime is None:
+        return []
+    zone = pytz.timezone(timezone or DEFAULT_TIMEZONE)
+    first_day = pytz.utc.localize(start_datetime).astimezone(zone).date()
+    last_day = first_day
+    if end_datetime and end_datetime > start_datetime:
+        last_day = pytz.utc.localize(end_datetime - timedelta(microseconds=1)).astimezone(zone).date()
+    days = min((last_day - first_day).days + 1, MAX_EVENT_DAYS)
+    return [(first_day + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def client_today(tz_offset=0, now=None):
+    """Return today's date of client whose timezone is tz_offset minutes from UTC"""
+    if now is None:
+        now = datetime.utcnow()
+    return (now + timedelta(minutes=tz_offset)).date()
+
+
+def parse_tz_offset(value):
+    """Return offset of client timezone in minutes, 0 if value is empty
+
+    Raises:
+        ValueError: if value is not integer between MIN_TZ_OFFSET and MAX_TZ_OFFSET
+    """
+    if not value:
+        return 0
+    tz_offset = int(value)
+    if tz_offset < MIN_TZ_OFFSET or tz_offset > MAX_TZ_OFFSET:
+        raise ValueError("tz_offset is not between {} and {} minutes".format(MIN_TZ_OFFSET, MAX_TZ_OFFSET))
+    return tz_offset
+
+
+def parse_day(value, today):
+    """Return date of "today", "tomorrow" or iso date
+
+    Raises:
+        ValueError: if value is not in correct format
+    """
+    if value == "today":
+        return today
+    if value == "tomorrow":
+        return today + timedelta(days=1)
+    return parse(value).date()
+
+
+def parse_days(value, tz_offset=0, now=None):
+    """Return iso dates of requested day or range of days
+
+    Properties:
+        value: "today"|"tomorrow"|iso date or two of them separated by RANGE_SEPARATOR, range includes both ends
+        tz_offset: offset of client timezone from UTC in minutes, today and tomorrow are days of the client
+        now: datetime in UTC, if None current time is used
+
+    Returns:
+        list of iso dates
+
+    Raises:
+        ValueError: if value is not in correct format or range is empty or longer then MAX_DAY_RANGE
+    """
+    today = client_today(tz_offset, now)
+    if RANGE_SEPARATOR in value:
+        first, last = value.split(RANGE_SEPARATOR, 1)
+        first_day, last_day = parse_day(first, today), parse_day(last, today)
+    else:
+        first_day = last_day = parse_day(value, today)
+    days = (last_day - first_day).days + 1
+    if days < 1 or days > MAX_DAY_RANGE:
+        raise ValueError("range of days is empty or longer then {} days".format(MAX_DAY_RANGE))
+    return [(first_day + timedelta(days=i)).isoformat() for i in range(days)]
@@ -5,13 +5,15 @@ Attributes:
 
 """
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 
 from ewentts.utils import requires_auth, request_uid, return_jsonified_users,\
     get_body_in_json, return_event, get_per_page, paginate_list, check_user_authorised
 from .utils import create_event, jsonify_event, return_edited_event, logger,\
     return_jsonified_posts, invite_users, user_attends_event, user_came_to_event,\
-    user_left_event
+    user_left_event, import_events, parse_csv_rows, parse_ndjson_rows, create_event_series, return_series, \
+    jsonify_series, return_edited_series, delete_future_occurrences
+from ewentts.tasks.utils import start_event_cleanup
 
 events = Blueprint("events", __name__)
 
@@ -31,6 +33,7 @@ def set_up_event():
      description: string, optional
      private: boolean
      guest_list: optional, list user_id of users
+     timezone: name of timezone from tz database, optional, defaults to UTC
 
     Returns:
         201: properties of event in json
@@ -44,6 +47,132 @@ def set_up_event():
     return json, 201
 
 
+@events.route('/event/import', methods=["POST"])
+@requires_auth
+def bulk_import_events():
+    """
+    Endpoint for importing events in bulk.
+
+    Body is read as stream of rows, with content type text/csv rows are csv with header
+    containing columns event_name, start_datetime, end_datetime, latitude, longitude,
+    event_picture_url, description, private, guest_list (user ids separated by spaces) and timezone,
+    otherwise every line of body is json object with same properties as in POST /event.
+    Invalid rows are reported in errors and do not abort the import.
+
+    Returns:
+        201: created, event_ids and errors in json if any event was created
+        200: created, event_ids and errors in json if no event was created
+        404: if current user does not exist
+        405: if other method then POST used
+    """
+    user_id = request_uid()
+    if request.mimetype == "text/csv":
+        rows = parse_csv_rows(request.stream)
+    else:
+        rows = parse_ndjson_rows(request.stream)
+    created_keys, errors = import_events(rows, user_id)
+    json = jsonify(created=len(created_keys),
+                   event_ids=[key.id() for key in created_keys],
+                   errors=errors)
+    code = 201 if created_keys else 200
+    return json, code
+
+
+@events.route('/event/series', methods=["POST"])
+@requires_auth
+def set_up_event_series():
+    """
+    Endpoint for creating series of recurring events.
+
+    If called with body containing same properties as in POST /event and valid:
+     recurrence: object containing
+        frequency: daily | weekly | monthly
+        interval: integer, optional
+        count: integer, number of occurrences, required if until not provided
+        until: iso datetime with location, required if count not provided
+
+    Returns:
+        201: properties of series in json
+        400: if not all necessary parameters are provided in json body or if any of them is not valid
+        405: if other method then POST used
+    """
+    body = get_body_in_json()
+    user_id = request_uid()
+    series = create_event_series(body, user_id)
+    json = jsonify_series(series)
+    return json, 201
+
+
+@events.route("/event/series/<int:series_id>", methods=["GET"])
+@requires_auth
+def view_event_series(series_id):
+    """Endpoint which returns series properties
+
+    Properties:
+        series_id: id of series which is to be viewed
+
+    Returns:
+        200: properties of series in json
+        404: if series not found
+        405: if other method then GET used
+    """
+    series = return_series(series_id)
+    json = jsonify_series(series)
+    return json, 200
+
+
+@events.route("/event/series/<int:series_id>/edit", methods=["POST"])
+@requires_auth
+def edit_event_series(series_id):
+    """Endpoint which edits all future events of series
+
+    These properties can get edited if valid values received in json body:
+     event_name: string, optional
+     location: list with 2 floats, optional
+     event_picture_url: picture url string, optional
+     description: string, optional
+
+    Properties:
+        series_id: id of series which is to be edited
+
+    Returns:
+        200: properties of series in json
+        400: if any of the properties in body are not valid
+        403: if some other user then series organiser tried to edit the series
+        404: if series not found
+        405: if other method then POST used
+    """
+    series = return_series(series_id)
+    current_user_id = request_uid()
+    if check_user_authorised(current_user=current_user_id, authorised_user=series.organiser.id()):
+        body = get_body_in_json()
+        series = return_edited_series(series, body)
+        json = jsonify_series(series)
+        return json, 200
+
+
+@events.route("/event/series/<int:series_id>", methods=["DELETE"])
+@requires_auth
+def cancel_event_series(series_id):
+    """Endpoint which deletes all future events of series
+
+    Properties:
+        series_id: id of series which is to be cancelled
+
+    Returns:
+        200: number of deleted events in json
+        403: if some other user then series organiser tried to cancel the series
+        404: if series not found
+        405: if other method then DELETE used
+    """
+    series = return_series(series_id)
+    current_user_id = request_uid()
+    if check_user_authorised(current_user=current_user_id, authorised_user=series.organiser.id()):
+        deleted = delete_future_occurrences(series)
+        json = jsonify(deleted=deleted)
+        return json, 200
+
+
 @events.route("/event/<int:event_id>", methods=["GET"])
 @requires_auth
 def view_event(event_id):
@@ -67,6 +196,9 @@ def view_event(event_id):
 def delete_event(event_id):
     """Endpoint which deletes event
 
+    Event is deleted immediately, its posts, tasks changing its status and
+    references to it from users are removed by background task
+
     Properties:
         event_id: id of event which is to be deleted
 
@@ -80,6 +212,7 @@ def delete_event(event_id):
     current_user_id = request_uid()
     if check_user_authorised(current_user=current_user_id, authorised_user=event.organiser.id):
         event.key.delete()
+        start_event_cleanup(event)
         logger.info("Event {} Deleted".format(event_id))
     json = jsonify("Event Deleted")
     return json, 200
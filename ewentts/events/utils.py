@@ -2,43 +2,48 @@
 
 Attributes:
     logger: Logger for logging in events package
+    IMPORT_CHUNK_SIZE: number of imported events saved in one batch
+    IMPORT_MAX_ROWS: maximal number of events created by one import
+    SERIES_FREQUENCIES: frequencies of series of recurring events mapped to dateutil rrule frequencies
+    SERIES_MAX_OCCURRENCES: maximal number of occurrences of one series
 
 """
 
 
+import csv
+import json
 import logging
 from datetime import datetime, timedelta
+from itertools import islice
 
 import pytz
+from dateutil import rrule
 from dateutil.parser import parse
 from flask import jsonify
 from google.appengine.ext import ndb
 
-from ewentts.models import Event, User
+from ewentts.days import DEFAULT_TIMEZONE, validate_timezone
+from ewentts.models import Event, EventSeries, User
 from ewentts.utils import validate_picture_url, request_uid, return_user, validate_location, \
     create_task_change_status_to_present, create_task_change_status_to_past, delete_task, \
-    error_decorator, BadRequestError
+    error_decorator, BadRequestError, NotFoundError, create_tasks_change_status_to_present, status_task_name
+from ewentts.tasks.utils import start_events_cleanup, start_event_side_effects, start_events_fan_out, \
+    add_organised_events
 
 logger = logging.getLogger("events")
 
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_ROWS = 10000
+SERIES_FREQUENCIES = {"daily": rrule.DAILY, "weekly": rrule.WEEKLY, "monthly": rrule.MONTHLY}
+SERIES_MAX_OCCURRENCES = 100
 
-@error_decorator
-def create_event(body, user_id):
-    """Create event
+
+def build_event(body, organiser_key):
+    """Validate body and build event which is not saved yet
 
     :param body: body which should contain all data necessary for creating event
-    :param user_id: unique id of user of class User
-    :return: properties of the event in json,
-            Specifically:   event_name: name of the event
-                            event_id: unique id of the event
-                            event_status: status if event is future | present | past
-                            start_datetime: date and time of start of the event
-                            end_datetime: date and time of end of the event
-                            location: location of the event as array of floats
-                            event_picture_url: url link to the event picture
-                            description: description of the event
-                            private: boolean if the event is private or nor
-                            organiser: name of organiser of the event
+    :param organiser_key: key of user of class User who organises the event
+    :return: entity of class Event which is not saved in database
     :raise: BadRequestError: if body contains incorrect data or is missing some data
     """
     try:
@@ -55,13 +60,13 @@ def create_event(body, user_id):
             description = ""
         private = body["private"]
         guest_list = body.get("guest_list")
+        timezone = body.get("timezone") or DEFAULT_TIMEZONE
     except Exception as e:
         logger.error("info required to set up event not received")
         logger.error(e)
         raise BadRequestError("Some of the info required to set up event not received, required info: event_name, "
                               "start_datetime, location, private")
     logger.debug("info required to set up event received")
-    organiser_key = ndb.Key(User, user_id)
     utc = pytz.utc
     try:
         validate_picture_url(event_picture_url)
@@ -75,6 +80,7 @@ def create_event(body, user_id):
         validate_start_datetime(start_datetime, end_datetime)
         validate_end_datetime(end_datetime, start_datetime)
         validate_location(*location)
+        validate_timezone(timezone)
         event = Event(event_name=event_name,
                       status="future",
                       start_datetime=start_datetime,
@@ -85,24 +91,341 @@ def create_event(body, user_id):
                       description=description,
                       private=private,
                       organiser=organiser_key,
+                      timezone=timezone,
                       )
-        if guest_list:
-            invite_users(event, body)
     except ValueError as e:
         logger.error("properties to set up event received in wrong format")
         logger.error(e)
         raise BadRequestError(e)
+    if guest_list:
+        for user_id in guest_list:
+            user_key = ndb.Key(User, user_id)
+            if user_key not in event.guest_list:
+                event.guest_list += [user_key]
+    return event
 
-    event.put()
-    if event.start_datetime < datetime.now() + timedelta(days=7):
-        create_task_change_status_to_present(event)
-    user = return_user(user_id)
-    user.organised_events += [event.key]
-    user.put()
+
+@error_decorator
+def create_event(body, user_id):
+    """Create event
+
+    Only the event is saved before returning, side effects of creating the event are
+    applied by background task
+
+    :param body: body which should contain all data necessary for creating event
+    :param user_id: unique id of user of class User
+    :return: properties of the event in json,
+            Specifically:   event_name: name of the event
+                            event_id: unique id of the event
+                            event_status: status if event is future | present | past
+                            start_datetime: date and time of start of the event
+                            end_datetime: date and time of end of the event
+                            location: location of the event as array of floats
+                            event_picture_url: url link to the event picture
+                            description: description of the event
+                            private: boolean if the event is private or nor
+                            organiser: name of organiser of the event
+    :raise: BadRequestError: if body contains incorrect data or is missing some data
+    """
+    organiser_key = ndb.Key(User, user_id)
+    event = build_event(body, organiser_key)
+    save_event_with_side_effects(event)
     logger.info("event {} created".format(event.key.id()))
     return event
 
 
+@ndb.transactional
+def save_event_with_side_effects(event):
+    """Save new event and in the same transaction create task applying its side effects
+
+    Adding event to organiser's organised events and creating task changing its status
+    are done by the task, so the event is saved with single write while the task is
+    guaranteed to be created only if the event was saved
+
+    :param event: entity of class Event which is not saved yet
+    """
+    event.put()
+    start_event_side_effects(event, transactional=True)
+
+
+def parse_ndjson_rows(lines):
+    """Yield bodies of events from lines of newline delimited json
+
+    Empty lines are skipped, line which is not valid json object is yielded as ValueError
+
+    :param lines: iterable of lines
+    :return: generator of tuples of line number and body or ValueError
+    """
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            body = json.loads(line)
+            if not isinstance(body, dict):
+                raise ValueError("line does not contain json object")
+        except ValueError as e:
+            body = ValueError("line received in wrong format: {}".format(e))
+        yield line_number, body
+
+
+def parse_csv_rows(lines):
+    """Yield bodies of events from lines of csv with header
+
+    Columns: event_name, start_datetime, end_datetime, latitude, longitude,
+    event_picture_url, description, private, guest_list (user ids separated by spaces), timezone
+
+    :param lines: iterable of lines
+    :return: generator of tuples of line number and body or ValueError
+    """
+    for line_number, row in enumerate(csv.DictReader(lines), 2):
+        try:
+            body = {"event_name": row["event_name"],
+                    "start_datetime": row["start_datetime"],
+                    "end_datetime": row.get("end_datetime"),
+                    "location": [float(row["latitude"]), float(row["longitude"])],
+                    "event_picture_url": row.get("event_picture_url"),
+                    "description": row.get("description"),
+                    "private": (row.get("private") or "").strip().lower() in ("true", "1", "yes"),
+                    "guest_list": (row.get("guest_list") or "").split(),
+                    "timezone": row.get("timezone")}
+        except (KeyError, TypeError, ValueError) as e:
+            body = ValueError("row received in wrong format: {}".format(e))
+        yield line_number, body
+
+
+def save_imported_events(events):
+    """Save events in one batch, fan them out to timelines and return their keys"""
+    keys = ndb.put_multi(events)
+    soon = datetime.now() + timedelta(days=7)
+    create_tasks_change_status_to_present([event for event in events if event.start_datetime < soon])
+    start_events_fan_out(events)
+    return keys
+
+
+@error_decorator
+def import_events(rows, user_id):
+    """Create events from rows received
+
+    Rows are validated while they are read, valid events are saved in chunks of IMPORT_CHUNK_SIZE,
+    keys of all created events are added to organiser read again in one transaction, invalid rows are reported
+    without aborting the import.
+
+    :param rows: iterable of tuples of line number and body of event or ValueError
+    :param user_id: unique id of user of class User who organises the events
+    :return: keys of created events, list of errors containing line number and error message
+    """
+    user = return_user(user_id)
+    created_keys = []
+    errors = []
+    pending = []
+    for line_number, body in rows:
+        if len(created_keys) + len(pending) >= IMPORT_MAX_ROWS:
+            errors += [{"line": line_number, "error": "maximum of {} events per import "
+                                                      "exceeded".format(IMPORT_MAX_ROWS)}]
+            break
+        try:
+            if isinstance(body, ValueError):
+                raise body
+            pending += [build_event(body, user.key)]
+        except Exception as e:
+            errors += [{"line": line_number, "error": str(e)}]
+            continue
+        if len(pending) >= IMPORT_CHUNK_SIZE:
+            created_keys += save_imported_events(pending)
+            pending = []
+    if pending:
+        created_keys += save_imported_events(pending)
+    if created_keys:
+        add_organised_events(user.key, created_keys)
+    logger.info("{} events imported, {} rows rejected".format(len(created_keys), len(errors)))
+    return created_keys, errors
+
+
+def expand_recurrence(start_datetime, recurrence):
+    """Return start datetimes of occurrences described by recurrence rule
+
+    :param start_datetime: datetime of start of the first occurrence
+    :param recurrence: dictionary containing frequency daily|weekly|monthly, optional interval
+                       and count of occurrences or until iso datetime with location
+    :return: list of datetimes of starts of the occurrences
+    :raise: ValueError: if recurrence is not valid or describes more then SERIES_MAX_OCCURRENCES occurrences
+    """
+    try:
+        frequency = SERIES_FREQUENCIES[recurrence["frequency"]]
+        interval = int(recurrence.get("interval", 1))
+        count = recurrence.get("count")
+        until = recurrence.get("until")
+    except (KeyError, TypeError, AttributeError):
+        raise ValueError("recurrence must contain frequency daily, weekly or monthly")
+    if interval < 1:
+        raise ValueError("recurrence interval must be positive")
+    if count:
+        count = int(count)
+        if count < 1:
+            raise ValueError("recurrence count must be positive")
+        until = None
+    elif until:
+        until = parse(until).astimezone(pytz.utc).replace(tzinfo=None)
+    else:
+        raise ValueError("recurrence must contain count or until")
+    rule = rrule.rrule(frequency, dtstart=start_datetime, interval=interval, count=count, until=until)
+    starts = list(islice(rule, SERIES_MAX_OCCURRENCES + 1))
+    if len(starts) > SERIES_MAX_OCCURRENCES:
+        raise ValueError("series can have maximum {} occurrences".format(SERIES_MAX_OCCURRENCES))
+    return starts
+
+
+@error_decorator
+def create_event_series(body, user_id):
+    """Create series of recurring events
+
+    Occurrences are expanded from recurrence rule in body, all of them and the series
+    are saved in one batch and keys of occurrences are added to organiser read again in one transaction
+
+    :param body: body which should contain all data necessary for creating event and recurrence
+    :param user_id: unique id of user of class User
+    :return: series of class EventSeries
+    :raise: BadRequestError: if body contains incorrect data or is missing some data
+    """
+    recurrence = body.get("recurrence")
+    if not recurrence:
+        logger.error("recurrence not received")
+        raise BadRequestError("recurrence not received")
+    organiser_key = ndb.Key(User, user_id)
+    template = build_event(body, organiser_key)
+    try:
+        starts = expand_recurrence(template.start_datetime, recurrence)
+    except ValueError as e:
+        logger.error("recurrence received in wrong format")
+        logger.error(e)
+        raise BadRequestError(e)
+    user = return_user(user_id)
+    duration = template.end_datetime - template.start_datetime
+    series_key = ndb.Key(EventSeries, EventSeries.allocate_ids(1)[0])
+    first_id, _ = Event.allocate_ids(len(starts))
+    properties = template.to_dict(exclude=[name for name, prop in Event._properties.items()
+                                           if isinstance(prop, ndb.ComputedProperty)])
+    events = []
+    for i, start_datetime in enumerate(starts):
+        properties.update(start_datetime=start_datetime,
+                          end_datetime=start_datetime + duration,
+                          guest_list=list(template.guest_list),
+                          series=series_key)
+        events += [Event(id=first_id + i, **properties)]
+    series = EventSeries(key=series_key,
+                         event_name=template.event_name,
+                         organiser=organiser_key,
+                         frequency=recurrence["frequency"],
+                         interval=int(recurrence.get("interval", 1)),
+                         occurrences=[event.key for event in events])
+    ndb.put_multi(events + [series])
+    soon = datetime.now() + timedelta(days=7)
+    create_tasks_change_status_to_present([event for event in events if event.start_datetime < soon])
+    start_events_fan_out(events)
+    add_organised_events(user.key, series.occurrences)
+    logger.info("series {} with {} events created".format(series_key.id(), len(events)))
+    return series
+
+
+@error_decorator
+def return_series(series_id):
+    """Returns series based on series id
+
+    :param series_id: unique series id
+    :return: series of class EventSeries if series with the id exists
+    :raise: NotFoundError: if series not found
+    """
+    series = ndb.Key(EventSeries, series_id).get()
+    if not series:
+        logger.error("series: %s does not exist", series_id)
+        raise NotFoundError("Event series with this ID does not exist")
+    return series
+
+
+def jsonify_series(series):
+    """Return properties of series in json
+
+    :param series: object of class EventSeries
+    :return: properties of the series in json,
+            Specifically:   series_id: unique id of the series
+                            event_name: name of the events in series
+                            frequency: frequency of the occurrences daily | weekly | monthly
+                            interval: number of frequency units between occurrences
+                            event_ids: ids of the occurrences
+                            organiser: name of organiser of the series
+    """
+    organiser = series.organiser.get()
+    json = jsonify(series_id=series.key.id(),
+                   event_name=series.event_name,
+                   frequency=series.frequency,
+                   interval=series.interval,
+                   event_ids=[key.id() for key in series.occurrences],
+                   organiser=" ".join(organiser.user_names))
+    return json
+
+
+@error_decorator
+def return_edited_series(series, body):
+    """Edit all future occurrences of the series
+
+    Properties event_name, location, event_picture_url, description and timezone
+    are edited in all occurrences which status is future, occurrences are saved in one batch
+
+    :param series: object of class EventSeries
+    :param body: json object which might contain event_name, location, event_picture_url, description or timezone
+    :return: edited series
+    :raise: BadRequestError: if any of the properties in body are not valid
+    """
+    changes = {}
+    try:
+        if body.get("event_name"):
+            changes["event_name"] = body["event_name"]
+        if body.get("location"):
+            validate_location(*body["location"])
+            changes["latitude"], changes["longitude"] = body["location"]
+        if body.get("event_picture_url"):
+            validate_picture_url(body["event_picture_url"])
+            changes["event_picture_url"] = body["event_picture_url"]
+        if body.get("description"):
+            changes["description"] = body["description"]
+        if body.get("timezone"):
+            changes["timezone"] = validate_timezone(body["timezone"])
+    except (TypeError, ValueError) as e:
+        logger.error("properties to edit series received in wrong format")
+        logger.error(e)
+        raise BadRequestError(e)
+    events = [event for event in ndb.get_multi(series.occurrences) if event and event.current_status() == "future"]
+    for event in events:
+        event.populate(**changes)
+    if "event_name" in changes:
+        series.event_name = changes["event_name"]
+    ndb.put_multi(events + [series])
+    logger.info("{} events of series {} edited".format(len(events), series.key.id()))
+    return series
+
+
+def delete_future_occurrences(series):
+    """Delete all future occurrences of the series
+
+    Occurrences are deleted in one batch and their references are removed by background tasks,
+    series is deleted if it has no occurrences left
+
+    :param series: object of class EventSeries
+    :return: number of deleted occurrences
+    """
+    events = [event for event in ndb.get_multi(series.occurrences) if event and event.current_status() == "future"]
+    ndb.delete_multi([event.key for event in events])
+    start_events_cleanup(events)
+    deleted_keys = set(event.key for event in events)
+    series.occurrences = [key for key in series.occurrences if key not in deleted_keys]
+    if series.occurrences:
+        series.put()
+    else:
+        series.key.delete()
+    logger.info("{} events of series {} deleted".format(len(events), series.key.id()))
+    return len(events)
+
+
 def jsonify_event(event):
     """Return properties of event in json
 
@@ -118,18 +441,20 @@ def jsonify_event(event):
                             description: description of the event
                             private: boolean if the event is private or nor
                             organiser: name of organiser of the event
+                            timezone: name of timezone of the event
     """
     organiser = event.organiser.get()
     json = jsonify(event_name=event.event_name,
                    event_id=event.key.id(),
-                   event_status=event.status,
+                   event_status=event.current_status(),
                    start_datetime=event.start_datetime.isoformat(),
                    end_datetime=event.end_datetime.isoformat(),
                    location=[event.latitude, event.longitude],
                    event_picture_url=event.event_picture_url,
                    description=event.description,
                    private=event.private,
-                   organiser=" ".join(organiser.user_names)
+                   organiser=" ".join(organiser.user_names),
+                   timezone=event.timezone
                    )
     return json
 
@@ -246,16 +571,17 @@ def edit_datetimes(event, body):
     """
     start_datetime = body.get("start_datetime")
     end_datetime = body.get("end_datetime")
+    previous_start_datetime = event.start_datetime
     if start_datetime and end_datetime:
         utc = pytz.utc
         edit_start_datetime(event, start_datetime,
                             parse(end_datetime).astimezone(utc).replace(tzinfo=None))
         edit_end_datetime(event, end_datetime,
                           parse(start_datetime).astimezone(utc).replace(tzinfo=None))
-        create_change_task_to_present_if_event_soon(event)
+        create_change_task_to_present_if_event_soon(event, previous_start_datetime)
     elif start_datetime:
         edit_start_datetime(event, start_datetime, event.end_datetime)
-        create_change_task_to_present_if_event_soon(event)
+        create_change_task_to_present_if_event_soon(event, previous_start_datetime)
     elif end_datetime:
         event = edit_end_datetime(event, end_datetime, event.start_datetime)
     return event
@@ -286,6 +612,24 @@ def edit_location(event, location):
     return event
 
 
+@error_decorator
+def edit_timezone(event, timezone):
+    """Edits timezone of the event
+
+    :param event: object of class Event
+    :param timezone: name of timezone from tz database
+    :return: edited event if timezone is valid, otherwise abort(400) with string describing the error
+    """
+    try:
+        validate_timezone(timezone)
+    except ValueError as e:
+        logger.error(e)
+        raise BadRequestError(e)
+    event.timezone = timezone
+    logger.info("timezone edited to {}".format(timezone))
+    return event
+
+
 @error_decorator
 def edit_event_picture_url(event, event_picture_url):
     """Edits picture_url of the event
@@ -321,12 +665,12 @@ def edit_present_event(event, body):
     """
     end_datetime = body.get("end_datetime")
     if end_datetime:
+        previous_end_datetime = event.end_datetime
         event = edit_end_datetime(event, end_datetime, event.start_datetime)
-        event_id = event.key.id()
         queue_name = "events-status-to-past"
-        task_name = str(event_id)
+        task_name = status_task_name(event.key.id(), previous_end_datetime)
         delete_task(queue_name, task_name)
-        create_task_change_status_to_past(event_id)
+        create_task_change_status_to_past(event)
     else:
         logger.warning("nothing has been eddited")
     return event
@@ -336,20 +680,21 @@ def edit_future_event(event, body):
     """Edits properties allowed to be changed for future event
 
     Check if body contains start_datetime, end_datetime,
-    event_name, event_picture_url or description which are
+    event_name, event_picture_url, description or timezone which are
     only properties of event which can be edited when
     event's state is future, if it does the properties are
     edited if valid
 
     :param event: object of class Event
     :param body: json object containing which might contain start_datetime, end_datetime, event_name,
-    event_picture_url or description
+    event_picture_url, description or timezone
     :return: edited event if any of following were in body start_datetime, end_datetime, event_name,
-    event_picture_url or description, otherwise return event which was received
+    event_picture_url, description or timezone, otherwise return event which was received
     """
     event_name = body.get("event_name")
     if event_name:
         event = edit_event_name(event, event_name)
+    previous_start_datetime = event.start_datetime
     event = edit_datetimes(event, body)
     location = body.get("location")
     if location:
@@ -361,8 +706,13 @@ def edit_future_event(event, body):
     if description:
         event.description = description
         logger.info("description edited to {}".format(description))
+    timezone = body.get("timezone")
+    if timezone:
+        event = edit_timezone(event, timezone)
     event.put()
     logger.debug("event changes saved")
+    if event.start_datetime != previous_start_datetime:
+        start_events_fan_out([event])
     return event
 
 
@@ -376,10 +726,11 @@ def return_edited_event(event, body):
              event_picture_url or description, otherwise return event which was received
     :raise: BadRequestError: if event status is past
     """
-    if event.status == "past":
+    status = event.current_status()
+    if status == "past":
         logger.error("The event already finished it can not be edited",)
         raise BadRequestError("The event already finished it can not be edited")
-    if event.status == "present":
+    if status == "present":
         event = edit_present_event(event, body)
     else:
         event = edit_future_event(event, body)
@@ -518,11 +869,12 @@ def user_left_event(event):
     return event
 
 
-def create_change_task_to_present_if_event_soon(event):
+def create_change_task_to_present_if_event_soon(event, previous_start_datetime):
     """If event starts in next 7 days task which will change
-    its status to present when it starts is created"""
+    its status to present when it starts is created and task
+    created for previous start datetime is deleted"""
     if event.start_datetime < datetime.now() + timedelta(days=7):
         queue_name = "events-status-to-present"
-        task_name = str(event.key.id())
+        task_name = status_task_name(event.key.id(), previous_start_datetime)
         delete_task(queue_name, task_name)
         create_task_change_status_to_present(event)
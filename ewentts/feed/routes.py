@@ -10,9 +10,10 @@ Attributes:
 import logging
 
 from flask import Blueprint, jsonify
+from google.appengine.ext import ndb
 
-from ewentts.models import Event
-from ewentts.utils import requires_auth, return_jsonified_events, paginate, get_per_page
+from ewentts.models import TimelineEntry, User
+from ewentts.utils import requires_auth, return_jsonified_events, paginate, get_per_page, request_uid
 
 feed = Blueprint("feed", __name__)
 
@@ -23,23 +24,34 @@ logger = logging.getLogger("feed")
 @feed.route("/feed", methods=["GET"])
 @requires_auth
 def basic_feed():
-    """Endpoint which returns feed of events
+    """Endpoint which returns timeline of public events of users the current user follows
+
+    Events are fanned out to timelines of followers of their organiser when they are created,
+    so the timeline is one ancestor query of entries ordered by start_datetime, whose cost does
+    not depend on number of followed users, events of users which are no longer followed,
+    deleted and private events are left out of the page
 
     Properties:
-        event_id: id of event
+        per_page: integer, optional
+        cursor: websafe cursor of the page, optional
 
     Returns:
-        200: events, next_page and list_len in json
+        200: events, next_page and list_len in json, events can be empty if all entries of the page were left out
         204: if no events are available to be returned
         405: if other method then GET used
     """
     logger.info("feed called")
     per_page = get_per_page()
-    query = Event.query().order(Event.start_datetime)
+    user_key = ndb.Key(User, request_uid())
+    query = TimelineEntry.query(ancestor=user_key).order(TimelineEntry.start_datetime)
 
-    events, next_page = paginate(query, per_page)
+    entries, next_page = paginate(query, per_page)
+    user, events = user_key.get(), ndb.get_multi([entry.event for entry in entries])
+    following = set(user.following) if user else set()
+    events = [event for entry, event in zip(entries, events)
+              if event and not event.private and entry.organiser in following]
 
-    if not events:
+    if not events and not next_page:
         logger.warning("no events found")
         return jsonify(""), 204
     logger.info("search finished")
@@ -0,0 +1,87 @@
+"""Module containing geodesic functions used by location search
+
+Distances are computed on sphere with EARTH_RADIUS_KM by haversine formula, which differs from
+ellipsoid distance by less then 0.5 %, bounding boxes are computed in closed form and memoized
+per origin rounded to BOX_ROUNDING decimal places, box of rounded origin is padded by the rounding
+error so it always contains the whole circle around the original point.
+
+Attributes:
+    EARTH_RADIUS_KM: mean radius of the Earth in km
+    BOX_ROUNDING: number of decimal places of coordinates of origin used as key of memoized boxes
+    BOX_CACHE_SIZE: maximal number of memoized boxes, cache is cleared when it is full
+
+"""
+
+import math
+
+import numpy
+
+EARTH_RADIUS_KM = 6371.0088
+BOX_ROUNDING = 3
+BOX_CACHE_SIZE = 10000
+
+_box_cache = {}
+
+
+def distance_km(point1, point2):
+    """Return great-circle distance in km between two tuples of latitude and longitude"""
+    latitude1, longitude1 = math.radians(point1[0]), math.radians(point1[1])
+    latitude2, longitude2 = math.radians(point2[0]), math.radians(point2[1])
+    a = math.sin((latitude2 - latitude1) / 2) ** 2 + \
+        math.cos(latitude1) * math.cos(latitude2) * math.sin((longitude2 - longitude1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distances_km(point, latitudes, longitudes):
+    """Return numpy array of great-circle distances in km between point and arrays of coordinates
+
+    Properties:
+        point: tuple of latitude and longitude
+        latitudes: sequence of latitudes of candidates
+        longitudes: sequence of longitudes of candidates
+    """
+    latitude = math.radians(point[0])
+    longitude = math.radians(point[1])
+    latitudes = numpy.radians(numpy.asarray(latitudes, dtype=float))
+    longitudes = numpy.radians(numpy.asarray(longitudes, dtype=float))
+    a = numpy.sin((latitudes - latitude) / 2) ** 2 + \
+        math.cos(latitude) * numpy.cos(latitudes) * numpy.sin((longitudes - longitude) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.minimum(1.0, numpy.sqrt(a)))
+
+
+def _compute_bounding_box(latitude, longitude, range_km):
+    """Return bounding box of circle with radius range_km around the point"""
+    angular_range = range_km / EARTH_RADIUS_KM
+    latitude_range = math.degrees(angular_range)
+    max_latitude = latitude + latitude_range
+    min_latitude = latitude - latitude_range
+    if max_latitude >= 90 or min_latitude <= -90:
+        return {"maxlatitude": min(max_latitude, 90.0), "minlatitude": max(min_latitude, -90.0),
+                "maxlongitude": 180.0, "minlongitude": -180.0}
+    longitude_range = math.degrees(math.asin(min(1.0, math.sin(angular_range) / math.cos(math.radians(latitude)))))
+    return {"maxlatitude": max_latitude,
+            "minlatitude": min_latitude,
+            "maxlongitude": (longitude + longitude_range + 180) % 360 - 180,
+            "minlongitude": (longitude - longitude_range + 180) % 360 - 180}
+
+
+def bounding_box(point, range_km):
+    """Return bounding box of circle with radius range_km around point
+
+    Properties:
+        point: tuple of latitude and longitude
+        range_km: radius of the circle in km
+
+    Returns:
+        Dictionary of boundaries: maxlatitude, maxlongitude, minlatitude, minlongitude,
+        minlongitude is bigger then maxlongitude if box crosses 180th meridian
+    """
+    key = (round(point[0], BOX_ROUNDING), round(point[1], BOX_ROUNDING), range_km)
+    box = _box_cache.get(key)
+    if box is None:
+        if len(_box_cache) >= BOX_CACHE_SIZE:
+            _box_cache.clear()
+        padding_km = 0.5 * 10 ** -BOX_ROUNDING * math.pi / 180 * EARTH_RADIUS_KM * math.sqrt(2)
+        box = _compute_bounding_box(key[0], key[1], range_km + padding_km)
+        _box_cache[key] = box
+    return box
@@ -0,0 +1,112 @@
+"""Module containing functions for encoding locations to geohash cells
+
+Geohash of precision p divides the world to cells by 5 * p bits alternating between
+longitude and latitude, prefix of geohash is the cell of lower precision containing it,
+so location is stored as list of its cells of all precisions up to MAX_PRECISION and
+radius search becomes equality query on a few cells covering the circle.
+
+Attributes:
+    BASE32: alphabet of geohash
+    MAX_PRECISION: maximal precision of stored cells
+    KM_PER_DEGREE: length of one degree of latitude in km
+
+"""
+
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_PRECISION = 7
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude, longitude, precision=MAX_PRECISION):
+    """Return geohash of the location with precision characters"""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    geohash = ""
+    bits = 0
+    value = 0
+    even = True
+    while len(geohash) < precision:
+        if even:
+            coordinate, interval = longitude, longitude_range
+        else:
+            coordinate, interval = latitude, latitude_range
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash += BASE32[value]
+            bits = 0
+            value = 0
+    return geohash
+
+
+def cell_size(precision):
+    """Return height and width of cell of precision in degrees"""
+    bits = 5 * precision
+    latitude_bits = bits // 2
+    longitude_bits = bits - latitude_bits
+    return 180.0 / 2 ** latitude_bits, 360.0 / 2 ** longitude_bits
+
+
+def location_cells(latitude, longitude):
+    """Return list of cells containing the location of all precisions from 1 to MAX_PRECISION"""
+    geohash = encode(latitude, longitude)
+    return [geohash[:precision] for precision in range(1, MAX_PRECISION + 1)]
+
+
+def cell_radius(latitude, precision):
+    """Return smallest dimension in km of cell of precision at latitude
+
+    Every location in this distance from the cell containing point lies in the cell or its neighbours,
+    width is measured one cell closer to the pole where cells are narrower
+    """
+    height, width = cell_size(precision)
+    cos_latitude = max(math.cos(math.radians(min(abs(latitude) + height, 90))), 0.01)
+    return min(height * KM_PER_DEGREE, width * KM_PER_DEGREE * cos_latitude)
+
+
+def covering_precision(latitude, radius_km):
+    """Return highest precision whose cells at latitude are not smaller then radius_km, 0 if no such precision"""
+    for precision in range(MAX_PRECISION, 0, -1):
+        if cell_radius(latitude, precision) >= radius_km:
+            return precision
+    return 0
+
+
+def neighbour_cells(latitude, longitude, precision):
+    """Return cell of precision containing the location and its 8 neighbours"""
+    height, width = cell_size(precision)
+    cells = []
+    for latitude_step in (-1, 0, 1):
+        neighbour_latitude = latitude + latitude_step * height
+        if neighbour_latitude > 90 or neighbour_latitude < -90:
+            continue
+        for longitude_step in (-1, 0, 1):
+            neighbour_longitude = (longitude + longitude_step * width + 180) % 360 - 180
+            cell = encode(neighbour_latitude, neighbour_longitude, precision)
+            if cell not in cells:
+                cells += [cell]
+    return cells
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Return cells covering circle around the location with radius radius_km
+
+    Cell containing the location and its 8 neighbours are returned, their precision is chosen
+    so cells are at least as big as the radius, so the whole circle lies in them
+
+    Returns:
+        list of geohashes of the same precision, empty list if the circle needs the whole world
+    """
+    precision = covering_precision(latitude, radius_km)
+    if not precision:
+        return []
+    return neighbour_cells(latitude, longitude, precision)
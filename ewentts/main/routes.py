@@ -12,6 +12,8 @@ import logging
 
 from flask import Blueprint, jsonify
 
+from ewentts.search.autocomplete import get_index, KINDS
+from ewentts.search.grid import get_grid
 from ewentts.utils import requires_auth
 
 main = Blueprint("main", __name__)
@@ -32,3 +34,13 @@ def about():
 def home():
     """Home Endpoint"""
     return jsonify("Home"), 200
+
+
+@main.route("/_ah/warmup", methods=["GET"])
+def warmup():
+    """Warm-up Endpoint called by App Engine before instance receives traffic,
+    builds grid of upcoming events and completion indexes of names"""
+    grid = get_grid(wait=True)
+    indexes = [kind for kind in sorted(KINDS) if get_index(kind, wait=True) is not None]
+    logger.info("instance warmed up, grid ready: {}, completion indexes ready: {}".format(grid is not None, indexes))
+    return "", 200
@@ -5,12 +5,34 @@ Module contains following classes:
     User
     DeletedUser
     Event
+    EventSeries
     Post
+    Job
+    EventReminder
+    ReminderShard
+    TileCount
+    EventTile
+    TimelineEntry
+
+Attributes:
+    EVENT_STATUSES: statuses of event in order in which they follow each other
+    TILE_ROOT_KIND: kind of parents of TileCount entities, tiles of one top-level geohash cell during one month
+        have one parent, so tiles of different regions and months are updated in parallel
 
 """
 
+from datetime import datetime
+
 from google.appengine.ext import ndb
 
+from ewentts.days import DEFAULT_TIMEZONE, local_days
+from ewentts.geohash import location_cells
+from ewentts.search.index import mark_for_indexing
+from ewentts.text import prefix_tokens
+
+EVENT_STATUSES = ["future", "present", "past"]
+TILE_ROOT_KIND = "TileRoot"
+
 
 class User(ndb.Model):
     """Class storing users which inherits from ndb.Model
@@ -27,6 +49,8 @@ class User(ndb.Model):
         attending_events (ndb.KeyProperty): list of keys of events user is attending
         declined_events (ndb.KeyProperty): list of keys of events user declined
         visited_events (ndb.KeyProperty): list of keys of events user visited
+        search_tokens (ndb.ComputedProperty): list of normalised prefixes of user names computed on write
+        updated (ndb.DateTimeProperty): datetime in UTC of the last write of the user, used as change cursor
 
     """
     user_names = ndb.StringProperty(repeated=True)
@@ -38,6 +62,8 @@ class User(ndb.Model):
     attending_events = ndb.KeyProperty(kind="Event", repeated=True)
     declined_events = ndb.KeyProperty(kind="Event", repeated=True)
     visited_events = ndb.KeyProperty(kind="Event", repeated=True)
+    search_tokens = ndb.ComputedProperty(lambda self: prefix_tokens(self.user_names), repeated=True)
+    updated = ndb.DateTimeProperty(auto_now=True)
 
     def __repr__(self):
         return "User name: %s User email: %s" % (" ".join(self.user_names), str(self.user_email))
@@ -87,7 +113,8 @@ class Event(ndb.Model):
 
     Attributes:
         event_name (ndb.StringProperty): string containing event name
-        status (ndb.StringProperty): strings containing status of the event past|present|future
+        status (ndb.StringProperty): strings containing status of the event past|present|future,
+            reconciled on every write, current_status() should be used when event is read
         start_datetime (ndb.DateTimeProperty): datetime containing start datetime of the event
         end_datetime (ndb.DateTimeProperty): datetime containing end datetime of the event
         latitude (ndb.FloatProperty): float containing latitude position of the event
@@ -102,12 +129,19 @@ class Event(ndb.Model):
         showed_up (ndb.KeyProperty): list of user keys who are came the event
         left (ndb.KeyProperty): list of user keys who left the event
         posts (ndb.KeyProperty): list of post keys which are posted on the event
+        series (ndb.KeyProperty): key of series of recurring events the event belongs to
+        timezone (ndb.StringProperty): name of timezone from tz database in which the event takes place
+        updated (ndb.DateTimeProperty): datetime in UTC of the last write of the event, used as change cursor
+        name_tokens (ndb.ComputedProperty): list of normalised prefixes of words of event name computed on write
+        geohashes (ndb.ComputedProperty): list of geohash cells of all precisions containing location of the event
+        local_days (ndb.ComputedProperty): list of iso dates of days in timezone of the event
+            during which it takes place
 
     """
     event_name = ndb.StringProperty(required=True)
     status = ndb.StringProperty(required=True)
     start_datetime = ndb.DateTimeProperty(required=True)
-    end_datetime = ndb.DateTimeProperty(indexed=False)
+    end_datetime = ndb.DateTimeProperty()
     latitude = ndb.FloatProperty(required=True)
     longitude = ndb.FloatProperty(required=True)
     location = ndb.GeoPtProperty()
@@ -121,6 +155,13 @@ class Event(ndb.Model):
     showed_up = ndb.KeyProperty(kind=User, repeated=True)
     left = ndb.KeyProperty(kind=User, repeated=True)
     posts = ndb.KeyProperty(kind="Post", repeated=True)
+    series = ndb.KeyProperty(kind="EventSeries")
+    timezone = ndb.StringProperty(default=DEFAULT_TIMEZONE, indexed=False)
+    updated = ndb.DateTimeProperty(auto_now=True)
+    name_tokens = ndb.ComputedProperty(lambda self: prefix_tokens([self.event_name]), repeated=True)
+    geohashes = ndb.ComputedProperty(lambda self: location_cells(self.latitude, self.longitude), repeated=True)
+    local_days = ndb.ComputedProperty(lambda self: local_days(self.start_datetime, self.end_datetime, self.timezone),
+                                      repeated=True)
 
     def __repr__(self):
         return "Event name: %s Start time: %s" % (self.event_name, str(self.start_datetime))
@@ -128,6 +169,65 @@ class Event(ndb.Model):
     def __hash__(self):
         return self.key.id()
 
+    def current_status(self, now=None):
+        """Return status of the event at time now derived from start_datetime and end_datetime
+
+        Status never goes back, if stored status is already further then derived one stored status is returned
+
+        Properties:
+            now: datetime in UTC, if None current time is used
+
+        Returns:
+            status of the event future|present|past
+        """
+        if now is None:
+            now = datetime.utcnow()
+        if self.end_datetime and self.end_datetime <= now:
+            status = "past"
+        elif self.start_datetime <= now:
+            status = "present"
+        else:
+            status = "future"
+        if self.status in EVENT_STATUSES and EVENT_STATUSES.index(self.status) > EVENT_STATUSES.index(status):
+            return self.status
+        return status
+
+    def _pre_put_hook(self):
+        """Reconcile stored status with start_datetime and end_datetime before the event is saved"""
+        self.status = self.current_status()
+
+    def _post_put_hook(self, future):
+        """Mark saved event for indexing in full-text index"""
+        mark_for_indexing(self.key)
+
+    @classmethod
+    def _post_delete_hook(cls, key, future):
+        """Mark deleted event for removal from full-text index"""
+        mark_for_indexing(key)
+
+
+class EventSeries(ndb.Model):
+    """Class storing series of recurring events which inherits from ndb.Model
+
+    Class which is used for saving series linking occurrences of recurring event to the databased
+
+    Attributes:
+        event_name (ndb.StringProperty): string containing name of the events in series
+        organiser (ndb.KeyProperty): key of user who is the organiser of the series
+        frequency (ndb.StringProperty): string containing frequency of the occurrences daily|weekly|monthly
+        interval (ndb.IntegerProperty): integer containing number of frequency units between occurrences
+        occurrences (ndb.KeyProperty): list of keys of events which are occurrences of the series
+
+    """
+    event_name = ndb.StringProperty(required=True)
+    organiser = ndb.KeyProperty(kind=User, required=True)
+    frequency = ndb.StringProperty(required=True, indexed=False)
+    interval = ndb.IntegerProperty(default=1, indexed=False)
+    occurrences = ndb.KeyProperty(kind=Event, repeated=True)
+
+    def __repr__(self):
+        return "Event series name: %s Frequency: %s" % (self.event_name, self.frequency)
+
 
 class Post(ndb.Model):
     """Class storing posts which inherits from ndb.Model
@@ -147,3 +247,136 @@ class Post(ndb.Model):
 
     def __repr__(self):
         return self.content
+
+
+class Job(ndb.Model):
+    """Class storing progress of background jobs which inherits from ndb.Model
+
+    Class which is used for reporting progress of jobs processing entities in chunks
+
+    Attributes:
+        job_type (ndb.StringProperty): string containing type of the job
+        target (ndb.StringProperty): string containing id of the entity the job works on
+        owner (ndb.StringProperty): string containing id of the user who can view the job,
+            None if the job can not be viewed by any user
+        stage (ndb.StringProperty): string containing name of the stage the job is processing
+        processed (ndb.IntegerProperty): integer containing number of entities processed by the job
+        finished (ndb.BooleanProperty): True if job finished False otherwise
+        started_datetime (ndb.DateTimeProperty): datetime signifying when job was started
+        finished_datetime (ndb.DateTimeProperty): datetime signifying when job was finished
+        summary (ndb.JsonProperty): dictionary containing counts of work done by the job
+        last_chunk (ndb.StringProperty): string identifying the last chunk counted by the job,
+            so retried task does not count its chunk twice
+
+    """
+    job_type = ndb.StringProperty(required=True)
+    target = ndb.StringProperty()
+    owner = ndb.StringProperty(indexed=False)
+    stage = ndb.StringProperty(indexed=False)
+    processed = ndb.IntegerProperty(default=0, indexed=False)
+    finished = ndb.BooleanProperty(default=False)
+    started_datetime = ndb.DateTimeProperty(auto_now_add=True)
+    finished_datetime = ndb.DateTimeProperty(indexed=False)
+    summary = ndb.JsonProperty()
+    last_chunk = ndb.StringProperty(indexed=False)
+
+    def __repr__(self):
+        return "Job type: %s Target: %s" % (self.job_type, str(self.target))
+
+
+class EventReminder(ndb.Model):
+    """Class storing fan-out of reminders of one event which inherits from ndb.Model
+
+    Id of the reminder is name of the task which started it, shards of the fan-out are
+    saved as its children of class ReminderShard when they are delivered
+
+    Attributes:
+        event (ndb.KeyProperty): key of the event whose attendees are reminded
+        due_datetime (ndb.DateTimeProperty): datetime signifying when reminders were due
+        started_datetime (ndb.DateTimeProperty): datetime signifying when fan-out was started
+        shards (ndb.IntegerProperty): integer containing number of shards of the fan-out
+        recipients (ndb.IntegerProperty): integer containing number of attendees who are reminded
+
+    """
+    event = ndb.KeyProperty(kind=Event, required=True)
+    due_datetime = ndb.DateTimeProperty(required=True, indexed=False)
+    started_datetime = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+    shards = ndb.IntegerProperty(required=True, indexed=False)
+    recipients = ndb.IntegerProperty(required=True, indexed=False)
+
+    def __repr__(self):
+        return "Reminder of event: %s Shards: %s" % (str(self.event.id()), str(self.shards))
+
+
+class ReminderShard(ndb.Model):
+    """Class storing delivered shard of reminders which inherits from ndb.Model
+
+    Parent of the shard is EventReminder and id is index of the shard plus one,
+    existence of the shard marks that it was already delivered
+
+    Attributes:
+        delivered (ndb.IntegerProperty): integer containing number of reminders delivered by the shard
+        finished_datetime (ndb.DateTimeProperty): datetime signifying when shard was delivered
+
+    """
+    delivered = ndb.IntegerProperty(required=True, indexed=False)
+    finished_datetime = ndb.DateTimeProperty(auto_now_add=True, indexed=False)
+
+    def __repr__(self):
+        return "Reminder shard: %s Delivered: %s" % (str(self.key.id()), str(self.delivered))
+
+
+class TileCount(ndb.Model):
+    """Class storing counts of public events in one map tile during one month which inherits from ndb.Model
+
+    Id of the tile is geohash cell and month separated by "@", e.g. "u2f@2024-05", parent of the tile is key
+    of TILE_ROOT_KIND with id of its top-level cell and month, e.g. "u@2024-05"
+
+    Attributes:
+        counts (ndb.JsonProperty): dictionary of numbers of events starting in the cell by iso dates of local days
+        representatives (ndb.JsonProperty): dictionary of lists of ids of events shown for the cell
+            by iso dates of local days
+
+    """
+    counts = ndb.JsonProperty(required=True)
+    representatives = ndb.JsonProperty(required=True)
+
+    def __repr__(self):
+        return "Tile: %s Events: %s" % (str(self.key.id()), str(sum(self.counts.values())))
+
+
+class EventTile(ndb.Model):
+    """Class storing cell and day in which event is counted in map tiles which inherits from ndb.Model
+
+    Id of the entity is id of the event, it exists only while event is counted
+
+    Attributes:
+        cell (ndb.StringProperty): geohash cell of the highest tile precision containing the event
+        day (ndb.StringProperty): iso date of the first local day of the event
+
+    """
+    cell = ndb.StringProperty(required=True, indexed=False)
+    day = ndb.StringProperty(required=True, indexed=False)
+
+    def __repr__(self):
+        return "Event tile: %s Cell: %s Day: %s" % (str(self.key.id()), self.cell, self.day)
+
+
+class TimelineEntry(ndb.Model):
+    """Class storing public event in timeline of user following its organiser which inherits from ndb.Model
+
+    Parent of the entry is key of the follower and id is id of the event, so timeline of the user
+    is one ancestor query ordered by start_datetime and fan-out of the event can be safely repeated
+
+    Attributes:
+        event (ndb.KeyProperty): key of the event
+        organiser (ndb.KeyProperty): key of organiser of the event
+        start_datetime (ndb.DateTimeProperty): datetime containing start datetime of the event
+
+    """
+    event = ndb.KeyProperty(kind=Event, required=True)
+    organiser = ndb.KeyProperty(kind=User, required=True, indexed=False)
+    start_datetime = ndb.DateTimeProperty(required=True)
+
+    def __repr__(self):
+        return "Timeline of user: %s Event: %s" % (str(self.key.parent().id()), str(self.event.id()))
@@ -0,0 +1,80 @@
+"""Module for handling requests on reminder endpoints and tasks sending reminders
+
+Attributes:
+    reminders: flask Blueprint for calling reminder endpoints
+
+"""
+
+from datetime import datetime
+
+from flask import Blueprint, request
+
+from ewentts.utils import requires_auth, requires_task, request_uid, return_event, check_user_authorised
+from .utils import return_event_for_reminder, start_reminder_fanout, deliver_reminder_shard, \
+    jsonify_reminder, return_event_reminder, logger
+
+reminders = Blueprint("reminders", __name__)
+
+
+@reminders.route("/tasks/send_reminders", methods=["POST"])
+@requires_task
+def send_reminders():
+    """Split attendees of event into shards and create task for every shard
+
+    Properties:
+        event_id: id of the event
+        version: version of start datetime of the event the task was created for
+    """
+    event_id = int(request.form["event_id"])
+    event = return_event_for_reminder(event_id, request.form["version"])
+    if not event:
+        return "done"
+    if event.start_datetime <= datetime.utcnow():
+        logger.warning("event {} already started, reminders not sent".format(event_id))
+        return "done"
+    start_reminder_fanout(event)
+    return "done"
+
+
+@reminders.route("/tasks/send_reminder_shard", methods=["POST"])
+@requires_task
+def send_reminder_shard():
+    """Deliver reminders to one shard of attendees
+
+    Properties:
+        event_id: id of the event
+        reminder_id: id of the reminder
+        shard: index of the shard
+        user_id: ids of users in the shard
+    """
+    event_id = int(request.form["event_id"])
+    reminder_id = request.form["reminder_id"]
+    event = return_event_for_reminder(event_id, reminder_id.split("-")[-1])
+    if not event:
+        return "done"
+    shard = int(request.form["shard"])
+    delivered = deliver_reminder_shard(event, reminder_id, shard, request.form.getlist("user_id"))
+    logger.info("{} reminders of event {} delivered by shard {}".format(delivered, event_id, shard))
+    return "done"
+
+
+@reminders.route("/event/<int:event_id>/reminders", methods=["GET"])
+@requires_auth
+def view_reminders(event_id):
+    """Endpoint which returns progress of reminders sent to attendees of the event
+
+    Properties:
+        event_id: id of event
+
+    Returns:
+        200: progress of reminders and their latency in json
+        403: if some other user then event organiser tried to view the reminders
+        404: if event not found or reminders were not sent yet
+        405: if other method then GET used
+    """
+    event = return_event(event_id)
+    current_user_id = request_uid()
+    if check_user_authorised(current_user=current_user_id, authorised_user=event.organiser.id()):
+        reminder = return_event_reminder(event)
+        json = jsonify_reminder(reminder)
+        return json, 200
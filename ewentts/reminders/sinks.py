@@ -0,0 +1,45 @@
+"""Module containing sinks through which reminders are delivered
+
+Sink is any object with method send receiving list of reminder messages,
+reminders are delivered through sink returned by get_sink, by default LogSink.
+
+Module contains following classes:
+    LogSink
+
+Attributes:
+    logger: Logger for logging in this module
+
+"""
+
+import logging
+
+logger = logging.getLogger("reminders.sinks")
+
+_sink = None
+
+
+class LogSink(object):
+    """Sink which writes reminders to the log"""
+
+    def send(self, messages):
+        """Deliver reminder messages
+
+        Properties:
+            messages: list of dictionaries returned by return_reminder_message
+        """
+        for message in messages:
+            logger.info("reminder of event {} sent to {}".format(message["event_id"], message["user_email"]))
+
+
+def get_sink():
+    """Return sink used for delivering reminders, LogSink if none was set"""
+    global _sink
+    if _sink is None:
+        _sink = LogSink()
+    return _sink
+
+
+def set_sink(sink):
+    """Set sink used for delivering reminders, if None LogSink is used"""
+    global _sink
+    _sink = sink
@@ -0,0 +1,162 @@
+"""Module containing functions used by reminders/routes.py module
+
+Reminders are sent by fan-out, task due REMINDER_LEAD before start of event splits attendees
+into shards of REMINDER_SHARD_SIZE and creates one named task per shard, every shard task
+looks up its users in one batch and delivers reminders through sink, delivered shard is
+marked by ReminderShard so retried tasks do not deliver it again.
+
+Attributes:
+    logger: Logger for logging in reminders package
+    REMINDER_SHARD_SIZE: maximal number of attendees reminded by one task
+
+"""
+
+import logging
+
+from flask import jsonify
+from google.appengine.ext import ndb
+
+from ewentts.models import Event, User, EventReminder, ReminderShard
+from ewentts.scheduler import ScheduledTask, get_scheduler
+from ewentts.utils import error_decorator, NotFoundError, status_task_name, status_task_version, \
+    REMINDERS_QUEUE, REMINDER_LEAD
+from .sinks import get_sink
+
+logger = logging.getLogger("reminders")
+
+REMINDER_SHARD_SIZE = 500
+
+
+def return_event_for_reminder(event_id, version):
+    """Return event if task sending its reminders is not stale, otherwise None
+
+    Properties:
+        event_id: id of the event
+        version: version of the task, compared with version of current start datetime of the event
+    """
+    event = ndb.Key(Event, event_id).get()
+    if not event:
+        logger.warning("event {} does not exist anymore".format(event_id))
+        return None
+    if version != status_task_version(event.start_datetime):
+        logger.info("task sending reminders of event {} is stale".format(event_id))
+        return None
+    return event
+
+
+def split_into_shards(keys, shard_size=REMINDER_SHARD_SIZE):
+    """Return list of lists of keys containing at most shard_size keys"""
+    return [keys[i:i + shard_size] for i in range(0, len(keys), shard_size)]
+
+
+def start_reminder_fanout(event):
+    """Create reminder and tasks delivering its shards
+
+    Reminder and tasks are named after the event and its start datetime,
+    so repeated fan-out of the same event does not create them again
+
+    Properties:
+        event: entity of class Event whose attendees are reminded
+
+    Returns:
+        reminder: entity of class EventReminder
+    """
+    reminder_id = status_task_name(event.key.id(), event.start_datetime)
+    shards = split_into_shards(event.attendees)
+    reminder = EventReminder.get_or_insert(reminder_id,
+                                           event=event.key,
+                                           due_datetime=event.start_datetime - REMINDER_LEAD,
+                                           shards=len(shards),
+                                           recipients=len(event.attendees))
+    tasks = [ScheduledTask("/tasks/send_reminder_shard",
+                           params={"event_id": event.key.id(),
+                                   "reminder_id": reminder_id,
+                                   "shard": i,
+                                   "user_id": [user_key.id() for user_key in shard]},
+                           name="{}-{}".format(reminder_id, i))
+             for i, shard in enumerate(shards)]
+    get_scheduler().add_multi(REMINDERS_QUEUE, tasks)
+    logger.info("reminders of event {} split into {} shards".format(event.key.id(), len(shards)))
+    return reminder
+
+
+def return_reminder_message(user, event):
+    """Return dictionary with reminder of event for user"""
+    return {"user_id": user.key.id(),
+            "user_email": user.user_email,
+            "user_names": " ".join(user.user_names),
+            "event_id": event.key.id(),
+            "event_name": event.event_name,
+            "start_datetime": event.start_datetime.isoformat()}
+
+
+def deliver_reminder_shard(event, reminder_id, shard, user_ids):
+    """Deliver reminders to one shard of attendees unless it was already delivered
+
+    Properties:
+        event: entity of class Event whose attendees are reminded
+        reminder_id: id of the EventReminder
+        shard: index of the shard
+        user_ids: ids of users in the shard
+
+    Returns:
+        number of delivered reminders, 0 if shard was already delivered
+    """
+    shard_key = ndb.Key(EventReminder, reminder_id, ReminderShard, shard + 1)
+    if shard_key.get():
+        logger.info("shard {} of reminder {} already delivered".format(shard, reminder_id))
+        return 0
+    users = ndb.get_multi([ndb.Key(User, user_id) for user_id in user_ids])
+    messages = [return_reminder_message(user, event) for user in users if user]
+    get_sink().send(messages)
+    ReminderShard(key=shard_key, delivered=len(messages)).put()
+    return len(messages)
+
+
+def jsonify_reminder(reminder):
+    """Return progress of reminder in json
+
+    Properties:
+        reminder: entity of class EventReminder
+
+    Returns:
+        Progress of reminder in json:
+            event_id: id of the reminded event
+            recipients: number of attendees who are reminded
+            shards: number of shards of the fan-out
+            delivered_shards: number of shards already delivered
+            delivered: number of reminders already delivered
+            due_datetime: time when reminders were due
+            finished_datetime: time when last shard was delivered, None if not finished yet
+            latency: seconds between due_datetime and finished_datetime, None if not finished yet
+    """
+    shards = ReminderShard.query(ancestor=reminder.key).fetch()
+    finished_datetime = None
+    latency = None
+    if len(shards) >= reminder.shards:
+        finished_datetime = max([shard.finished_datetime for shard in shards] + [reminder.started_datetime])
+        latency = (finished_datetime - reminder.due_datetime).total_seconds()
+        finished_datetime = finished_datetime.isoformat()
+    json = jsonify(event_id=reminder.event.id(),
+                   recipients=reminder.recipients,
+                   shards=reminder.shards,
+                   delivered_shards=len(shards),
+                   delivered=sum(shard.delivered for shard in shards),
+                   due_datetime=reminder.due_datetime.isoformat(),
+                   finished_datetime=finished_datetime,
+                   latency=latency)
+    return json
+
+
+@error_decorator
+def return_event_reminder(event):
+    """Returns reminder of current start datetime of the event
+
+    Raises:
+        NotFoundError: if reminders of the event were not sent yet
+    """
+    reminder = EventReminder.get_by_id(status_task_name(event.key.id(), event.start_datetime))
+    if not reminder:
+        logger.error("reminder of event: %s does not exist", event.key.id())
+        raise NotFoundError("Reminders of this event were not sent yet")
+    return reminder
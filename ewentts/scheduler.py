@@ -0,0 +1,241 @@
+"""Module containing schedulers used for creating background tasks
+
+All tasks of the package are created through scheduler returned by get_scheduler,
+by default it is TaskqueueScheduler adding tasks to App Engine task queues,
+LocalScheduler executes tasks in process on virtual clock and is used for tests and benchmarks.
+
+Module contains following classes:
+    ScheduledTask
+    TaskqueueScheduler
+    LocalScheduler
+
+Attributes:
+    logger: Logger for logging in this module
+    TASK_BATCH_SIZE: maximal number of tasks added to the queue in one call
+
+"""
+
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta
+
+from google.appengine.api import taskqueue
+
+logger = logging.getLogger("ewentts.scheduler")
+
+TASK_BATCH_SIZE = 100
+
+_scheduler = None
+
+
+class ScheduledTask(object):
+    """Class storing task which is to be executed by scheduler
+
+    Attributes:
+        url: url of the task handler
+        method: http method used for calling the handler
+        params: dictionary of parameters send to the handler
+        name: name of the task, tasks with the same name are created only once
+        eta: datetime in UTC when the task is due, if None task is due immediately
+
+    """
+
+    def __init__(self, url, method="POST", params=None, name=None, eta=None):
+        self.url = url
+        self.method = method
+        self.params = params or {}
+        self.name = name
+        self.eta = eta
+
+    def __repr__(self):
+        return "Task url: %s Name: %s Eta: %s" % (self.url, self.name, str(self.eta))
+
+
+class TaskqueueScheduler(object):
+    """Scheduler adding tasks to App Engine task queues"""
+
+    @staticmethod
+    def _return_taskqueue_task(task):
+        """Return taskqueue.Task created from ScheduledTask"""
+        return taskqueue.Task(url=task.url, method=task.method, params=task.params, name=task.name, eta=task.eta)
+
+    def add(self, queue_name, task, transactional=False):
+        """Add task to the queue
+
+        Properties:
+            queue_name: name of the queue
+            task: ScheduledTask
+            transactional: True if task is to be created only if current transaction commits
+
+        Returns:
+            True if task was added, False if task with the same name already exists or was recently deleted
+        """
+        try:
+            taskqueue.Queue(queue_name).add(self._return_taskqueue_task(task), transactional=transactional)
+        except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+            return False
+        return True
+
+    def add_multi(self, queue_name, tasks):
+        """Add tasks to the queue asynchronously in batches of TASK_BATCH_SIZE
+
+        Tasks whose name already exists are skipped
+        """
+        queue = taskqueue.Queue(queue_name)
+        tasks = [self._return_taskqueue_task(task) for task in tasks]
+        rpcs = [queue.add_async(tasks[i:i + TASK_BATCH_SIZE]) for i in range(0, len(tasks), TASK_BATCH_SIZE)]
+        for rpc in rpcs:
+            try:
+                rpc.get_result()
+            except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError,
+                    taskqueue.DuplicateTaskNameError):
+                logger.info("some tasks added to queue {} already exist".format(queue_name))
+
+    def delete(self, queue_name, name):
+        """Delete task from queue by its name"""
+        taskqueue.Queue(queue_name).delete_tasks(taskqueue.Task(name=name))
+
+
+class LocalScheduler(object):
+    """Scheduler executing tasks in process on virtual clock
+
+    Tasks are executed in order of their eta when the clock is moved by run_until or advance,
+    task handlers are called through dispatch function which receives ScheduledTask and
+    returns http status code, failed tasks are retried up to retry_limit times.
+
+    Attributes:
+        now: datetime of the virtual clock
+        dispatch: function executing the task
+        retry_limit: number of retries of failed task
+        executed: number of successfully executed tasks
+        failed: number of tasks which failed after all retries
+        lateness: list of seconds of virtual time between enqueue or eta and execution of tasks
+        durations: list of seconds of real time the handlers of tasks ran
+
+    """
+
+    def __init__(self, dispatch, now=None, retry_limit=3):
+        self.now = now or datetime.utcnow()
+        self.dispatch = dispatch
+        self.retry_limit = retry_limit
+        self.executed = 0
+        self.failed = 0
+        self.lateness = []
+        self.durations = []
+        self._queue = []
+        self._names = set()
+        self._counter = itertools.count()
+        self._run_seconds = 0.0
+
+    @classmethod
+    def for_app(cls, app, now=None, retry_limit=3):
+        """Return scheduler dispatching tasks to handlers of flask app
+
+        Tasks are sent with X-AppEngine-QueueName header, so they pass handlers allowing only task queues
+        """
+        client = app.test_client()
+        headers = {"X-AppEngine-QueueName": "local"}
+
+        def dispatch(task):
+            if task.method == "GET":
+                response = client.open(task.url, method="GET", query_string=task.params or None, headers=headers)
+            else:
+                response = client.open(task.url, method=task.method, data=task.params, headers=headers)
+            return response.status_code
+
+        return cls(dispatch, now=now, retry_limit=retry_limit)
+
+    def _push(self, queue_name, task, retries=0):
+        due = task.eta if task.eta and task.eta > self.now else self.now
+        heapq.heappush(self._queue, (due, next(self._counter), queue_name, task, retries, self.now))
+
+    def add(self, queue_name, task, transactional=False):
+        """Add task to the queue, return False if task with the same name was already added"""
+        if task.name:
+            if (queue_name, task.name) in self._names:
+                return False
+            self._names.add((queue_name, task.name))
+        self._push(queue_name, task)
+        return True
+
+    def add_multi(self, queue_name, tasks):
+        """Add tasks to the queue, tasks whose name was already added are skipped"""
+        for task in tasks:
+            self.add(queue_name, task)
+
+    def delete(self, queue_name, name):
+        """Delete task from queue by its name, name stays reserved like in App Engine"""
+        self._queue = [entry for entry in self._queue if not (entry[2] == queue_name and entry[3].name == name)]
+        heapq.heapify(self._queue)
+        self._names.add((queue_name, name))
+
+    def pending(self):
+        """Return number of tasks waiting for execution"""
+        return len(self._queue)
+
+    def run_until(self, until):
+        """Move virtual clock to until and execute all tasks due before it
+
+        Returns:
+            number of tasks executed
+        """
+        executed = 0
+        started = time.time()
+        while self._queue and self._queue[0][0] <= until:
+            due, _, queue_name, task, retries, enqueued = heapq.heappop(self._queue)
+            self.now = max(self.now, due)
+            task_started = time.time()
+            status_code = self.dispatch(task)
+            self.durations += [time.time() - task_started]
+            if status_code < 300:
+                self.executed += 1
+                executed += 1
+                self.lateness += [(self.now - max(enqueued, task.eta or enqueued)).total_seconds()]
+            elif retries < self.retry_limit:
+                logger.warning("task {} failed with status {}, retrying".format(task, status_code))
+                task.eta = self.now + timedelta(seconds=2 ** retries)
+                self._push(queue_name, task, retries + 1)
+            else:
+                logger.error("task {} failed with status {}".format(task, status_code))
+                self.failed += 1
+        self.now = max(self.now, until)
+        self._run_seconds += time.time() - started
+        return executed
+
+    def advance(self, delta):
+        """Move virtual clock by timedelta delta and execute all tasks due before it"""
+        return self.run_until(self.now + delta)
+
+    def stats(self):
+        """Return dictionary with number of executed and failed tasks, throughput in tasks per second
+        of real time and percentiles of lateness and duration of tasks in seconds"""
+        def percentile(values, fraction):
+            if not values:
+                return None
+            values = sorted(values)
+            return values[min(len(values) - 1, int(len(values) * fraction))]
+
+        return {"executed": self.executed,
+                "failed": self.failed,
+                "pending": self.pending(),
+                "throughput": self.executed / self._run_seconds if self._run_seconds else None,
+                "lateness_p50": percentile(self.lateness, 0.5),
+                "lateness_p95": percentile(self.lateness, 0.95),
+                "duration_p50": percentile(self.durations, 0.5),
+                "duration_p95": percentile(self.durations, 0.95)}
+
+
+def get_scheduler():
+    """Return scheduler used for creating tasks, TaskqueueScheduler if none was set"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TaskqueueScheduler()
+    return _scheduler
+
+
+def set_scheduler(scheduler):
+    """Set scheduler used for creating tasks, if None TaskqueueScheduler is used"""
+    global _scheduler
+    _scheduler = scheduler
@@ -0,0 +1,353 @@
+"""Module containing in-process autocomplete of user and event names
+
+Every instance keeps CompletionIndex of normalised names of users and of public events which did not end,
+weighted by number of followers of the user or attendees of the event. Every word suffix of a name
+is a term, so "jazz night" is completed from "ja" and from "ni". Terms are kept in sorted array, terms
+starting with prefix form one range of it and segment tree of maximal weights returns the heaviest terms
+of the range, so completion reads at most MAX_CANDIDATES terms whatever the number of names.
+Index is built at warm-up, refreshed at most once per REFRESH_INTERVAL from change cursor on updated
+property and rebuilt once per REBUILD_INTERVAL so deleted names are removed. Like search/grid.py requests
+never build or refresh the index themselves, they start background thread which does it and meanwhile
+complete names from the index as it is or fall back to datastore. Index which is used is never changed,
+refresh is applied to its copy which then replaces it. Changed names are kept in overlay searched linearly
+until there are OVERLAY_LIMIT of them and arrays are compiled again, compilation publishes new arrays
+by one assignment.
+
+Module contains following classes:
+    CompletionIndex
+
+Attributes:
+    logger: Logger for logging in this module
+    KINDS: dictionary of models whose names are completed by kinds
+    MAX_NAME_TERMS: maximal number of terms of one name
+    MAX_INDEX_ENTRIES: maximal number of names in one index
+    MAX_CANDIDATES: maximal number of terms read by one completion
+    OVERLAY_LIMIT: number of changed names after which arrays are compiled again
+    REFRESH_INTERVAL: minimal time between refreshes of the index
+    REFRESH_OVERLAP: time by which change cursor is moved back when index is refreshed
+    REFRESH_MAX_CHANGES: maximal number of changed entities read by one refresh, index is rebuilt if there are more
+    REBUILD_INTERVAL: maximal age of the index, older index is rebuilt
+    BUILD_BATCH_SIZE: number of entities read in one batch when index is built
+
+"""
+
+import heapq
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from ewentts.models import Event, User
+from ewentts.search.index import return_minutes
+from ewentts.text import normalise, split_words
+
+logger = logging.getLogger("search.autocomplete")
+
+KINDS = {"user": User, "event": Event}
+MAX_NAME_TERMS = 5
+MAX_INDEX_ENTRIES = 200000
+MAX_CANDIDATES = 100
+OVERLAY_LIMIT = 1000
+REFRESH_INTERVAL = timedelta(seconds=30)
+REFRESH_OVERLAP = timedelta(minutes=1)
+REFRESH_MAX_CHANGES = 5000
+REBUILD_INTERVAL = timedelta(hours=1)
+BUILD_BATCH_SIZE = 500
+
+_indexes = {}
+_locks = dict((kind, threading.Lock()) for kind in KINDS)
+
+
+def return_terms(name):
+    """Return normalised word suffixes of name, at most MAX_NAME_TERMS of them"""
+    words = split_words(name)
+    return [u" ".join(words[i:]) for i in range(min(len(words), MAX_NAME_TERMS))]
+
+
+def _heavier(weights, first, second):
+    """Return position of heavier term, the preceding one if weights are equal, -1 stands for no term"""
+    if first < 0:
+        return second
+    if second < 0:
+        return first
+    if weights[second] > weights[first] or (weights[second] == weights[first] and second < first):
+        return second
+    return first
+
+
+def _heaviest(weights, tree, size, low, high):
+    """Return position of the heaviest term in range from low to high excluding high, -1 if range is empty"""
+    best = -1
+    low += size
+    high += size
+    while low < high:
+        if low & 1:
+            best = _heavier(weights, best, tree[low])
+            low += 1
+        if high & 1:
+            high -= 1
+            best = _heavier(weights, best, tree[high])
+        low //= 2
+        high //= 2
+    return best
+
+
+class CompletionIndex(object):
+    """Class storing weighted names completed by prefix
+
+    Attributes:
+        entries: dictionary of tuples of name, weight and minutes since epoch when name expires by ids
+        compiled: tuple of sorted list of terms of compiled entries, list of ids of entries by terms,
+            array of weights by terms, array of segment tree of positions of maximal weights of ranges
+            of terms, size of leaves of the tree and overlay
+        overlay: dictionary of entries changed since compilation by ids, None if entry was removed
+        since: datetime in UTC of the last change read from change cursor
+        refreshed: datetime in UTC of the last refresh
+        built: datetime in UTC when the index was built
+        ready: False if index overflowed and can not be used
+    """
+
+    def __init__(self, max_entries=MAX_INDEX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = {}
+        self.overlay = {}
+        self.compiled = ([], [], array("l"), array("l"), 0, self.overlay)
+        self.since = None
+        self.refreshed = None
+        self.built = None
+        self.ready = True
+
+    def __len__(self):
+        return len(self.entries)
+
+    def copy(self):
+        """Return copy of the index which can be changed while this index is used, compiled arrays are shared"""
+        index = CompletionIndex(self.max_entries)
+        index.entries = dict(self.entries)
+        index.overlay = dict(self.overlay)
+        index.compiled = self.compiled[:5] + (index.overlay,)
+        index.since = self.since
+        index.refreshed = self.refreshed
+        index.built = self.built
+        index.ready = self.ready
+        return index
+
+    def put(self, entry_id, name, weight, expires=None):
+        """Put name to the index, name with the same id is replaced
+
+        Returns:
+            False if index is full and is no longer ready, True otherwise
+        """
+        if entry_id not in self.entries and len(self.entries) >= self.max_entries:
+            logger.warning("completion index is full with {} names".format(len(self.entries)))
+            self.ready = False
+            return False
+        self.entries[entry_id] = (name, weight, expires)
+        self.overlay[entry_id] = self.entries[entry_id]
+        return True
+
+    def remove(self, entry_id):
+        """Remove name from the index if it is there"""
+        if self.entries.pop(entry_id, None) is not None:
+            self.overlay[entry_id] = None
+
+    def compile(self):
+        """Compile sorted arrays of terms of all entries with new overlay and publish them by one assignment"""
+        terms = sorted(((term, -weight, entry_id) for entry_id, (name, weight, _) in self.entries.items()
+                        for term in return_terms(name)))
+        weights = array("l", [-weight for _, weight, _ in terms])
+        size = 1
+        while size < len(terms):
+            size *= 2
+        tree = array("l", [-1] * (2 * size))
+        for position in range(len(terms)):
+            tree[size + position] = position
+        for node in range(size - 1, 0, -1):
+            tree[node] = _heavier(weights, tree[2 * node], tree[2 * node + 1])
+        self.overlay = {}
+        self.compiled = ([term for term, _, _ in terms], [entry_id for _, _, entry_id in terms], weights, tree,
+                         size, self.overlay)
+
+    def complete(self, prefix, k, now_minutes=None):
+        """Return k heaviest names having term starting with normalised prefix
+
+        Properties:
+            prefix: text typed by user
+            k: number of names to be returned
+            now_minutes: minutes since epoch, names expiring before are left out, if None none are left out
+
+        Returns:
+            list of tuples of id, name and weight ordered by weight
+        """
+        prefix = u" ".join(split_words(prefix)) + (u" " if normalise(prefix)[-1:].isspace() else u"")
+        if not prefix.strip():
+            return []
+
+        def valid(entry):
+            return entry is not None and (entry[2] is None or now_minutes is None or entry[2] >= now_minutes)
+
+        terms, owners, weights, tree, size, overlay = self.compiled
+        found = {}
+        low = bisect_left(terms, prefix)
+        high = bisect_left(terms, prefix + u"\uffff")
+        heap = []
+
+        def push(low, high):
+            if low < high:
+                position = _heaviest(weights, tree, size, low, high)
+                heapq.heappush(heap, (-weights[position], position, low, high))
+
+        push(low, high)
+        candidates = 0
+        while heap and len(found) < k and candidates < MAX_CANDIDATES:
+            _, position, low, high = heapq.heappop(heap)
+            candidates += 1
+            entry_id = owners[position]
+            entry = self.entries.get(entry_id)
+            if entry_id not in found and entry_id not in overlay and valid(entry):
+                found[entry_id] = entry
+            push(low, position)
+            push(position + 1, high)
+        for entry_id, entry in list(overlay.items()):
+            if valid(entry) and any(term.startswith(prefix) for term in return_terms(entry[0])):
+                found[entry_id] = entry
+        completions = sorted(((entry_id, name, weight) for entry_id, (name, weight, _) in found.items()),
+                             key=lambda completion: (-completion[2], normalise(completion[1])))
+        return completions[:k]
+
+
+def return_entry(kind, entity, now):
+    """Return tuple of name, weight and expiration of entity, None if its name is not completed
+
+    Names of users are weighted by number of followers, names of public events which did not end
+    by number of attendees and expire at end of the event
+    """
+    if kind == "user":
+        return " ".join(entity.user_names), len(entity.followers), None
+    if entity.private or entity.current_status(now) == "past":
+        return None
+    return entity.event_name, len(entity.attendees), return_minutes(entity.end_datetime or entity.start_datetime)
+
+
+def _put_entity(index, kind, entity, now):
+    entry = return_entry(kind, entity, now)
+    if entry is None:
+        index.remove(entity.key.id())
+        return True
+    return index.put(entity.key.id(), *entry)
+
+
+def build_index(kind, now=None):
+    """Build completion index of names of kind from datastore
+
+    Returns:
+        CompletionIndex, it is not ready if there are more then MAX_INDEX_ENTRIES names
+    """
+    if now is None:
+        now = datetime.utcnow()
+    index = CompletionIndex()
+    index.since = now
+    query = KINDS[kind].query()
+    if kind == "event":
+        query = query.filter(Event.private == False)
+    for entity in query.iter(batch_size=BUILD_BATCH_SIZE):
+        if not _put_entity(index, kind, entity, now):
+            break
+    index.compile()
+    index.refreshed = index.built = now
+    logger.info("completion index of {} {} names built, ready: {}".format(len(index), kind, index.ready))
+    return index
+
+
+def refresh_index(index, kind, now=None):
+    """Apply changes of entities since the last refresh to index, compile it if overlay is full
+
+    Returns:
+        False if there were more then REFRESH_MAX_CHANGES changes or index is older then REBUILD_INTERVAL
+        and has to be rebuilt, True otherwise
+    """
+    if now is None:
+        now = datetime.utcnow()
+    if index.built + REBUILD_INTERVAL < now:
+        return False
+    model = KINDS[kind]
+    changes = model.query(model.updated > index.since - REFRESH_OVERLAP).order(model.updated) \
+        .fetch(REFRESH_MAX_CHANGES + 1)
+    if len(changes) > REFRESH_MAX_CHANGES:
+        logger.warning("too many changes of {} names since {}".format(kind, index.since))
+        return False
+    for entity in changes:
+        _put_entity(index, kind, entity, now)
+        index.since = max(index.since, entity.updated)
+    if len(index.overlay) >= OVERLAY_LIMIT:
+        index.compile()
+    index.refreshed = now
+    logger.info("completion index of {} names refreshed with {} changes".format(kind, len(changes)))
+    return True
+
+
+def update_index(kind, now):
+    """Refresh copy of completion index of kind and replace the index by it, build new index
+    if refresh is not possible
+
+    Must be called with lock of the kind acquired
+    """
+    index = _indexes.get(kind)
+    refreshed = None
+    if index is not None and index.ready:
+        refreshed = index.copy()
+        if not refresh_index(refreshed, kind, now) or not refreshed.ready:
+            refreshed = None
+    _indexes[kind] = refreshed or build_index(kind, now)
+
+
+def _update_index_and_release(kind, now):
+    try:
+        update_index(kind, now)
+    except Exception:
+        logger.exception("update of completion index of {} names failed".format(kind))
+    finally:
+        _locks[kind].release()
+
+
+def get_index(kind, now=None, wait=False):
+    """Return ready completion index of kind of this instance, start its build or refresh if needed
+
+    Only one thread builds or refreshes index of one kind, other threads meanwhile use the index as it is,
+    or receive None if it was not built yet. Index which is not ready is rebuilt at most once
+    per REBUILD_INTERVAL.
+
+    Properties:
+        kind: kind of completed names in KINDS
+        now: datetime in UTC, current time if None
+        wait: True if index is built or refreshed by calling thread, used by warm-up,
+            otherwise it is done by background thread and index as it is returned
+
+    Returns:
+        CompletionIndex or None if index is not ready
+    """
+    if now is None:
+        now = datetime.utcnow()
+    index = _indexes.get(kind)
+    if index is None or index.refreshed + (REFRESH_INTERVAL if index.ready else REBUILD_INTERVAL) < now:
+        if _locks[kind].acquire(False):
+            if wait:
+                _update_index_and_release(kind, now)
+                index = _indexes.get(kind)
+            else:
+                try:
+                    threading.Thread(target=_update_index_and_release, args=(kind, now),
+                                     name="completion-index-update").start()
+                except Exception:
+                    _locks[kind].release()
+                    raise
+    if index is None or not index.ready:
+        return None
+    return index
+
+
+def set_index(kind, index):
+    """Set completion index of kind of this instance, if None index is built by background thread
+    started by the next request"""
+    _indexes[kind] = index
@@ -0,0 +1,124 @@
+"""Module containing cache of pages of search results
+
+Page of search is cached as list of keys of found entities and cursor of the next page,
+keyed by normalised parameters of the search, so the same search of many users is computed
+once per RESULT_TTL and its entities are read by one batch get. Pages are stored in memcache
+with in-process front kept for LOCAL_TTL. Invalidation is coarse, entries expire after RESULT_TTL
+and every key contains generation of the cache, which is bumped when events are written
+if SEARCH_CACHE_BUMP_ON_WRITE environment variable is not "false".
+
+Attributes:
+    logger: Logger for logging in this module
+    RESULT_TTL: number of seconds pages are cached in memcache
+    LOCAL_TTL: number of seconds pages and generation are cached in process
+    LOCAL_CACHE_SIZE: maximal number of pages cached in process, cache is cleared when it is full
+    LOCATION_ROUNDING: number of decimal places to which searched locations are rounded
+    KEY_PREFIX: prefix of memcache keys of pages
+    GENERATION_KEY: memcache key of generation of the cache
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+logger = logging.getLogger("search.cache")
+
+RESULT_TTL = 60
+LOCAL_TTL = 5
+LOCAL_CACHE_SIZE = 1000
+LOCATION_ROUNDING = 3
+KEY_PREFIX = "search-page:"
+GENERATION_KEY = "search-generation"
+
+_local_pages = {}
+_local_generation = [None, 0]
+
+
+def bump_on_write():
+    """Return True if generation is to be bumped when events are written"""
+    return os.environ.get("SEARCH_CACHE_BUMP_ON_WRITE", "true").lower() != "false"
+
+
+def return_generation():
+    """Return current generation of the cache, generation is read from memcache at most once per LOCAL_TTL"""
+    generation, expires = _local_generation
+    if generation is None or expires < time.time():
+        generation = memcache.get(GENERATION_KEY) or 0
+        _local_generation[:] = [generation, time.time() + LOCAL_TTL]
+    return generation
+
+
+def bump_generation():
+    """Bump generation of the cache so all cached pages are recomputed"""
+    generation = memcache.incr(GENERATION_KEY, initial_value=0)
+    _local_generation[:] = [generation, time.time() + LOCAL_TTL]
+    logger.info("search cache generation bumped to {}".format(generation))
+
+
+def round_point(point):
+    """Return location rounded to LOCATION_ROUNDING decimal places"""
+    return round(point[0], LOCATION_ROUNDING), round(point[1], LOCATION_ROUNDING)
+
+
+def return_cache_key(namespace, params):
+    """Return memcache key of page of search in namespace with normalised params"""
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+    return "{}{}:{}:{}".format(KEY_PREFIX, namespace, return_generation(), digest)
+
+
+def _get_local(key):
+    entry = _local_pages.get(key)
+    if entry and entry[0] >= time.time():
+        return entry[1]
+    return None
+
+
+def _set_local(key, value):
+    if len(_local_pages) >= LOCAL_CACHE_SIZE:
+        _local_pages.clear()
+    _local_pages[key] = (time.time() + LOCAL_TTL, value)
+
+
+def cached_page(namespace, params, compute):
+    """Return page of search from cache, compute and cache it if it is not cached
+
+    Properties:
+        namespace: name of the search
+        params: dictionary of normalised parameters of the search including cursor, if None cache is not used
+        compute: function returning entities, next_page and info of the page
+
+    Returns:
+        entities: list of entities read by one batch get, entities deleted since caching are left out
+        next_page: cursor of the next page
+        info: info returned by compute
+    """
+    if params is None:
+        return compute()
+    key = return_cache_key(namespace, params)
+    page = _get_local(key)
+    if page is None:
+        page = memcache.get(key)
+        if page is not None:
+            _set_local(key, page)
+    if page is None:
+        logger.info("search page {} not cached".format(key))
+        entities, next_page, info = compute()
+        page = {"keys": [entity.key for entity in entities], "next_page": next_page, "info": info}
+        memcache.set(key, page, time=RESULT_TTL)
+        _set_local(key, page)
+        return entities, next_page, info
+    logger.info("search page {} read from cache".format(key))
+    entities = [entity for entity in ndb.get_multi(page["keys"]) if entity]
+    return entities, page["next_page"], page["info"]
+
+
+def clear_local():
+    """Clear in-process front of the cache"""
+    _local_pages.clear()
+    _local_generation[:] = [None, 0]
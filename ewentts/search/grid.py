@@ -0,0 +1,356 @@
+"""Module containing in-process spatial grid of upcoming public events
+
+Every instance keeps coordinates and start of upcoming public events in arrays indexed
+by slot and buckets slots by cells of GRID_CELL_DEGREES, so nearest events are found without
+datastore query. Grid is built at warm-up and refreshed at most once per REFRESH_INTERVAL from change
+cursor on Event.updated, queried with REFRESH_OVERLAP because global queries are eventually consistent.
+Requests never build or refresh the grid themselves, they start background thread which does it and
+meanwhile search the grid as it is or fall back to datastore. Grid which is searched is never changed,
+refresh is applied to its copy which then replaces it. Grid holds at most MAX_GRID_EVENTS events,
+when there are more of them it is not ready, searches fall back to datastore and grid is rebuilt
+once per REBUILD_INTERVAL.
+
+Module contains following classes:
+    SpatialGrid
+
+Attributes:
+    logger: Logger for logging in this module
+    GRID_CELL_DEGREES: size of cell of the grid in degrees
+    MAX_GRID_EVENTS: maximal number of events held by the grid
+    REFRESH_INTERVAL: minimal time between refreshes of the grid
+    REBUILD_INTERVAL: minimal time between rebuilds of grid which is not ready
+    REFRESH_OVERLAP: time by which change cursor is moved back when grid is refreshed
+    REFRESH_MAX_CHANGES: maximal number of changed events read by one refresh, grid is rebuilt if there are more
+    BUILD_BATCH_SIZE: number of events read in one batch when grid is built
+
+"""
+
+import itertools
+import logging
+import math
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+import numpy
+from google.appengine.ext import ndb
+
+from ewentts.geo import bounding_box, distance_km, distances_km, EARTH_RADIUS_KM
+from ewentts.models import Event
+from ewentts.search.index import return_minutes
+
+logger = logging.getLogger("search.grid")
+
+GRID_CELL_DEGREES = 0.1
+MAX_GRID_EVENTS = 50000
+REFRESH_INTERVAL = timedelta(seconds=30)
+REBUILD_INTERVAL = timedelta(minutes=10)
+REFRESH_OVERLAP = timedelta(minutes=1)
+REFRESH_MAX_CHANGES = 5000
+BUILD_BATCH_SIZE = 500
+
+_grid = None
+_lock = threading.Lock()
+
+
+class SpatialGrid(object):
+    """Class storing locations and starts of events bucketed by cells of the grid
+
+    Attributes:
+        cell_degrees: size of cell in degrees
+        max_events: maximal number of held events
+        latitudes, longitudes: arrays of coordinates of events by slot
+        starts: array of minutes since epoch of start of events by slot
+        event_ids: array of ids of events by slot
+        slots: dictionary of slots by ids of events
+        cells: dictionary of sets of slots by cells
+        since: datetime in UTC of the last change read from change cursor
+        refreshed: datetime in UTC of the last refresh
+        ready: False if grid overflowed and can not be used
+    """
+
+    def __init__(self, cell_degrees=GRID_CELL_DEGREES, max_events=MAX_GRID_EVENTS):
+        self.cell_degrees = cell_degrees
+        self.max_events = max_events
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.starts = array("l")
+        self.event_ids = array("l")
+        self.slots = {}
+        self.cells = {}
+        self.since = None
+        self.refreshed = None
+        self.ready = True
+        self._free = []
+        self._columns = int(round(360 / cell_degrees))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def copy(self):
+        """Return copy of the grid which can be changed while this grid is searched"""
+        grid = SpatialGrid(self.cell_degrees, self.max_events)
+        grid.latitudes = array("d", self.latitudes)
+        grid.longitudes = array("d", self.longitudes)
+        grid.starts = array("l", self.starts)
+        grid.event_ids = array("l", self.event_ids)
+        grid.slots = dict(self.slots)
+        grid.cells = dict((cell, set(slots)) for cell, slots in self.cells.items())
+        grid.since = self.since
+        grid.refreshed = self.refreshed
+        grid.ready = self.ready
+        grid._free = list(self._free)
+        return grid
+
+    def _cell(self, latitude, longitude):
+        return (int(math.floor((latitude + 90) / self.cell_degrees)),
+                int(math.floor((longitude + 180) / self.cell_degrees)) % self._columns)
+
+    def put(self, event_id, latitude, longitude, start):
+        """Put event to the grid, event with the same id is replaced
+
+        Properties:
+            event_id: integer id of the event
+            latitude, longitude: location of the event
+            start: minutes since epoch of start of the event
+
+        Returns:
+            False if grid is full and is no longer ready, True otherwise
+        """
+        self.remove(event_id)
+        if len(self.slots) >= self.max_events:
+            logger.warning("grid is full with {} events".format(len(self.slots)))
+            self.ready = False
+            return False
+        if self._free:
+            slot = self._free.pop()
+            self.latitudes[slot], self.longitudes[slot] = latitude, longitude
+            self.starts[slot], self.event_ids[slot] = start, event_id
+        else:
+            slot = len(self.event_ids)
+            self.latitudes.append(latitude)
+            self.longitudes.append(longitude)
+            self.starts.append(start)
+            self.event_ids.append(event_id)
+        self.slots[event_id] = slot
+        self.cells.setdefault(self._cell(latitude, longitude), set()).add(slot)
+        return True
+
+    def remove(self, event_id):
+        """Remove event from the grid if it is there"""
+        slot = self.slots.pop(event_id, None)
+        if slot is None:
+            return
+        cell = self._cell(self.latitudes[slot], self.longitudes[slot])
+        self.cells[cell].discard(slot)
+        if not self.cells[cell]:
+            del self.cells[cell]
+        self._free.append(slot)
+
+    def remove_started(self, now_minutes):
+        """Remove events which started before now_minutes"""
+        for event_id, slot in list(self.slots.items()):
+            if self.starts[slot] < now_minutes:
+                self.remove(event_id)
+
+    def _slots_in_box(self, box):
+        """Return iterator of slots in cells intersecting bounding box"""
+        min_row, min_column = self._cell(box["minlatitude"], box["minlongitude"])
+        max_row, max_column = self._cell(box["maxlatitude"], box["maxlongitude"])
+        if box["maxlongitude"] - box["minlongitude"] >= 360 - self.cell_degrees:
+            min_column, max_column = 0, self._columns - 1
+        if min_column <= max_column:
+            columns = (max_column - min_column + 1)
+        else:
+            columns = self._columns - min_column + max_column + 1
+        if (max_row - min_row + 1) * columns > len(self.cells):
+            cells = [cell for cell in self.cells if min_row <= cell[0] <= max_row and
+                     ((min_column <= cell[1] <= max_column) if min_column <= max_column
+                      else (cell[1] >= min_column or cell[1] <= max_column))]
+        else:
+            cells = [(row, (min_column + i) % self._columns)
+                     for row in range(min_row, max_row + 1) for i in range(columns)]
+        return itertools.chain.from_iterable(self.cells.get(cell, ()) for cell in cells)
+
+    def search(self, point, range_km, starts_after, starts_before=None):
+        """Return events starting in time window in distance range_km from point
+
+        Properties:
+            point: tuple of latitude and longitude
+            range_km: radius of search in km
+            starts_after: minutes since epoch after which events start
+            starts_before: minutes since epoch before which events start, optional
+
+        Returns:
+            list of tuples of distance in km and id of event ordered by distance
+        """
+        if not self.slots:
+            return []
+        slots = numpy.fromiter(self._slots_in_box(bounding_box(point, range_km)), dtype=int)
+        starts = numpy.frombuffer(self.starts, dtype=numpy.dtype("l"))[slots]
+        mask = starts > starts_after
+        if starts_before is not None:
+            mask &= starts < starts_before
+        slots = slots[mask]
+        distances = distances_km(point, numpy.frombuffer(self.latitudes)[slots],
+                                 numpy.frombuffer(self.longitudes)[slots])
+        mask = distances <= range_km
+        order = numpy.argsort(distances[mask], kind="mergesort")
+        event_ids = numpy.frombuffer(self.event_ids, dtype=numpy.dtype("l"))[slots[mask]][order]
+        return list(zip(distances[mask][order].tolist(), event_ids.tolist()))
+
+    def nearest(self, point, k, starts_after, starts_before=None):
+        """Return k events nearest to point starting in time window
+
+        Searched radius starts at size of one cell and doubles until k events are found or the whole world is searched
+
+        Returns:
+            list of tuples of distance in km and id of event ordered by distance
+        """
+        range_km = self.cell_degrees * math.pi / 180 * EARTH_RADIUS_KM
+        while True:
+            found = self.search(point, range_km, starts_after, starts_before)
+            if len(found) >= k or range_km >= math.pi * EARTH_RADIUS_KM:
+                return found[:k]
+            range_km *= 2
+
+
+def qualifies(event, now):
+    """Return True if event is upcoming public event held by the grid"""
+    return not event.private and event.start_datetime > now and event.current_status(now) == "future"
+
+
+def build_grid(now=None):
+    """Build grid of upcoming public events from datastore
+
+    Returns:
+        SpatialGrid, it is not ready if there are more then MAX_GRID_EVENTS events
+    """
+    if now is None:
+        now = datetime.utcnow()
+    grid = SpatialGrid()
+    grid.since = now
+    query = Event.query(Event.status == "future", Event.private == False)
+    for event in query.iter(batch_size=BUILD_BATCH_SIZE):
+        if qualifies(event, now) and not grid.put(event.key.id(), event.latitude, event.longitude,
+                                                  return_minutes(event.start_datetime)):
+            break
+    grid.refreshed = now
+    logger.info("grid of {} events built, ready: {}".format(len(grid), grid.ready))
+    return grid
+
+
+def refresh_grid(grid, now=None):
+    """Apply changes of events since the last refresh to grid and remove started events
+
+    Returns:
+        False if there were more then REFRESH_MAX_CHANGES changes and grid has to be rebuilt, True otherwise
+    """
+    if now is None:
+        now = datetime.utcnow()
+    changes = Event.query(Event.updated > grid.since - REFRESH_OVERLAP).order(Event.updated) \
+        .fetch(REFRESH_MAX_CHANGES + 1)
+    if len(changes) > REFRESH_MAX_CHANGES:
+        logger.warning("too many changes of events since {}".format(grid.since))
+        return False
+    for event in changes:
+        if qualifies(event, now):
+            grid.put(event.key.id(), event.latitude, event.longitude, return_minutes(event.start_datetime))
+        else:
+            grid.remove(event.key.id())
+        grid.since = max(grid.since, event.updated)
+    grid.remove_started(return_minutes(now))
+    grid.refreshed = now
+    logger.info("grid refreshed with {} changes".format(len(changes)))
+    return True
+
+
+def update_grid(now):
+    """Refresh copy of the grid and replace the grid by it, build new grid if refresh is not possible
+
+    Must be called with _lock acquired
+    """
+    global _grid
+    grid = _grid
+    refreshed = None
+    if grid is not None and grid.ready:
+        refreshed = grid.copy()
+        if not refresh_grid(refreshed, now) or not refreshed.ready:
+            refreshed = None
+    _grid = refreshed or build_grid(now)
+
+
+def _update_grid_and_release(now):
+    try:
+        update_grid(now)
+    except Exception:
+        logger.exception("update of grid failed")
+    finally:
+        _lock.release()
+
+
+def get_grid(now=None, wait=False):
+    """Return ready grid of this instance, start its build or refresh if needed
+
+    Only one thread builds or refreshes the grid, other threads meanwhile search the grid as it is,
+    or receive None if it was not built yet. Grid which is not ready is rebuilt at most once
+    per REBUILD_INTERVAL.
+
+    Properties:
+        now: datetime in UTC, current time if None
+        wait: True if grid is built or refreshed by calling thread, used by warm-up,
+            otherwise it is done by background thread and grid as it is returned
+
+    Returns:
+        SpatialGrid or None if grid is not ready
+    """
+    if now is None:
+        now = datetime.utcnow()
+    grid = _grid
+    if grid is None or grid.refreshed + (REFRESH_INTERVAL if grid.ready else REBUILD_INTERVAL) < now:
+        if _lock.acquire(False):
+            if wait:
+                _update_grid_and_release(now)
+                grid = _grid
+            else:
+                try:
+                    threading.Thread(target=_update_grid_and_release, args=(now,), name="grid-update").start()
+                except Exception:
+                    _lock.release()
+                    raise
+    if grid is None or not grid.ready:
+        return None
+    return grid
+
+
+def find_nearest_upcoming(point, k, starts_after, starts_before=None):
+    """Return k upcoming public events nearest to point found in grid of this instance
+
+    Events found in grid are read by one batch get and checked again, so events deleted or changed
+    since the last refresh are left out and distances of moved events are recomputed
+
+    Properties:
+        point: tuple of latitude and longitude
+        k: number of events to be returned
+        starts_after: datetime in UTC after which events start, it is not before current time
+        starts_before: datetime in UTC before which events start, optional
+
+    Returns:
+        list of tuples of distance in km and event ordered by distance, None if grid is not ready
+    """
+    grid = get_grid()
+    if grid is None:
+        return None
+    found = grid.nearest(point, 2 * k, return_minutes(starts_after),
+                         return_minutes(starts_before) if starts_before else None)
+    events = ndb.get_multi([ndb.Key(Event, event_id) for _, event_id in found])
+    nearest = [(distance_km(point, (event.latitude, event.longitude)), event) for event in events
+               if event and qualifies(event, starts_after) and (starts_before is None or
+                                                                event.start_datetime < starts_before)]
+    return sorted(nearest, key=lambda pair: pair[0])[:k]
+
+
+def set_grid(grid):
+    """Set grid of this instance, if None grid is built by the next request"""
+    global _grid
+    _grid = grid
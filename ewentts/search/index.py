@@ -0,0 +1,294 @@
+"""Module containing full-text index of events
+
+Every write and delete of event marks its key for indexing, marked keys are sent at the end
+of the request to background tasks in batches of INDEX_BATCH_SIZE, the task reads current
+state of the events and puts their documents to the index or deletes them from it.
+The same keys are sent in batches of TILE_BATCH_SIZE to tasks updating counts of map tiles,
+see search/tiles.py.
+Index is accessed through backend returned by get_backend, by default SearchApiBackend
+using App Engine Search API, InMemoryBackend keeps inverted index in process and is used
+for tests and benchmarks.
+
+Module contains following classes:
+    IndexQuery
+    SearchApiBackend
+    InMemoryBackend
+
+Attributes:
+    logger: Logger for logging in this module
+    INDEX_NAME: name of the Search API index of events
+    INDEX_QUEUE: name of the queue used for indexing tasks
+    INDEX_BATCH_SIZE: maximal number of documents put to the index in one call
+    TILE_QUEUE: name of the queue used for tasks updating counts of map tiles
+    TILE_BATCH_SIZE: maximal number of events whose tiles are updated by one task
+
+"""
+
+import calendar
+import logging
+
+from flask import g, has_request_context
+from google.appengine.api import search
+
+from ewentts.geo import distances_km
+from ewentts.search.cache import bump_generation, bump_on_write
+from ewentts.scheduler import ScheduledTask, get_scheduler
+from ewentts.text import prefix_tokens
+
+logger = logging.getLogger("search.index")
+
+INDEX_NAME = "events"
+INDEX_QUEUE = "search-index"
+INDEX_BATCH_SIZE = 200
+TILE_QUEUE = "tile-counts"
+TILE_BATCH_SIZE = 30
+
+_backend = None
+
+
+def return_minutes(value):
+    """Return number of minutes since epoch of datetime, None if value is None"""
+    if value is None:
+        return None
+    return calendar.timegm(value.timetuple()) // 60
+
+
+def return_event_document(event):
+    """Return document of event as dictionary
+
+    Properties:
+        event: entity of class Event
+
+    Returns:
+        dictionary containing:
+            doc_id: id of the event as string
+            tokens: normalised prefix tokens of event name and description
+            event_name, description: texts of the event
+            start, end: minutes since epoch of start_datetime and end_datetime
+            private: True if event private False otherwise
+            status: stored status of the event
+            latitude, longitude: location of the event
+            days: iso dates of local days of the event
+    """
+    return {"doc_id": str(event.key.id()),
+            "tokens": prefix_tokens([event.event_name, event.description or ""]),
+            "event_name": event.event_name,
+            "description": event.description or "",
+            "start": return_minutes(event.start_datetime),
+            "end": return_minutes(event.end_datetime or event.start_datetime),
+            "private": bool(event.private),
+            "status": event.status,
+            "latitude": event.latitude,
+            "longitude": event.longitude,
+            "days": list(event.local_days)}
+
+
+class IndexQuery(object):
+    """Class storing query of the index, filters which are None are not applied
+
+    Attributes:
+        tokens: list of normalised tokens which all must be in the document
+        private: True|False
+        status: future|present|past
+        starts_after: datetime after which event starts
+        starts_before: datetime before which event starts
+        point: tuple of latitude and longitude
+        radius: distance from point in meters
+        days: list of iso dates, document must take place on any of them
+    """
+
+    def __init__(self, tokens=None, private=None, status=None, starts_after=None, starts_before=None,
+                 point=None, radius=None, days=None):
+        self.tokens = tokens or []
+        self.private = private
+        self.status = status
+        self.starts_after = starts_after
+        self.starts_before = starts_before
+        self.point = point
+        self.radius = radius
+        self.days = days or []
+
+
+class SearchApiBackend(object):
+    """Backend storing documents in App Engine Search API index"""
+
+    def __init__(self, index_name=INDEX_NAME):
+        self.index = search.Index(name=index_name)
+
+    @staticmethod
+    def _return_search_document(document):
+        """Return search.Document created from dictionary returned by return_event_document"""
+        fields = [search.TextField(name="tokens", value=" ".join(document["tokens"])),
+                  search.TextField(name="event_name", value=document["event_name"]),
+                  search.TextField(name="description", value=document["description"]),
+                  search.NumberField(name="start", value=document["start"]),
+                  search.NumberField(name="end", value=document["end"]),
+                  search.AtomField(name="private", value=str(document["private"])),
+                  search.AtomField(name="status", value=document["status"]),
+                  search.GeoField(name="location", value=search.GeoPoint(document["latitude"],
+                                                                         document["longitude"]))]
+        fields += [search.AtomField(name="day", value=day) for day in document.get("days", [])]
+        return search.Document(doc_id=document["doc_id"], fields=fields)
+
+    @staticmethod
+    def _return_query_string(query):
+        """Return Search API query string of IndexQuery"""
+        parts = ['tokens:"{}"'.format(token) for token in query.tokens]
+        if query.private is not None:
+            parts += ["private:{}".format(query.private)]
+        if query.status:
+            parts += ["status:{}".format(query.status)]
+        if query.starts_after:
+            parts += ["start >= {}".format(return_minutes(query.starts_after))]
+        if query.starts_before:
+            parts += ["start < {}".format(return_minutes(query.starts_before))]
+        if query.days:
+            parts += ["day:({})".format(" OR ".join('"{}"'.format(day) for day in query.days))]
+        if query.point and query.radius:
+            parts += ["distance(location, geopoint({}, {})) < {}".format(query.point[0], query.point[1],
+                                                                         query.radius)]
+        return " AND ".join(parts)
+
+    def put(self, documents):
+        """Put documents to the index in batches of INDEX_BATCH_SIZE"""
+        documents = [self._return_search_document(document) for document in documents]
+        for i in range(0, len(documents), INDEX_BATCH_SIZE):
+            self.index.put(documents[i:i + INDEX_BATCH_SIZE])
+
+    def delete(self, doc_ids):
+        """Delete documents from the index in batches of INDEX_BATCH_SIZE"""
+        for i in range(0, len(doc_ids), INDEX_BATCH_SIZE):
+            self.index.delete(doc_ids[i:i + INDEX_BATCH_SIZE])
+
+    def search(self, query, limit, cursor=None):
+        """Search documents matching the query ordered by start
+
+        Properties:
+            query: IndexQuery
+            limit: maximal number of returned ids
+            cursor: websafe string of cursor of the page, if None first page is returned
+
+        Returns:
+            doc_ids: list of ids of found documents
+            next_cursor: websafe string of cursor of the next page, None if this is the last page
+        """
+        sort = search.SortOptions(expressions=[search.SortExpression(expression="start",
+                                                                     direction=search.SortExpression.ASCENDING,
+                                                                     default_value=0)])
+        options = search.QueryOptions(limit=limit, ids_only=True, sort_options=sort,
+                                      cursor=search.Cursor(web_safe_string=cursor) if cursor else search.Cursor())
+        results = self.index.search(search.Query(query_string=self._return_query_string(query), options=options))
+        next_cursor = results.cursor.web_safe_string if results.cursor else None
+        return [document.doc_id for document in results.results], next_cursor
+
+
+class InMemoryBackend(object):
+    """Backend storing documents in inverted index in process
+
+    Attributes:
+        documents: dictionary of documents by their ids
+        inverted_index: dictionary of sets of ids of documents by their tokens
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.inverted_index = {}
+
+    def put(self, documents):
+        """Put documents to the index, documents with the same id are replaced"""
+        self.delete([document["doc_id"] for document in documents])
+        for document in documents:
+            self.documents[document["doc_id"]] = document
+            for token in document["tokens"]:
+                self.inverted_index.setdefault(token, set()).add(document["doc_id"])
+
+    def delete(self, doc_ids):
+        """Delete documents from the index"""
+        for doc_id in doc_ids:
+            document = self.documents.pop(doc_id, None)
+            if document:
+                for token in document["tokens"]:
+                    self.inverted_index[token].discard(doc_id)
+
+    @staticmethod
+    def _matches(document, query):
+        """Return True if document matches filters of the query other then tokens and location"""
+        if query.private is not None and document["private"] != query.private:
+            return False
+        if query.status and document["status"] != query.status:
+            return False
+        if query.starts_after and document["start"] < return_minutes(query.starts_after):
+            return False
+        if query.starts_before and document["start"] >= return_minutes(query.starts_before):
+            return False
+        if query.days and set(query.days).isdisjoint(document.get("days", [])):
+            return False
+        return True
+
+    def search(self, query, limit, cursor=None):
+        """Search documents matching the query ordered by start, cursor is offset of the page"""
+        if query.tokens:
+            doc_ids = set.intersection(*[self.inverted_index.get(token, set()) for token in query.tokens])
+        else:
+            doc_ids = set(self.documents)
+        documents = [self.documents[doc_id] for doc_id in doc_ids if self._matches(self.documents[doc_id], query)]
+        if query.point and query.radius:
+            distances = distances_km(query.point, [document["latitude"] for document in documents],
+                                     [document["longitude"] for document in documents])
+            documents = [document for document, km in zip(documents, distances) if km * 1000 < query.radius]
+        documents.sort(key=lambda document: (document["start"], document["doc_id"]))
+        offset = int(cursor) if cursor else 0
+        next_cursor = str(offset + limit) if offset + limit < len(documents) else None
+        return [document["doc_id"] for document in documents[offset:offset + limit]], next_cursor
+
+
+def get_backend():
+    """Return backend of the index, SearchApiBackend if none was set"""
+    global _backend
+    if _backend is None:
+        _backend = SearchApiBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """Set backend of the index, if None SearchApiBackend is used"""
+    global _backend
+    _backend = backend
+
+
+def mark_for_indexing(event_key):
+    """Mark key of written or deleted event so it is indexed at the end of the request
+
+    Outside of request there is nothing which would send the marked keys, so they are ignored
+    """
+    if not has_request_context():
+        return
+    if "index_pending" not in g:
+        g.index_pending = set()
+    g.index_pending.add(event_key.id())
+
+
+def send_tile_updates(event_ids):
+    """Create tasks updating counts of map tiles of events in batches of TILE_BATCH_SIZE"""
+    tasks = [ScheduledTask("/tasks/update_tiles", params={"event_id": event_ids[i:i + TILE_BATCH_SIZE]})
+             for i in range(0, len(event_ids), TILE_BATCH_SIZE)]
+    if tasks:
+        get_scheduler().add_multi(TILE_QUEUE, tasks)
+
+
+def send_pending_index_updates(response):
+    """Create tasks indexing events marked during the request in batches of INDEX_BATCH_SIZE
+    and tasks updating counts of their map tiles
+
+    Generation of search cache is bumped if any event was marked and bumping on write is enabled,
+    registered as after_request function of the app
+    """
+    event_ids = sorted(g.pop("index_pending", set()))
+    tasks = [ScheduledTask("/tasks/index_events", params={"event_id": event_ids[i:i + INDEX_BATCH_SIZE]})
+             for i in range(0, len(event_ids), INDEX_BATCH_SIZE)]
+    if tasks:
+        get_scheduler().add_multi(INDEX_QUEUE, tasks)
+        send_tile_updates(event_ids)
+        if bump_on_write():
+            bump_generation()
+    return response
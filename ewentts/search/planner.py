@@ -0,0 +1,171 @@
+"""Module containing planner of event searches combining several filters
+
+Every filter of search is a Predicate, equality or IN filter on one indexed property of Event.
+Planner estimates number of events matching each predicate by counting its index entries,
+estimates are cached in memcache, the most selective predicate is used as index scan ordered
+by key and the remaining predicates are applied to scanned events in memory. Cursor of the next
+page carries name of the scanned predicate, so following pages continue the same scan even if
+estimates changed in the meantime.
+
+Module contains following classes:
+    Predicate
+    Plan
+
+Attributes:
+    logger: Logger for logging in this module
+    ESTIMATE_LIMIT: maximal number of index entries counted for estimate of one value
+    ESTIMATE_TTL: number of seconds estimates are cached in memcache
+    ESTIMATE_KEY_PREFIX: prefix of memcache keys of estimates
+    CURSOR_SEPARATOR: separator of name of scanned predicate and datastore cursor in next page
+
+"""
+
+import logging
+
+from google.appengine.api import memcache
+
+from ewentts.models import Event
+from ewentts.utils import paginate_filtered
+
+logger = logging.getLogger("search.planner")
+
+ESTIMATE_LIMIT = 1000
+ESTIMATE_TTL = 600
+ESTIMATE_KEY_PREFIX = "search-estimate:"
+CURSOR_SEPARATOR = "~"
+
+
+class Predicate(object):
+    """Class storing one filter of event search
+
+    Attributes:
+        name: unique name of the predicate used in plan and cursors
+        prop: repeated indexed property of Event by which the predicate filters
+        values: list of values of prop, event matches if it has any of them, if empty predicate can not be scanned
+        matches: function returning True if event matches the predicate
+        recheck: True if matches has to be applied also to events scanned by this predicate
+    """
+
+    def __init__(self, name, prop, values, matches, recheck=False):
+        self.name = name
+        self.prop = prop
+        self.values = values
+        self.matches = matches
+        self.recheck = recheck
+
+    def estimate_keys(self):
+        """Return memcache keys of estimates of all values"""
+        return ["{}{}={}".format(ESTIMATE_KEY_PREFIX, self.prop._name, value) for value in self.values]
+
+    def apply(self, query):
+        """Return query filtered by the predicate"""
+        if len(self.values) == 1:
+            return query.filter(self.prop == self.values[0])
+        return query.filter(self.prop.IN(self.values))
+
+
+class Plan(object):
+    """Class storing chosen plan of search
+
+    Attributes:
+        scan: predicate used as index scan, None if all events are scanned
+        residual: predicates applied to scanned events in memory
+        estimates: dictionary of estimated number of events by names of predicates
+    """
+
+    def __init__(self, scan, residual, estimates):
+        self.scan = scan
+        self.residual = residual
+        self.estimates = estimates
+
+    def matches(self, event):
+        """Return True if scanned event matches all residual predicates"""
+        return all(predicate.matches(event) for predicate in self.residual)
+
+    def describe(self):
+        """Return description of the plan used in debug header"""
+        def part(predicate):
+            return "{}({})".format(predicate.name, self.estimates.get(predicate.name, "?"))
+        scan = part(self.scan) if self.scan else "all"
+        return "scan={}; filter={}".format(scan, ",".join(part(predicate) for predicate in self.residual) or "none")
+
+
+def estimate(predicates):
+    """Return dictionary of estimated number of events matching predicates by their names
+
+    Estimate of value is number of its index entries counted up to ESTIMATE_LIMIT,
+    estimates missing in memcache are counted in parallel and cached for ESTIMATE_TTL,
+    predicate which can not be scanned is estimated as None
+    """
+    keys = [key for predicate in predicates for key in predicate.estimate_keys()]
+    cached = memcache.get_multi(keys) if keys else {}
+    futures = {}
+    for predicate in predicates:
+        for key, value in zip(predicate.estimate_keys(), predicate.values):
+            if key not in cached and key not in futures:
+                futures[key] = Event.query(predicate.prop == value).count_async(limit=ESTIMATE_LIMIT)
+    counted = dict((key, future.get_result()) for key, future in futures.items())
+    if counted:
+        memcache.set_multi(counted, time=ESTIMATE_TTL)
+    cached.update(counted)
+    estimates = {}
+    for predicate in predicates:
+        if predicate.values:
+            estimates[predicate.name] = sum(cached[key] for key in predicate.estimate_keys())
+        else:
+            estimates[predicate.name] = None
+    return estimates
+
+
+def choose_plan(predicates, scan_name=None):
+    """Return plan scanning the most selective predicate
+
+    Properties:
+        predicates: list of predicates of the search
+        scan_name: name of predicate which is to be scanned, if None it is chosen by estimates
+
+    Returns:
+        Plan
+    """
+    scannable = [predicate for predicate in predicates if predicate.values]
+    estimates = estimate(scannable)
+    scan = None
+    if scan_name is not None:
+        scan = next((predicate for predicate in scannable if predicate.name == scan_name), None)
+    elif scannable:
+        scan = min(scannable, key=lambda predicate: estimates[predicate.name])
+    residual = [predicate for predicate in predicates if predicate is not scan or predicate.recheck]
+    return Plan(scan, residual, estimates)
+
+
+def split_cursor(cursor):
+    """Return name of scanned predicate and datastore cursor from cursor of page, (None, None) if it has no name"""
+    if not cursor or CURSOR_SEPARATOR not in cursor:
+        return None, None
+    return tuple(cursor.split(CURSOR_SEPARATOR, 1))
+
+
+def run_plan(query, predicates, per_page, cursor=None):
+    """Return page of events of query matching all predicates
+
+    Properties:
+        query: query of events which can be further filtered
+        predicates: list of predicates
+        per_page: number of events to be returned per page
+        cursor: cursor of the page returned as next_page by previous call, None for first page
+
+    Returns:
+        events: list of events
+        next_page: cursor of the next page, False if this is the last page
+        plan: Plan which was used
+    """
+    scan_name, datastore_cursor = split_cursor(cursor)
+    plan = choose_plan(predicates, scan_name)
+    if plan.scan:
+        query = plan.scan.apply(query)
+    query = query.order(Event.key)
+    logger.info("search plan {}".format(plan.describe()))
+    events, next_page = paginate_filtered(query, per_page, plan.matches, cursor=datastore_cursor or "")
+    if next_page:
+        next_page = "{}{}{}".format(plan.scan.name if plan.scan else "", CURSOR_SEPARATOR, next_page)
+    return events, next_page, plan
@@ -11,8 +11,9 @@ from ewentts.models import Event
 from ewentts.utils import requires_auth, return_jsonified_events, \
     return_jsonified_users, get_per_page, paginate
 from .utils import perform_users_search, logger, perform_events_search_by_name, \
-    perform_event_name_query, perform_events_search_by_day, \
-    perform_location_query, perform_events_search_by_datetime
+    perform_events_search_by_datetime, perform_events_index_search, perform_planned_events_search, \
+    perform_nearest_search, return_cache_params, perform_tiles_search, perform_autocomplete
+from .cache import cached_page, round_point
 
 search = Blueprint("search", __name__)
 
@@ -34,7 +35,8 @@ def search_users():
     name1 = request.args["name"]
     name2 = request.args.get("name2")
     per_page = get_per_page()
-    users, next_page = perform_users_search(name1, name2, per_page)
+    users, next_page, _ = cached_page("users", return_cache_params(request.args, per_page),
+                                      lambda: perform_users_search(name1, name2, per_page) + (None,))
     logger.info("search finished")
     if not users:
         return jsonify(""), 204
@@ -60,7 +62,9 @@ def search_events_by_names():
     event_name2 = request.args.get("event_name2")
     per_page = get_per_page()
 
-    events, next_page = perform_events_search_by_name(event_name1, event_name2, per_page)
+    events, next_page, _ = cached_page("events-names", return_cache_params(request.args, per_page),
+                                       lambda: perform_events_search_by_name(event_name1, event_name2,
+                                                                             per_page) + (None,))
     if not events:
         return jsonify(""), 204
     json = return_jsonified_events(events, next_page=next_page)
@@ -74,12 +78,20 @@ def search_events():
 
     Properties:
         body in json possibly containign:
+            q: string, optional, full-text search in event names and descriptions, if received
+                search is performed in full-text index and only day, location and private are applied
+            private: "true"|"false", optional, used only with q
             event_name: string, optional
             latitude: string, optional
             longitude: string, optional
-            day: date type, optional
+            day: "today"|"tomorrow"|iso date or range of them separated by "..", optional,
+                equality filter on local days of events
+            tz_offset: integer, optional, offset of client timezone from UTC in minutes used for today and tomorrow
             start_datetime: datetime, optional
             per_page: integer, optional
+        event_name, location and day are combined by planner which scans index of the most selective of them
+        and filters scanned events by the rest, chosen plan is returned in header X-Search-Plan,
+        location is rounded to 3 decimal places and pages are cached for a minute, see search/cache.py
 
     Returns:
         200: events, next_page and list_len in json
@@ -88,37 +100,132 @@ def search_events():
         405: if other method then GET used
     """
     per_page = get_per_page()
-    query = Event.query()
-
-    event_name = request.args.get("event_name")
-    if event_name:
-        logger.debug("event_name received as search parameter")
-        query = perform_event_name_query(query, event_name)
-        logger.info("search by event name finished")
-
-    latitude = request.args.get("latitude")
-    longitude = request.args.get("longitude")
-    if latitude and longitude:
-        location = (float(latitude), float(longitude))
-        print(location)
-        print(type(location))
-        logger.info("location received as search parameter")
-        query = perform_location_query(query, location)
-        logger.info("search by location finished")
-    day = request.args.get("day")
-    if day:
-        logger.info("start datetime received as search parameter")
-        query = perform_events_search_by_day(query, day)
-        logger.info("search by start_datetime finished")
-
-    start_datetime = request.args.get("start_datetime")
-    if start_datetime:
-        logger.info("start datetime received as search parameter")
-        query = perform_events_search_by_datetime(query, start_datetime)
-        logger.info("search by start_datetime finished")
-    events, next_page = paginate(query, per_page)
+    params = return_cache_params(request.args, per_page)
+    text = request.args.get("q")
+    if text:
+        events, next_page, _ = cached_page("events-index", params,
+                                           lambda: perform_events_index_search(text, request.args,
+                                                                               per_page) + (None,))
+        logger.info("search in index finished")
+        if not events:
+            return jsonify(""), 204
+        return return_jsonified_events(events, next_page=next_page)
+
+    def compute():
+        query = Event.query()
+        start_datetime = request.args.get("start_datetime")
+        if start_datetime:
+            logger.info("start datetime received as search parameter")
+            query = perform_events_search_by_datetime(query, start_datetime)
+            logger.info("search by start_datetime finished")
+
+        event_name = request.args.get("event_name")
+        location = None
+        latitude = request.args.get("latitude")
+        longitude = request.args.get("longitude")
+        if latitude and longitude:
+            location = round_point((float(latitude), float(longitude)))
+            logger.info("location received as search parameter")
+        if not event_name and not location and not request.args.get("day"):
+            return paginate(query, per_page) + (None,)
+        events, next_page, plan = perform_planned_events_search(query, event_name, location, request.args, per_page)
+        return events, next_page, plan.describe()
+
+    events, next_page, plan = cached_page("events", params, compute)
+    headers = {"X-Search-Plan": plan} if plan else {}
     logger.info("search finished")
     if not events:
-        return jsonify(""), 204
+        return jsonify(""), 204, headers
     json = return_jsonified_events(events, next_page=next_page)
+    json.headers.extend(headers)
     return json
+
+
+@search.route("/search/events/nearest", methods=["GET"])
+@requires_auth
+def search_nearest_events():
+    """Search events nearest to location
+
+    Properties:
+        latitude: string
+        longitude: string
+        k: integer, optional, number of events, defaults to 10, at most 100
+        day: "today"|"tomorrow"|iso date or range of them separated by "..", optional
+        tz_offset: integer, optional, offset of client timezone from UTC in minutes
+        starts_after: iso datetime, optional
+        starts_before: iso datetime, optional
+        private: "true"|"false", optional
+        upcoming: "true"|"false", optional, only events starting after now, with private "false"
+            answered from in-process grid of upcoming public events
+
+    Returns:
+        200: events ordered by distance with distance in km in json
+        204: if no events are found
+        400: if properties were not received in the right format
+        405: if other method then GET used
+    """
+    nearest = perform_nearest_search(request.args)
+    logger.info("search of nearest events finished")
+    if not nearest:
+        return jsonify(""), 204
+    distances, events = zip(*nearest)
+    json = return_jsonified_events(events, distances=distances)
+    return json
+
+
+@search.route("/search/events/tiles", methods=["GET"])
+@requires_auth
+def search_event_tiles():
+    """Return counts of public events and representative event in map tiles covering viewport
+
+    Counts are precomputed per geohash cell and day, so the whole viewport is read by one batch get,
+    precision of cells is chosen by zoom and lowered if viewport would have more then 512 cells
+
+    Properties:
+        zoom: integer between 0 and 20
+        south, west, north, east: bounds of the viewport in degrees
+        day: "today"|"tomorrow"|iso date or range of them separated by "..", optional,
+            defaults to 7 days from today, events are counted on the first local day
+        tz_offset: integer, optional, offset of client timezone from UTC in minutes
+
+    Returns:
+        200: precision and tiles in json, every tile contains cell, center, count and event,
+            which is None if the tile has no representative event
+        400: if properties were not received in the right format
+        405: if other method then GET used
+    """
+    precision, tiles = perform_tiles_search(request.args)
+    logger.info("search of tiles finished")
+    for tile in tiles:
+        event = tile["event"]
+        if event:
+            tile["event"] = {"event_id": event.key.id(),
+                             "event_name": event.event_name,
+                             "start_datetime": event.start_datetime.isoformat(),
+                             "location": [event.latitude, event.longitude]}
+        tile["center"] = list(tile["center"])
+    return jsonify(precision=precision, tiles=tiles)
+
+
+@search.route("/search/autocomplete", methods=["GET"])
+@requires_auth
+def autocomplete():
+    """Complete names of users or public events which did not end
+
+    Completions are found in index kept in memory of the instance, names are weighted by number
+    of followers of the user or attendees of the event and every word of the name can be completed
+
+    Properties:
+        q: string, text typed by user
+        kind: "user"|"event"
+        k: integer, optional, number of completions, defaults to 10, at most 20
+
+    Returns:
+        200: completions in json, each containing id, name and weight, ordered by weight
+        400: if properties were not received in the right format
+        405: if other method then GET used
+    """
+    completions = perform_autocomplete(request.args)
+    logger.info("autocomplete finished")
+    return jsonify(completions=[{"id": entity_id, "name": name, "weight": weight}
+                                for entity_id, name, weight in completions])
@@ -0,0 +1,209 @@
+"""Module containing precomputed counts of public events in map tiles
+
+Map tile is geohash cell of precision chosen by zoom of the map, every public event is counted
+in cells of all precisions up to TILE_MAX_PRECISION containing its location, bucketed by the first
+local day of the event. Counts of one cell during one month are stored in one TileCount, so view
+of a country in a time window is answered by one batch get of tiles of the viewport. Cell and day
+in which every event is counted are stored in its EventTile, events marked for indexing are sent
+in batches to task which compares them with current state of the events and applies the difference
+of every event in its own cross-group transaction. Tiles of one top-level cell during one month share
+entity group, so only events of the same region and month contend and the rest is updated in parallel.
+
+Attributes:
+    logger: Logger for logging in this module
+    TILE_MAX_PRECISION: precision of the smallest tiles
+    TILE_MAX_ZOOM: maximal zoom of the map
+    MAX_VIEWPORT_CELLS: maximal number of cells read for one viewport, precision is lowered if there are more
+    TILE_DEFAULT_DAYS: number of days from today in time window if no days are requested
+    MAX_REPRESENTATIVES: number of ids of events kept for one cell and day, so the cell keeps
+        a representative when one of them is removed
+
+"""
+
+import logging
+import math
+
+from google.appengine.ext import ndb
+
+from ewentts.geohash import cell_size, encode
+from ewentts.models import Event, EventTile, TileCount, TILE_ROOT_KIND
+
+logger = logging.getLogger("search.tiles")
+
+TILE_MAX_PRECISION = 6
+TILE_MAX_ZOOM = 20
+MAX_VIEWPORT_CELLS = 512
+TILE_DEFAULT_DAYS = 7
+MAX_REPRESENTATIVES = 3
+
+
+def zoom_precision(zoom):
+    """Return precision of cells shown at zoom of the map, cells are about quarter of width of map tile"""
+    return max(1, min(TILE_MAX_PRECISION, int(round((zoom + 2) / 2.5))))
+
+
+def return_tile_id(cell, day):
+    """Return id of TileCount of cell during month of iso date day"""
+    return "{}@{}".format(cell, day[:7])
+
+
+def return_tile_key(cell, day):
+    """Return key of TileCount of cell during month of iso date day in entity group of its top-level cell"""
+    return ndb.Key(TileCount, return_tile_id(cell, day), parent=ndb.Key(TILE_ROOT_KIND, return_tile_id(cell[:1], day)))
+
+
+def return_membership(event):
+    """Return cell of TILE_MAX_PRECISION and day in which event is counted, None if event is not counted"""
+    if event is None or event.private or event.latitude is None or event.longitude is None or not event.local_days:
+        return None
+    return encode(event.latitude, event.longitude, TILE_MAX_PRECISION), event.local_days[0]
+
+
+def _apply_change(tiles, event_id, membership, delta):
+    """Add delta to counts of all cells of membership and update their representatives"""
+    cell, day = membership
+    for precision in range(1, TILE_MAX_PRECISION + 1):
+        tile = tiles[return_tile_key(cell[:precision], day)]
+        tile.counts[day] = tile.counts.get(day, 0) + delta
+        if tile.counts[day] <= 0:
+            del tile.counts[day]
+        representatives = tile.representatives.get(day, [])
+        if delta < 0 and event_id in representatives:
+            representatives.remove(event_id)
+        elif delta > 0 and len(representatives) < MAX_REPRESENTATIVES:
+            representatives.append(event_id)
+        if representatives:
+            tile.representatives[day] = representatives
+        else:
+            tile.representatives.pop(day, None)
+
+
+@ndb.transactional(xg=True)
+def update_event_tiles(event_id):
+    """Update counts of tiles with current state of the event read in transaction
+
+    Transaction spans entity groups of the event, its EventTile and tiles of cells in which it was
+    and is counted, so event written meanwhile by other task is never counted by its older state
+
+    Returns:
+        number of tiles written, 0 if cell and day of the event did not change
+    """
+    event, record = ndb.get_multi([ndb.Key(Event, event_id), ndb.Key(EventTile, event_id)])
+    old = (record.cell, record.day) if record else None
+    new = return_membership(event)
+    if old == new:
+        return 0
+    memberships = [membership for membership in (old, new) if membership]
+    tile_keys = list(set(return_tile_key(cell[:precision], day) for cell, day in memberships
+                         for precision in range(1, TILE_MAX_PRECISION + 1)))
+    tiles = dict((key, tile or TileCount(key=key, counts={}, representatives={}))
+                 for key, tile in zip(tile_keys, ndb.get_multi(tile_keys)))
+    if old:
+        _apply_change(tiles, event_id, old, -1)
+    if new:
+        _apply_change(tiles, event_id, new, 1)
+    ndb.put_multi([tile for tile in tiles.values() if tile.counts] +
+                  ([EventTile(id=event_id, cell=new[0], day=new[1])] if new else []))
+    ndb.delete_multi([key for key, tile in tiles.items() if not tile.counts] +
+                     ([record.key] if not new else []))
+    return len(tiles)
+
+
+def update_tiles(event_ids):
+    """Update counts of tiles with current state of events which were written or deleted
+
+    Properties:
+        event_ids: list of ids of events
+
+    Returns:
+        changed: number of events whose cell or day changed
+        tiles: number of writes of tiles
+    """
+    changed = 0
+    tiles = 0
+    for event_id in event_ids:
+        event_tiles = update_event_tiles(event_id)
+        if event_tiles:
+            changed += 1
+            tiles += event_tiles
+    logger.info("{} events changed {} tiles".format(changed, tiles))
+    return changed, tiles
+
+
+def _viewport_ranges(box, precision):
+    """Return first and last row, first column, number of columns and number of all columns of viewport cells"""
+    height, width = cell_size(precision)
+    rows = int(round(180 / height))
+    columns = int(round(360 / width))
+    span = box["maxlongitude"] - box["minlongitude"]
+    if span < 0:
+        span += 360
+    first_row = min(int(math.floor((box["minlatitude"] + 90) / height)), rows - 1)
+    last_row = min(int(math.floor((box["maxlatitude"] + 90) / height)), rows - 1)
+    first_column = int(math.floor((box["minlongitude"] + 180) / width))
+    column_count = min(int(math.floor((box["minlongitude"] + span + 180) / width)) - first_column + 1, columns)
+    return first_row, last_row, first_column, column_count, columns
+
+
+def viewport_precision(zoom, box):
+    """Return precision of cells shown at zoom, lowered until viewport has at most MAX_VIEWPORT_CELLS cells"""
+    precision = zoom_precision(zoom)
+    while precision > 1:
+        first_row, last_row, _, column_count, _ = _viewport_ranges(box, precision)
+        if (last_row - first_row + 1) * column_count <= MAX_VIEWPORT_CELLS:
+            break
+        precision -= 1
+    return precision
+
+
+def viewport_cells(box, precision):
+    """Return cells of precision covering viewport
+
+    Properties:
+        box: dictionary with minlatitude, minlongitude, maxlatitude and maxlongitude of the viewport,
+            minlongitude is greater then maxlongitude if viewport crosses antimeridian
+        precision: precision of cells
+
+    Returns:
+        list of tuples of geohash cell and tuple of latitude and longitude of its center
+    """
+    height, width = cell_size(precision)
+    first_row, last_row, first_column, column_count, columns = _viewport_ranges(box, precision)
+    cells = []
+    for row in range(first_row, last_row + 1):
+        latitude = -90 + (row + 0.5) * height
+        for column in range(first_column, first_column + column_count):
+            longitude = -180 + (column % columns + 0.5) * width
+            cells += [(encode(latitude, longitude, precision), (latitude, longitude))]
+    return cells
+
+
+def read_tiles(cells, days):
+    """Return counts and representatives of cells during days read by one batch get
+
+    Properties:
+        cells: list of tuples of geohash cell and its center returned by viewport_cells
+        days: list of iso dates
+
+    Returns:
+        list of dictionaries of cells containing at least one event with:
+            cell: geohash of the cell
+            center: tuple of latitude and longitude of center of the cell
+            count: number of events starting in the cell during days
+            representative: id of event shown for the cell, None if the cell has none
+    """
+    months = sorted(set(day[:7] for day in days))
+    keys = [return_tile_key(cell, month) for cell, _ in cells for month in months]
+    tiles = dict((key.id(), tile) for key, tile in zip(keys, ndb.get_multi(keys)) if tile)
+    result = []
+    for cell, center in cells:
+        count = 0
+        representative = None
+        for day in sorted(days):
+            tile = tiles.get(return_tile_id(cell, day))
+            if tile:
+                count += tile.counts.get(day, 0)
+                representative = representative or (tile.representatives.get(day) or [None])[0]
+        if count:
+            result += [{"cell": cell, "center": center, "count": count, "representative": representative}]
+    return result
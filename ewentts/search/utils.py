@@ -2,57 +2,91 @@
 
 Attributes:
     logger: Logger for logging in search package
+    NEAREST_DEFAULT_K: number of events returned by nearest search if k not received
+    NEAREST_MAX_K: maximal number of events returned by nearest search
+    NEAREST_MAX_CANDIDATES: number of events fetched in one page of ring of nearest search
+    NEAREST_MAX_SCANNED: maximal number of events fetched from one ring of nearest search
+    AUTOCOMPLETE_DEFAULT_K: number of completions returned if k not received
+    AUTOCOMPLETE_MAX_K: maximal number of returned completions
+    AUTOCOMPLETE_FALLBACK_DEADLINE: seconds datastore query answering completions may take when index is not ready
 
 """
 
 import logging
 
-from datetime import datetime, date, time, timedelta
+import pytz
+from datetime import datetime, timedelta
+from dateutil.parser import parse
 from flask import request
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
 
+from ewentts.days import client_today, parse_days, parse_tz_offset
+from ewentts.geo import distance_km, distances_km
+from ewentts.geohash import covering_cells, neighbour_cells, cell_radius, MAX_PRECISION
 from ewentts.models import User, Event
-from ewentts.utils import paginate, generate_location_search_boundaries, \
+from ewentts.search.autocomplete import get_index, return_entry, KINDS
+from ewentts.search.cache import round_point
+from ewentts.search.grid import find_nearest_upcoming
+from ewentts.search.index import IndexQuery, get_backend, return_minutes
+from ewentts.search.planner import Predicate, run_plan
+from ewentts.search.tiles import read_tiles, viewport_cells, viewport_precision, TILE_DEFAULT_DAYS, TILE_MAX_ZOOM
+from ewentts.text import query_tokens
+from ewentts.utils import paginate, \
     error_decorator, BadRequestError, validate_location
 
 logger = logging.getLogger("search")
 
+NEAREST_DEFAULT_K = 10
+NEAREST_MAX_K = 100
+NEAREST_MAX_CANDIDATES = 1000
+NEAREST_MAX_SCANNED = 10000
+AUTOCOMPLETE_DEFAULT_K = 10
+AUTOCOMPLETE_MAX_K = 20
+AUTOCOMPLETE_FALLBACK_DEADLINE = 0.2
 
-def return_next_letter(letter):
-    """Return next letter in the alphabet"""
-    alphabet = list('abcdefghijklmnopqrstuvwxyz')
-    return alphabet[alphabet.index(letter) + 1]
 
+def filter_by_tokens(query, token_property, name):
+    """Filter query by tokens of name
 
-def return_next_name(name):
-    """Return name which would be in dictionary directly after name received
+    Name is normalised and every its word is searched as prefix by equality
+    filter on token_property, so the filters are answered by merge join of its index
 
     Properties:
-        name: string
+        query: query which is to be filtered by name search
+        token_property: repeated property containing prefix tokens
+        name: string, used for filtering query
 
     Returns:
-        name which would be in dictionary directly after name received
+        query
+
+    Raises:
+        BadRequestError if name is not string containing letters or digits
+    """
+    for token in return_name_tokens(name):
+        query = query.filter(token_property == token)
+    return query
+
+
+def return_name_tokens(name):
+    """Return normalised tokens of words of name
+
     Raises:
-        BadRequestError if name is not non empty string
+        BadRequestError if name is not string containing letters or digits
     """
     try:
-        name = name.lower()
-    except:
+        tokens = query_tokens(name)
+    except ValueError:
         raise BadRequestError("Value other then non empty string entered as parameter")
-    next_name = ""
-    for letter in name[::-1]:
-        if letter == "z":
-            next_name = "a" + next_name
-        else:
-            next_letter = return_next_letter(letter)
-            x = len(name)-1-len(next_name)
-            next_name = name[:x] + next_letter + next_name
-            return next_name.capitalize()
-    return None
+    if not tokens:
+        logger.error("name: %s does not contain letters or digits", name)
+        raise BadRequestError("Name does not contain any letters or digits")
+    return tokens
 
 
 @error_decorator
 def perform_name_query(query, name):
-    """Perform name query
+    """Perform name query, every word of name is searched as prefix of any of user names
 
     Properties:
         query: query which is to be filtered by name search
@@ -60,19 +94,19 @@ def perform_name_query(query, name):
 
     Returns:
         query
+
+    Raises:
+        BadRequestError if name is not string containing letters or digits
     """
-    next_name = return_next_name(name)
-    if next_name:
-        query = query.filter(User.user_names >= name.capitalize(),
-                             User.user_names < next_name.capitalize())
-    else:
-        query = query.filter(User.user_names >= name.capitalize())
-    return query
+    return filter_by_tokens(query, User.search_tokens, name)
 
 
 def perform_users_search(name1, name2, per_page):
     """Perform search for users
 
+    Tokens of both names are equality filters on User.search_tokens, so datastore
+    answers the search by merge join of the index and results can be paginated
+
     Properties:
         name1: string
         name2: string/Null
@@ -82,41 +116,21 @@ def perform_users_search(name1, name2, per_page):
         users: list of filtered users of length per_page
         next_page: link to the next page
     """
-    query1 = User.query()
-    query1 = perform_name_query(query1, name1)
+    query = User.query()
+    query = perform_name_query(query, name1)
     if name2:
-        query2 = User.query()
-        query2 = perform_name_query(query2, name2)
-        users = list(set(query1.fetch()).intersection(set(query2.fetch())))
-        next_page = False
-    else:
-        users, next_page = paginate(query1, per_page)
+        query = perform_name_query(query, name2)
+    users, next_page = paginate(query, per_page)
     return users, next_page
 
 
-def perform_event_name_query(query, name):
-    """Filter events by name query
-
-    Properties:
-        query: query of events which is to be filtered by name search
-        name: string
-
-    Returns:
-        query: query of events filtered by name
-    """
-    next_name = return_next_name(name)
-    if next_name:
-        query = query.filter(Event.event_name >= name.capitalize(),
-                             Event.event_name < next_name.capitalize())
-    else:
-        query = query.filter(Event.event_name >= name.capitalize())
-    return query
-
-
 @error_decorator
 def perform_events_search_by_name(event_name1, event_name2, per_page):
     """Search events by name
 
+    Every word of both names is searched as prefix of words of event name in one query
+    answered by merge join of Event.name_tokens index, so results can be paginated
+
     Properties:
         event_name1: string
         event_name2: string/Null
@@ -132,145 +146,443 @@ def perform_events_search_by_name(event_name1, event_name2, per_page):
     if not event_name1:
         logger.error("no names received")
         raise BadRequestError("event_name1 not received")
-    query1 = Event.query()
-    query1 = perform_event_name_query(query1, event_name1)
+    query = Event.query()
+    query = filter_by_tokens(query, Event.name_tokens, event_name1)
     if event_name2:
-        query2 = Event.query()
-        query2 = perform_event_name_query(query2, event_name2)
-        events = list(set(query1.fetch()).intersection(set(query2.fetch())))
-        next_page = False
-    else:
-        events, next_page = paginate(query1, per_page)
+        query = filter_by_tokens(query, Event.name_tokens, event_name2)
+    events, next_page = paginate(query, per_page)
     logger.info("search by event names finished")
     return events, next_page
 
 
-def search_today(query):
-    """Filter query so it contains only events happening today
+def return_days(args):
+    """Return iso dates of days requested by day and tz_offset in args
 
     Properties:
-        query: query of events which is to be filtered
+        args: request arguments possibly containing:
+            day: "today"|"tomorrow"|iso date or range of them separated by "..", including both ends
+            tz_offset: offset of client timezone from UTC in minutes, used for resolving today and tomorrow
 
     Returns:
-        query: query of events happening today
+        list of iso dates, empty list if day not received
+
+    Raises:
+        BadRequestError if day or tz_offset is not in correct format
     """
-    today = date.today()
-    today_min = datetime.combine(today, time.min)
-    today_max = datetime.combine(today, time.max)
-    query = query.filter(Event.start_datetime > today_min, Event.start_datetime < today_max)
-    return query
+    day = args.get("day")
+    if not day:
+        return []
+    try:
+        return parse_days(day, parse_tz_offset(args.get("tz_offset")))
+    except (ValueError, OverflowError) as e:
+        logger.error("day or tz_offset received in wrong format")
+        raise BadRequestError(e)
+
 
+def return_day_filter(days):
+    """Return function returning True if event takes place on any of days"""
+    days = set(days)
+    return lambda event: not days.isdisjoint(event.local_days)
 
-def search_tomorrow(query):
-    """Filter query so it contains only events happening tomorrow
+
+def return_location_cells(point):
+    """Return geohash cells covering circle around point with radius location_range received in request
 
     Properties:
-        query: query of events which is to be filtered
+        point: tuple of latitude and longitude
 
     Returns:
-        query: query of events happening tomorrow
+        cells: list of geohash cells, empty if the circle needs the whole world
+        location_filter: function returning True if event is in distance location_range from point received
+
+    Raises:
+        BadRequestError if location or location_range received out of range or in wrong format
     """
-    tomorrow = date.today() + timedelta(days=1)
-    tomorrow_min = datetime.combine(tomorrow, time.min)
-    tomorrow_max = datetime.combine(tomorrow, time.max)
-    query = query.filter(Event.start_datetime > tomorrow_min, Event.start_datetime < tomorrow_max)
-    return query
+    try:
+        validate_location(*point)
+    except ValueError as e:
+        logger.error("location received in wrong format")
+        raise BadRequestError(e)
+
+    location_range = request.args.get("location_range")
+    if location_range:
+        try:
+            location_range = int(location_range)
+            if location_range > 100 or location_range < 0:
+                raise BadRequestError("location_range is not between 0 and 100 km")
+        except BadRequestError as e:
+            logger.error("location_range received in wrong format")
+            logger.error(e)
+            raise BadRequestError(e)
+        except (TypeError, ValueError):
+            logger.error("location_range received in wrong format")
+            raise BadRequestError("location_range received in wrong format")
+    else:
+        location_range = 10
+
+    def location_filter(event):
+        return distance_km(point, (event.latitude, event.longitude)) <= location_range
+
+    return covering_cells(point[0], point[1], location_range), location_filter
+
+
+@error_decorator
+def perform_planned_events_search(query, event_name, point, args, per_page):
+    """Search events filtered by name, location and day chosen by planner
+
+    Every word of name, location and requested days are predicates, the most selective of them
+    is scanned in index and the rest is applied to scanned events, see search/planner.py
 
+    Properties:
+        query: query of events which can be further filtered
+        event_name: string or None
+        point: tuple of latitude and longitude or None
+        args: request arguments possibly containing day, tz_offset, location_range and cursor
+        per_page: integer how many events to be returned per page
+
+    Returns:
+        events: list of found events
+        next_page: cursor of the next page
+        plan: Plan which was used
 
-def search_other_day(query, day):
-    """Filter query so it contains only events happening the day received
+    Raises:
+        BadRequestError: if any of the properties is not in correct format
+    """
+    predicates = []
+    if event_name:
+        for token in return_name_tokens(event_name):
+            predicates += [Predicate("name:" + token, Event.name_tokens, [token],
+                                     lambda event, token=token: token in event.name_tokens)]
+    if point:
+        cells, location_filter = return_location_cells(point)
+        predicates += [Predicate("location", Event.geohashes, cells, location_filter, recheck=True)]
+    days = return_days(args)
+    if days:
+        predicates += [Predicate("day", Event.local_days, days, return_day_filter(days))]
+    return run_plan(query, predicates, per_page, args.get("cursor"))
+
+
+def return_cache_params(args, per_page):
+    """Return normalised parameters of search used as key of search cache
+
+    Names are normalised to their tokens, location is rounded to LOCATION_ROUNDING decimal places
+    and day is resolved to iso dates, so searches returning the same page share one key
 
     Properties:
-        query: query of events which is to be filtered
-        day: date object by which the query is to be filtered
+        args: request arguments
+        per_page: integer how many entities are returned per page
 
     Returns:
-        query: query of events happening on certain day
+        dictionary of parameters, None if any of them is not in correct format, so search is not cached
     """
+    params = {"per_page": per_page, "cursor": args.get("cursor") or ""}
+    try:
+        for name in ["name", "name2", "event_name", "event_name1", "event_name2", "q"]:
+            if args.get(name):
+                params[name] = " ".join(query_tokens(args[name]))
+        if args.get("latitude") and args.get("longitude"):
+            params["location"] = round_point((float(args["latitude"]), float(args["longitude"])))
+            params["location_range"] = int(args.get("location_range") or 10)
+        if args.get("day"):
+            params["day"] = return_days(args)
+    except (ValueError, TypeError, BadRequestError):
+        return None
+    for name in ["private", "start_datetime"]:
+        if args.get(name):
+            params[name] = args[name]
+    return params
+
+
+def perform_events_search_by_datetime(query, start_datetime):
+    """Will perform search by datatime query but currently not implemented"""
     return query
 
 
-def perform_events_search_by_day(query, start_datetime):
-    """Filter query so it contains only events on certain date
+@error_decorator
+def perform_events_index_search(text, args, per_page):
+    """Search events in full-text index
 
     Properties:
-        query: query of events which is to be filtered
-        start_datetime: datetime object|string containing "today" or "tomorrow"
+        text: string, every its word is searched as prefix of words of event name or description
+        args: request arguments possibly containing:
+            day: "today"|"tomorrow"|iso date or range of them separated by ".."
+            tz_offset: offset of client timezone from UTC in minutes
+            latitude: string
+            longitude: string
+            location_range: range of location search in km, defaults to 10
+            private: "true"|"false"
+        per_page: integer how many events to be returned per page
 
     Returns:
-        query: query of events happening on certain day
+        events: list of found events ordered by start_datetime
+        next_page: cursor of the next page
+
+    Raises:
+        BadRequestError: if any of the properties is not in correct format
     """
-    if start_datetime == "today":
-        query = search_today(query)
-    elif start_datetime == "tomorrow":
-        query = search_tomorrow(query)
-    else:
-        day = start_datetime.date()
-        query = search_other_day(query, day)
-    return query
+    try:
+        tokens = query_tokens(text)
+    except ValueError:
+        raise BadRequestError("Value other then non empty string entered as parameter")
+    query = IndexQuery(tokens=tokens)
+    query.days = return_days(args)
+    if args.get("latitude") and args.get("longitude"):
+        try:
+            point = (float(args["latitude"]), float(args["longitude"]))
+            validate_location(*point)
+            query.radius = float(args.get("location_range", 10)) * 1000
+        except ValueError as e:
+            logger.error("location received in wrong format")
+            raise BadRequestError(e)
+        query.point = point
+    private = args.get("private")
+    if private:
+        query.private = private.lower() == "true"
+    doc_ids, next_cursor = get_backend().search(query, per_page, args.get("cursor"))
+    events = ndb.get_multi([ndb.Key(Event, int(doc_id)) for doc_id in doc_ids])
+    return [event for event in events if event], next_cursor or False
+
+
+def return_utc_datetime(value):
+    """Return naive datetime in UTC of iso datetime with location
+
+    Raises:
+        ValueError if value is not iso datetime with location
+    """
+    return parse(value).astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def fetch_ring(query, cells):
+    """Return events of query in cells fetched in pages of NEAREST_MAX_CANDIDATES
+
+    Returns:
+        events: list of events
+        complete: False if there are more then NEAREST_MAX_SCANNED events in the cells and some were not fetched
+    """
+    query = query.filter(Event.geohashes.IN(cells)).order(Event.key)
+    events = []
+    cursor = None
+    while True:
+        page, cursor, more = query.fetch_page(NEAREST_MAX_CANDIDATES, start_cursor=cursor)
+        events += page
+        if not more or not cursor:
+            return events, True
+        if len(events) >= NEAREST_MAX_SCANNED:
+            return events, False
+
+
+def find_nearest_events(query, point, k, event_filter):
+    """Return k events of query nearest to point
+
+    Search starts in ring of cells of MAX_PRECISION around point and grows the ring by lowering precision
+    until it contains k events passing event_filter in distance in which the ring is complete. The whole
+    ring is fetched before it is sorted by distance, rings having more then NEAREST_MAX_SCANNED events
+    are truncated and nearest events may be missing, so query should contain every constraint which
+    can be expressed by equality
+
+    Properties:
+        query: query of events which can be further filtered by equality
+        point: tuple of latitude and longitude
+        k: number of events to be returned
+        event_filter: function returning True if event can be returned
+
+    Returns:
+        list of tuples of distance in km and event ordered by distance
+    """
+    scored = []
+    for precision in range(MAX_PRECISION, 0, -1):
+        cells = neighbour_cells(point[0], point[1], precision)
+        events, complete = fetch_ring(query, cells)
+        if not complete:
+            logger.warning("ring of precision {} has more then {} events, nearest events may be "
+                           "missing".format(precision, NEAREST_MAX_SCANNED))
+        candidates = [event for event in events if event_filter(event)]
+        distances = distances_km(point, [event.latitude for event in candidates],
+                                 [event.longitude for event in candidates])
+        scored = sorted(zip(distances.tolist(), candidates), key=lambda pair: pair[0])
+        radius = cell_radius(point[0], precision)
+        if len([pair for pair in scored if pair[0] <= radius]) >= k:
+            logger.info("nearest events found in ring of precision {}".format(precision))
+            break
+    return scored[:k]
 
 
 @error_decorator
-def perform_location_query(query, point):
-    """Filter query so it contains only events in certain location
+def perform_nearest_search(args):
+    """Search events nearest to location
 
     Properties:
-        query: query of events which is to be filtered
-        point: point from which distance of query is to be measured
-        location_range: float, optional, range of location query
+        args: request arguments containing:
+            latitude: string
+            longitude: string
+            k: number of events to be returned, optional
+            day: "today"|"tomorrow"|iso date or range of them separated by "..", optional
+            tz_offset: offset of client timezone from UTC in minutes, optional
+            starts_after: iso datetime after which events start, optional
+            starts_before: iso datetime before which events start, optional
+            private: "true"|"false", optional
+            upcoming: "true"|"false", optional, if "true" only events starting after now are returned,
+                public upcoming events without day are found in grid of the instance if it is ready
 
     Returns:
-        query: query of events happening in certain location in distance from point received
+        list of tuples of distance in km and event ordered by distance
 
     Raises:
-        BadRequestError if location or location received out of range or in wrong format
+        BadRequestError: if any of the properties is not in correct format
     """
     try:
+        point = (float(args["latitude"]), float(args["longitude"]))
         validate_location(*point)
-    except ValueError as e:
-        logger.error("location received in wrong format")
-        raise BadRequestError(e)
+    except (KeyError, ValueError):
+        logger.error("location not received or received in wrong format")
+        raise BadRequestError("latitude and longitude not received or received in wrong format")
+    try:
+        k = int(args.get("k", NEAREST_DEFAULT_K))
+        if k < 1 or k > NEAREST_MAX_K:
+            raise ValueError
+    except ValueError:
+        raise BadRequestError("k is not integer between 1 and {}".format(NEAREST_MAX_K))
+    try:
+        starts_after = return_utc_datetime(args["starts_after"]) if args.get("starts_after") else None
+        starts_before = return_utc_datetime(args["starts_before"]) if args.get("starts_before") else None
+    except (ValueError, OverflowError):
+        logger.error("time filters received in wrong format")
+        raise BadRequestError("starts_after or starts_before received in wrong format")
+    days = return_days(args)
+    private = args.get("private")
+    now = datetime.utcnow()
+    if (args.get("upcoming") or "").lower() == "true":
+        starts_after = max(starts_after or now, now)
+        if private and private.lower() == "false" and not days:
+            nearest = find_nearest_upcoming(point, k, starts_after, starts_before)
+            if nearest is not None:
+                logger.info("nearest events found in grid")
+                return nearest
+
+    query = Event.query()
+    if len(days) == 1:
+        query = query.filter(Event.local_days == days[0])
+    day_filter = return_day_filter(days) if len(days) > 1 else None
+    if private:
+        query = query.filter(Event.private == (private.lower() == "true"))
+    if starts_after and starts_after >= now:
+        # events which started are never stored as future, so they do not crowd out upcoming ones in rings
+        query = query.filter(Event.status == "future")
+
+    def time_filter(event):
+        if starts_after and event.start_datetime < starts_after:
+            return False
+        if starts_before and event.start_datetime >= starts_before:
+            return False
+        if day_filter and not day_filter(event):
+            return False
+        return True
+
+    return find_nearest_events(query, point, k, time_filter)
 
-    location_range = request.args.get("location_range")
-    if location_range:
+
+@error_decorator
+def perform_tiles_search(args):
+    """Return counts of public events in map tiles covering viewport during requested days
+
+    Properties:
+        args: request arguments containing:
+            zoom: integer zoom of the map between 0 and TILE_MAX_ZOOM
+            south, west, north, east: bounds of the viewport, west is greater then east if viewport
+                crosses antimeridian
+            day: "today"|"tomorrow"|iso date or range of them separated by "..", optional,
+                defaults to TILE_DEFAULT_DAYS days from today
+            tz_offset: offset of client timezone from UTC in minutes, optional
+
+    Returns:
+        precision: precision of geohash cells of the tiles
+        tiles: list of dictionaries returned by read_tiles with representative replaced by event,
+            None if the cell has no representative or it is no longer public
+
+    Raises:
+        BadRequestError: if any of the properties is not in correct format
+    """
+    try:
+        zoom = int(args["zoom"])
+        if zoom < 0 or zoom > TILE_MAX_ZOOM:
+            raise ValueError
+    except (KeyError, ValueError):
+        raise BadRequestError("zoom is not integer between 0 and {}".format(TILE_MAX_ZOOM))
+    try:
+        box = {"minlatitude": float(args["south"]), "minlongitude": float(args["west"]),
+               "maxlatitude": float(args["north"]), "maxlongitude": float(args["east"])}
+        validate_location(box["minlatitude"], box["minlongitude"])
+        validate_location(box["maxlatitude"], box["maxlongitude"])
+        if box["minlatitude"] > box["maxlatitude"]:
+            raise ValueError("south is greater then north")
+    except (KeyError, ValueError):
+        logger.error("viewport not received or received in wrong format")
+        raise BadRequestError("south, west, north and east not received or received in wrong format")
+    days = return_days(args)
+    if not days:
         try:
-            location_range = int(location_range)
-            if location_range > 100 or location_range < 0:
-                raise BadRequestError("location_range is not between 0 and 100 km")
-        except BadRequestError as e:
-            logger.error("location_range received in wrong format")
-            logger.error(e)
+            today = client_today(parse_tz_offset(args.get("tz_offset")))
+        except ValueError as e:
+            logger.error("tz_offset received in wrong format")
             raise BadRequestError(e)
-        except (TypeError, ValueError):
-            logger.error("location_range received in wrong format")
-            raise BadRequestError("location_range received in wrong format")
-    else:
-        location_range = 10
+        days = [(today + timedelta(days=i)).isoformat() for i in range(TILE_DEFAULT_DAYS)]
+    precision = viewport_precision(zoom, box)
+    tiles = read_tiles(viewport_cells(box, precision), days)
+    events = ndb.get_multi([ndb.Key(Event, tile["representative"]) for tile in tiles if tile["representative"]])
+    events = dict((event.key.id(), event) for event in events if event and not event.private)
+    for tile in tiles:
+        tile["event"] = events.get(tile.pop("representative"))
+    return precision, tiles
 
-    boundaries = generate_location_search_boundaries(point, location_range)
-    print(123)
-    print(boundaries)
-    longitudes_distance = boundaries["maxlongitude"] - boundaries["minlongitude"]
-    if 0 < longitudes_distance < 180:
-        print(boundaries["maxlongitude"])
-        print(boundaries["minlongitude"])
-        query = query.filter(Event.longitude > boundaries["minlongitude"],
-                             Event.longitude < boundaries["maxlongitude"])
-    elif longitudes_distance < -180:
-        print(boundaries["maxlongitude"])
-        print(boundaries["minlongitude"])
-        query = query.filter(Event.longitude > boundaries["minlongitude"],
-                             Event.longitude < boundaries["maxlongitude"])
-    else:
-        print(boundaries["minlongitude"])
-        print(boundaries["maxlongitude"])
-        query = query.filter(Event.longitude > boundaries["maxlongitude"],
-                             Event.longitude < boundaries["minlongitude"])
-    query = query.filter(Event.latitude < boundaries["maxlatitude"],
-                         Event.latitude > boundaries["minlatitude"])
-    return query
 
+@error_decorator
+def perform_autocomplete(args):
+    """Return completions of names of users or public events which did not end
 
-def perform_events_search_by_datetime(query, start_datetime):
-    """Will perform search by datatime query but currently not implemented"""
-    return query
+    Completions are found in completion index of the instance, if it is not ready yet
+    datastore is queried by prefix tokens with deadline AUTOCOMPLETE_FALLBACK_DEADLINE
+
+    Properties:
+        args: request arguments containing:
+            q: text typed by user
+            kind: "user"|"event"
+            k: number of completions, optional
+
+    Returns:
+        list of tuples of id, name and weight ordered by weight
+
+    Raises:
+        BadRequestError: if any of the properties is not in correct format
+    """
+    text = args.get("q")
+    kind = args.get("kind")
+    if not text or kind not in KINDS:
+        raise BadRequestError("q not received or kind is not one of {}".format(", ".join(sorted(KINDS))))
+    try:
+        k = int(args.get("k", AUTOCOMPLETE_DEFAULT_K))
+        if k < 1 or k > AUTOCOMPLETE_MAX_K:
+            raise ValueError
+    except ValueError:
+        raise BadRequestError("k is not integer between 1 and {}".format(AUTOCOMPLETE_MAX_K))
+    now = datetime.utcnow()
+    index = get_index(kind, now)
+    if index is not None:
+        try:
+            return index.complete(text, k, return_minutes(now))
+        except ValueError as e:
+            raise BadRequestError(e)
+
+    logger.warning("completion index of {} names not ready, datastore queried".format(kind))
+    if kind == "user":
+        query = filter_by_tokens(User.query(), User.search_tokens, text)
+    else:
+        query = filter_by_tokens(Event.query(Event.private == False), Event.name_tokens, text)
+    try:
+        entities = query.fetch(k, deadline=AUTOCOMPLETE_FALLBACK_DEADLINE)
+    except datastore_errors.Timeout:
+        logger.warning("datastore query of completions timed out")
+        return []
+    completions = [(entity.key.id(), entry) for entity, entry in
+                   ((entity, return_entry(kind, entity, now)) for entity in entities) if entry]
+    return sorted([(entity_id, name, weight) for entity_id, (name, weight, _) in completions],
+                  key=lambda completion: -completion[2])
@@ -0,0 +1,340 @@
+"""Module for handling requests on /tasks endpoints called by task queues
+
+Attributes:
+    tasks: flask Blueprint for calling task endpoints
+
+"""
+
+from datetime import datetime
+
+from dateutil.parser import parse
+from flask import Blueprint, request
+from google.appengine.ext import ndb
+
+from ewentts.models import Event, User
+from ewentts.utils import requires_auth, requires_task, request_uid
+from .utils import add_task, remove_key_from_chunk, query_users_with_event, cancel_status_tasks, \
+    delete_posts, logger, EVENT_LIST_PROPERTIES, USER_CLEANUP_STAGES, query_entities_with_key, \
+    update_job, return_chunk_id, jsonify_job, return_job, apply_event_side_effects, sweep_status_chunk, \
+    STATUS_SWEEP_STAGES, SWEEP_QUEUE, check_chunk, start_weekly_check, WEEKLY_CHECK_STAGES, MAINTENANCE_QUEUE, \
+    start_backfill, backfill_chunk, BACKFILL_MODELS, index_events, start_index_rebuild, rebuild_index_chunk, \
+    INDEX_QUEUE, fan_out_chunk, delete_timeline_chunk, SIDE_EFFECTS_QUEUE
+from ewentts.search.tiles import update_tiles
+
+tasks = Blueprint("tasks", __name__)
+
+
+@tasks.route("/tasks/cleanup_event", methods=["POST"])
+@requires_task
+def cleanup_event():
+    """Remove references to deleted event from one chunk of users
+
+    First task of the cleanup also deletes posts of the event, cancels
+    tasks changing its status and starts removal of the event from timelines,
+    every task chains the next one until all users containing the event
+    in their event lists are processed.
+
+    Properties:
+        event_id: id of the deleted event
+        post_id: ids of posts of the deleted event, only in the first task
+        present_task: name of task changing status of the event to present, only in the first task
+        past_task: name of task changing status of the event to past, only in the first task
+        cursor: websafe cursor of the chunk of users, not present in the first task
+    """
+    event_id = int(request.form["event_id"])
+    cursor = request.form.get("cursor")
+    if not cursor:
+        cancel_status_tasks(request.form["present_task"], request.form["past_task"])
+        delete_posts(request.form.getlist("post_id"))
+        add_task("/tasks/cleanup_timeline", {"event_id": event_id})
+    event_key = ndb.Key(Event, event_id)
+    query = query_users_with_event(event_key)
+    edited, next_cursor = remove_key_from_chunk(query, EVENT_LIST_PROPERTIES, event_key, cursor)
+    logger.info("event {} removed from {} users".format(event_id, edited))
+    if next_cursor:
+        add_task("/tasks/cleanup_event", {"event_id": event_id, "cursor": next_cursor})
+    else:
+        logger.info("cleanup of event {} finished".format(event_id))
+    return "done"
+
+
+@tasks.route("/tasks/event_created", methods=["POST"])
+@requires_task
+def event_created():
+    """Apply side effects of creating event
+
+    Properties:
+        event_id: id of the created event
+    """
+    event_id = int(request.form["event_id"])
+    event = ndb.Key(Event, event_id).get()
+    if not event:
+        logger.warning("event {} was deleted before its side effects were applied".format(event_id))
+        return "done"
+    apply_event_side_effects(event)
+    logger.info("side effects of event {} applied".format(event_id))
+    return "done"
+
+
+@tasks.route("/tasks/fan_out_events", methods=["POST"])
+@requires_task
+def fan_out_events():
+    """Write public events of one organiser to timelines of one chunk of the organiser's followers
+
+    Every task chains the next one until all followers are processed,
+    entries are keyed by follower and event, so retried task writes the same entries
+
+    Properties:
+        event_id: ids of events of one organiser
+        cursor: websafe cursor of the chunk of followers, not present in the first task
+    """
+    event_ids = [int(event_id) for event_id in request.form.getlist("event_id")]
+    cursor = request.form.get("cursor")
+    written, next_cursor = fan_out_chunk(event_ids, cursor)
+    logger.info("{} timeline entries of {} events written".format(written, len(event_ids)))
+    if next_cursor:
+        add_task("/tasks/fan_out_events", {"event_id": event_ids, "cursor": next_cursor},
+                 queue_name=SIDE_EFFECTS_QUEUE)
+    return "done"
+
+
+@tasks.route("/tasks/cleanup_timeline", methods=["POST"])
+@requires_task
+def cleanup_timeline():
+    """Delete timeline entries of deleted event in chunks
+
+    Properties:
+        event_id: id of the deleted event
+        cursor: websafe cursor of the chunk of entries, not present in the first task
+    """
+    event_id = int(request.form["event_id"])
+    cursor = request.form.get("cursor")
+    deleted, next_cursor = delete_timeline_chunk(ndb.Key(Event, event_id), cursor)
+    logger.info("{} timeline entries of event {} deleted".format(deleted, event_id))
+    if next_cursor:
+        add_task("/tasks/cleanup_timeline", {"event_id": event_id, "cursor": next_cursor})
+    return "done"
+
+
+@tasks.route("/tasks/sweep_event_status", methods=["GET", "POST"])
+@requires_task
+def sweep_event_status():
+    """Change status of events whose start or end already passed
+
+    Called by cron without properties, every task processes one chunk of events and
+    chains the next one until events of all STATUS_SWEEP_STAGES are processed.
+
+    Properties:
+        stage: index of the status in STATUS_SWEEP_STAGES, optional
+        now: iso datetime used by all tasks of one sweep, optional
+        cursor: websafe cursor of the chunk of events, optional
+    """
+    stage = int(request.values.get("stage", 0))
+    cursor = request.values.get("cursor")
+    now = request.values.get("now")
+    now = parse(now) if now else datetime.utcnow()
+    status = STATUS_SWEEP_STAGES[stage]
+    edited, next_cursor = sweep_status_chunk(status, now, cursor)
+    logger.info("status of {} {} events changed".format(edited, status))
+    params = {"now": now.isoformat()}
+    if next_cursor:
+        params.update(stage=stage, cursor=next_cursor)
+        add_task("/tasks/sweep_event_status", params, queue_name=SWEEP_QUEUE)
+    elif stage + 1 < len(STATUS_SWEEP_STAGES):
+        params.update(stage=stage + 1)
+        add_task("/tasks/sweep_event_status", params, queue_name=SWEEP_QUEUE)
+    return "done"
+
+
+@tasks.route("/tasks/cleanup_user", methods=["POST"])
+@requires_task
+def cleanup_user():
+    """Remove references to deleted user from one chunk of entities
+
+    Stages of the cleanup are defined by USER_CLEANUP_STAGES, every task
+    chains the next one until all stages are processed, progress is saved in job.
+
+    Properties:
+        job_id: id of the job reporting progress of the cleanup
+        user_id: id of the deleted user
+        stage: index of the stage in USER_CLEANUP_STAGES
+        cursor: websafe cursor of the chunk of entities, not present in the first task of the stage
+    """
+    job_id = int(request.form["job_id"])
+    user_id = request.form["user_id"]
+    stage = int(request.form["stage"])
+    cursor = request.form.get("cursor")
+    model, properties = USER_CLEANUP_STAGES[stage]
+    user_key = ndb.Key(User, user_id)
+    query = query_entities_with_key(model, properties, user_key)
+    edited, next_cursor = remove_key_from_chunk(query, properties, user_key, cursor)
+    logger.info("user {} removed from {} entities of {}".format(user_id, edited, model.__name__))
+    chunk = return_chunk_id(stage, cursor)
+    params = {"job_id": job_id, "user_id": user_id}
+    if next_cursor:
+        update_job(job_id, edited, chunk)
+        params.update(stage=stage, cursor=next_cursor)
+        add_task("/tasks/cleanup_user", params)
+    elif stage + 1 < len(USER_CLEANUP_STAGES):
+        update_job(job_id, edited, chunk, stage=USER_CLEANUP_STAGES[stage + 1][0].__name__)
+        params.update(stage=stage + 1)
+        add_task("/tasks/cleanup_user", params)
+    else:
+        update_job(job_id, edited, chunk, finished=True)
+        logger.info("cleanup of user {} finished".format(user_id))
+    return "done"
+
+
+@tasks.route("/tasks/weekly_check", methods=["GET", "POST"])
+@requires_task
+def weekly_check():
+    """Check consistency of users and events in chunks
+
+    Called by cron without properties which starts new job, every task processes one chunk
+    of entities of the stage defined by WEEKLY_CHECK_STAGES and chains the next one, dangling
+    keys and duplicates are removed from repeated key properties and missing tasks changing
+    status of events are created, counts of work done are saved in summary of the job.
+
+    Properties:
+        job_id: id of the job reporting progress of the check, optional
+        stage: index of the stage in WEEKLY_CHECK_STAGES, optional
+        now: iso datetime used by all tasks of one check, optional
+        cursor: websafe cursor of the chunk of entities, optional
+    """
+    job_id = request.values.get("job_id")
+    if not job_id:
+        start_weekly_check(datetime.utcnow())
+        return "done"
+    job_id = int(job_id)
+    stage = int(request.values["stage"])
+    cursor = request.values.get("cursor")
+    now = parse(request.values["now"])
+    checked, counts, next_cursor = check_chunk(stage, now, cursor)
+    model_name = WEEKLY_CHECK_STAGES[stage][0].__name__
+    logger.info("weekly check {} checked {} entities of {}".format(job_id, checked, model_name))
+    chunk = return_chunk_id(stage, cursor)
+    params = {"job_id": job_id, "now": now.isoformat()}
+    if next_cursor:
+        update_job(job_id, checked, chunk, counts=counts)
+        params.update(stage=stage, cursor=next_cursor)
+        add_task("/tasks/weekly_check", params, queue_name=MAINTENANCE_QUEUE)
+    elif stage + 1 < len(WEEKLY_CHECK_STAGES):
+        update_job(job_id, checked, chunk, stage=WEEKLY_CHECK_STAGES[stage + 1][0].__name__, counts=counts)
+        params.update(stage=stage + 1)
+        add_task("/tasks/weekly_check", params, queue_name=MAINTENANCE_QUEUE)
+    else:
+        job = update_job(job_id, checked, chunk, finished=True, counts=counts)
+        logger.info("weekly check {} finished: {}".format(job_id, job.summary if job else None))
+    return "done"
+
+
+@tasks.route("/tasks/backfill_search_tokens", methods=["GET", "POST"])
+@requires_task
+def backfill_search_tokens():
+    """Save again all entities of model in chunks so their search tokens are computed
+
+    Called without job_id starts new job, every task processes one chunk and chains the next one.
+
+    Properties:
+        model: name of the model in BACKFILL_MODELS
+        job_id: id of the job reporting progress of the backfill, optional
+        cursor: websafe cursor of the chunk of entities, optional
+    """
+    model_name = request.values["model"]
+    if model_name not in BACKFILL_MODELS:
+        logger.error("model {} cannot be backfilled".format(model_name))
+        return "done"
+    job_id = request.values.get("job_id")
+    if not job_id:
+        start_backfill(model_name)
+        return "done"
+    job_id = int(job_id)
+    cursor = request.values.get("cursor")
+    saved, next_cursor = backfill_chunk(model_name, cursor)
+    chunk = return_chunk_id(model_name, cursor)
+    if next_cursor:
+        update_job(job_id, saved, chunk)
+        add_task("/tasks/backfill_search_tokens", {"job_id": job_id, "model": model_name, "cursor": next_cursor},
+                 queue_name=MAINTENANCE_QUEUE)
+    else:
+        update_job(job_id, saved, chunk, finished=True)
+        logger.info("backfill of {} finished".format(model_name))
+    return "done"
+
+
+@tasks.route("/tasks/index_events", methods=["POST"])
+@requires_task
+def index_events_task():
+    """Update full-text index of events which were written or deleted
+
+    Properties:
+        event_id: ids of at most INDEX_BATCH_SIZE events
+    """
+    event_ids = [int(event_id) for event_id in request.form.getlist("event_id")]
+    indexed, deleted = index_events(event_ids)
+    logger.info("{} events indexed, {} events removed from index".format(indexed, deleted))
+    return "done"
+
+
+@tasks.route("/tasks/update_tiles", methods=["POST"])
+@requires_task
+def update_tiles_task():
+    """Update counts of map tiles of events which were written or deleted
+
+    Difference between counted and current state of every event is applied in its own transaction,
+    so retried task does not count events twice
+
+    Properties:
+        event_id: ids of at most TILE_BATCH_SIZE events
+    """
+    event_ids = [int(event_id) for event_id in request.form.getlist("event_id")]
+    changed, tiles = update_tiles(event_ids)
+    logger.info("{} events changed, {} tiles updated".format(changed, tiles))
+    return "done"
+
+
+@tasks.route("/tasks/rebuild_event_index", methods=["GET", "POST"])
+@requires_task
+def rebuild_event_index():
+    """Put documents of all events to the full-text index in chunks
+
+    Called without job_id starts new job, every task processes one chunk and chains the next one.
+
+    Properties:
+        job_id: id of the job reporting progress of the rebuild, optional
+        cursor: websafe cursor of the chunk of events, optional
+    """
+    job_id = request.values.get("job_id")
+    if not job_id:
+        start_index_rebuild()
+        return "done"
+    job_id = int(job_id)
+    cursor = request.values.get("cursor")
+    indexed, next_cursor = rebuild_index_chunk(cursor)
+    chunk = return_chunk_id("Event", cursor)
+    if next_cursor:
+        update_job(job_id, indexed, chunk)
+        add_task("/tasks/rebuild_event_index", {"job_id": job_id, "cursor": next_cursor}, queue_name=INDEX_QUEUE)
+    else:
+        update_job(job_id, indexed, chunk, finished=True)
+        logger.info("rebuild of event index finished")
+    return "done"
+
+
+@tasks.route("/job/<int:job_id>", methods=["GET"])
+@requires_auth
+def view_job(job_id):
+    """Endpoint which returns progress of background job
+
+    Properties:
+        job_id: id of job which is to be viewed
+
+    Returns:
+        200: properties of job in json
+        403: if job is not owned by current user
+        404: if job not found
+        405: if other method then GET used
+    """
+    job = return_job(job_id, request_uid())
+    json = jsonify_job(job)
+    return json, 200
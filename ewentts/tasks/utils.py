@@ -0,0 +1,718 @@
+"""Module containing functions used by tasks/routes.py module
+
+Background tasks process entities in chunks of CHUNK_SIZE, every task
+handles one chunk and chains next task with cursor of the following chunk,
+so the job can be resumed when a task fails and is retried.
+
+Attributes:
+    logger: Logger for logging in tasks package
+    CHUNK_SIZE: number of entities processed by one task
+    CLEANUP_QUEUE: name of the queue used for cleanup tasks
+    SIDE_EFFECTS_QUEUE: name of the queue used for tasks applying side effects of writes
+    SWEEP_QUEUE: name of the queue used for chained tasks of status sweeper
+    SWEEP_CHUNK_SIZE: number of events processed by one task of status sweeper
+    STATUS_SWEEP_STAGES: statuses of events which are checked by status sweeper
+    SCHEDULING_QUEUE: name of the queue used for chained tasks of weekly status scheduling
+    SCHEDULING_SLICE_SIZE: number of events for which one task of weekly status scheduling creates tasks
+    EVENT_LIST_PROPERTIES: properties of User containing keys of events
+    USER_CLEANUP_STAGES: list of models and their properties from which deleted user is removed
+    MAINTENANCE_QUEUE: name of the queue used for chained tasks of weekly check
+    WEEKLY_CHECK_STAGES: list of models and their repeated key properties checked by weekly check
+    BACKFILL_MODELS: models whose computed search tokens can be backfilled by name of the model
+    FANOUT_BATCH_SIZE: maximal number of timeline entries written by one task of fan-out
+    FANOUT_MAX_EVENTS: maximal number of events of one organiser fanned out by one chain of tasks
+
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from flask import jsonify
+from google.appengine.ext import ndb
+
+from ewentts.models import User, DeletedUser, Event, EventSeries, Post, Job, TimelineEntry
+from ewentts.scheduler import ScheduledTask, get_scheduler
+from ewentts.search.index import get_backend, return_event_document, send_tile_updates, INDEX_BATCH_SIZE, \
+    INDEX_QUEUE
+from ewentts.utils import delete_task, error_decorator, NotFoundError, check_user_authorised, \
+    create_task_change_status_to_present, create_tasks_change_status_to_present, status_task_name, \
+    create_task_change_status_to_past, REMINDERS_QUEUE
+
+logger = logging.getLogger("tasks")
+
+CHUNK_SIZE = 100
+CLEANUP_QUEUE = "cleanup"
+SIDE_EFFECTS_QUEUE = "event-side-effects"
+SWEEP_QUEUE = "events-status-sweep"
+SWEEP_CHUNK_SIZE = 500
+STATUS_SWEEP_STAGES = ["future", "present"]
+SCHEDULING_QUEUE = "events-status-scheduling"
+SCHEDULING_SLICE_SIZE = 1000
+EVENT_LIST_PROPERTIES = ["organised_events", "attending_events", "declined_events", "visited_events"]
+USER_CLEANUP_STAGES = [(User, ["followers", "following"]),
+                       (Event, ["guest_list", "attendees", "showed_up", "left"])]
+MAINTENANCE_QUEUE = "maintenance"
+WEEKLY_CHECK_STAGES = [(User, ["followers", "following"] + EVENT_LIST_PROPERTIES),
+                       (Event, ["guest_list", "attendees", "showed_up", "left", "posts"]),
+                       (EventSeries, ["occurrences"])]
+BACKFILL_MODELS = {"User": User, "Event": Event}
+FANOUT_BATCH_SIZE = 500
+FANOUT_MAX_EVENTS = 50
+
+
+def add_task(url, params, queue_name=CLEANUP_QUEUE):
+    """Add task calling url with params to the queue
+
+    Properties:
+        url: url of the task handler
+        params: dictionary of parameters send to the task handler
+        queue_name: name of the queue where the task is added
+    """
+    get_scheduler().add(queue_name, ScheduledTask(url, params=params))
+
+
+def fetch_chunk(query, cursor=None, chunk_size=CHUNK_SIZE, keys_only=False):
+    """Fetch one chunk of results of the query
+
+    Properties:
+        query: query which is to be fetched
+        cursor: websafe string of cursor where the chunk starts, if None first chunk is fetched
+        chunk_size: maximal number of entities in the chunk
+        keys_only: True if only keys of the entities are to be fetched
+
+    Returns:
+        results: list of entities
+        next_cursor: websafe string of cursor of the next chunk, None if this is the last chunk
+    """
+    start_cursor = ndb.Cursor(urlsafe=cursor) if cursor else None
+    results, next_cursor, more = query.fetch_page(chunk_size, start_cursor=start_cursor, keys_only=keys_only)
+    if more and next_cursor:
+        return results, next_cursor.urlsafe()
+    return results, None
+
+
+@ndb.transactional
+def remove_key_from_entity(entity_key, properties, key):
+    """Remove key from repeated properties of the entity read in transaction, so concurrent changes are kept
+
+    Returns:
+        True if the entity was edited
+    """
+    entity = entity_key.get()
+    if not entity:
+        return False
+    edited = False
+    for property_name in properties:
+        values = getattr(entity, property_name)
+        if key in values:
+            setattr(entity, property_name, [value for value in values if value != key])
+            edited = True
+    if edited:
+        entity.put()
+    return edited
+
+
+def remove_key_from_chunk(query, properties, key, cursor=None):
+    """Remove key from repeated properties of one chunk of entities returned by query
+
+    Every entity is read again and edited in its own transaction
+
+    Properties:
+        query: query returning entities containing the key
+        properties: list of names of repeated properties from which the key is removed
+        key: key which is to be removed
+        cursor: websafe string of cursor where the chunk starts
+
+    Returns:
+        edited: number of entities which were edited
+        next_cursor: websafe string of cursor of the next chunk, None if this is the last chunk
+    """
+    entity_keys, next_cursor = fetch_chunk(query, cursor, keys_only=True)
+    edited = len([entity_key for entity_key in entity_keys if remove_key_from_entity(entity_key, properties, key)])
+    return edited, next_cursor
+
+
+def query_users_with_event(event_key):
+    """Return query of users who have event_key in any of their event lists"""
+    return query_entities_with_key(User, EVENT_LIST_PROPERTIES, event_key)
+
+
+def query_entities_with_key(model, properties, key):
+    """Return query of entities of model which have key in any of the properties"""
+    filters = [getattr(model, property_name) == key for property_name in properties]
+    return model.query(ndb.OR(*filters)).order(model.key)
+
+
+def return_event_cleanup_task(event):
+    """Return task which removes all references to the deleted event"""
+    params = {"event_id": event.key.id(),
+              "post_id": [post_key.id() for post_key in event.posts],
+              "present_task": status_task_name(event.key.id(), event.start_datetime),
+              "past_task": status_task_name(event.key.id(), event.end_datetime)}
+    return ScheduledTask("/tasks/cleanup_event", params=params)
+
+
+def start_event_cleanup(event):
+    """Create task which removes all references to the deleted event
+
+    Properties:
+        event: entity of class Event which is being deleted
+    """
+    get_scheduler().add(CLEANUP_QUEUE, return_event_cleanup_task(event))
+    logger.info("cleanup of event {} started".format(event.key.id()))
+
+
+def start_events_cleanup(events):
+    """Create tasks which remove all references to the deleted events in batches
+
+    Properties:
+        events: list of entities of class Event which are being deleted
+    """
+    tasks = [return_event_cleanup_task(event) for event in events]
+    get_scheduler().add_multi(CLEANUP_QUEUE, tasks)
+    logger.info("cleanup of {} events started".format(len(events)))
+
+
+def start_event_side_effects(event, transactional=False):
+    """Create task which applies side effects of creating the event
+
+    Properties:
+        event: entity of class Event which was created
+        transactional: True if task is to be created only if current transaction commits
+    """
+    task = ScheduledTask("/tasks/event_created", params={"event_id": event.key.id()})
+    get_scheduler().add(SIDE_EFFECTS_QUEUE, task, transactional=transactional)
+
+
+@ndb.transactional
+def add_organised_event(user_key, event_key):
+    """Add event to organised events of the user if it is not there yet"""
+    user = user_key.get()
+    if not user:
+        logger.warning("organiser {} of event {} does not exist".format(user_key.id(), event_key.id()))
+        return
+    if event_key not in user.organised_events:
+        user.organised_events += [event_key]
+        user.put()
+
+
+@ndb.transactional
+def add_organised_events(user_key, event_keys):
+    """Add events to organised events of the user which are not there yet in one transaction"""
+    user = user_key.get()
+    if not user:
+        logger.warning("organiser {} of {} events does not exist".format(user_key.id(), len(event_keys)))
+        return
+    organised_events = set(user.organised_events)
+    added_keys = [event_key for event_key in event_keys if event_key not in organised_events]
+    if added_keys:
+        user.organised_events += added_keys
+        user.put()
+
+
+def apply_event_side_effects(event):
+    """Apply side effects of creating the event
+
+    Event is added to organiser's organised events, if it starts in next 7 days task
+    changing its status is created and public event is fanned out to timelines of followers
+    of the organiser, all steps can be safely repeated when task is retried
+
+    Properties:
+        event: entity of class Event which was created
+    """
+    add_organised_event(event.organiser, event.key)
+    if event.start_datetime < datetime.now() + timedelta(days=7):
+        create_task_change_status_to_present(event)
+    start_events_fan_out([event])
+
+
+def start_events_fan_out(events):
+    """Create tasks writing public events to timelines of followers of their organisers
+
+    Events of one organiser are fanned out together in batches of FANOUT_MAX_EVENTS
+
+    Properties:
+        events: list of entities of class Event which were created or whose start_datetime changed
+    """
+    by_organiser = {}
+    for event in events:
+        if not event.private:
+            by_organiser.setdefault(event.organiser, []).append(event.key.id())
+    tasks = [ScheduledTask("/tasks/fan_out_events", params={"event_id": event_ids[i:i + FANOUT_MAX_EVENTS]})
+             for event_ids in by_organiser.values() for i in range(0, len(event_ids), FANOUT_MAX_EVENTS)]
+    if tasks:
+        get_scheduler().add_multi(SIDE_EFFECTS_QUEUE, tasks)
+
+
+def fan_out_chunk(event_ids, cursor=None):
+    """Write events to timelines of one chunk of followers of their organiser
+
+    Chunk contains as many followers that at most FANOUT_BATCH_SIZE entries are written,
+    events which were deleted or are private are left out
+
+    Properties:
+        event_ids: list of ids of events of one organiser
+        cursor: websafe string of cursor where the chunk of followers starts
+
+    Returns:
+        written: number of timeline entries written
+        next_cursor: websafe string of cursor of the next chunk, None if this is the last chunk
+    """
+    events = [event for event in ndb.get_multi([ndb.Key(Event, event_id) for event_id in event_ids])
+              if event and not event.private]
+    if not events:
+        return 0, None
+    query = User.query(User.following == events[0].organiser).order(User.key)
+    followers, next_cursor = fetch_chunk(query, cursor, max(FANOUT_BATCH_SIZE // len(events), 1), keys_only=True)
+    entries = [TimelineEntry(parent=follower, id=event.key.id(), event=event.key, organiser=event.organiser,
+                             start_datetime=event.start_datetime)
+               for follower in followers for event in events]
+    ndb.put_multi(entries)
+    return len(entries), next_cursor
+
+
+def delete_timeline_chunk(event_key, cursor=None):
+    """Delete one chunk of timeline entries of deleted event
+
+    Returns:
+        deleted: number of timeline entries deleted
+        next_cursor: websafe string of cursor of the next chunk, None if this is the last chunk
+    """
+    query = TimelineEntry.query(TimelineEntry.event == event_key).order(TimelineEntry.key)
+    keys, next_cursor = fetch_chunk(query, cursor, FANOUT_BATCH_SIZE, keys_only=True)
+    ndb.delete_multi(keys)
+    return len(keys), next_cursor
+
+
+def query_events_to_sweep(status, now):
+    """Return query of events with status which should already be changed at time now"""
+    if status == "future":
+        return Event.query(Event.status == "future", Event.start_datetime <= now)
+    return Event.query(Event.status == "present", Event.end_datetime <= now)
+
+
+@ndb.transactional
+def sweep_event_status(event_key, now):
+    """Read the event in transaction and change its status to the status at time now
+
+    Returns:
+        True if status of the event was changed
+    """
+    event = event_key.get()
+    if not event:
+        return False
+    status = event.current_status(now)
+    if status == event.status:
+        return False
+    event.status = status
+    event.put()
+    return True
+
+
+def sweep_status_chunk(status, now, cursor=None):
+    """Change status of one chunk of events whose start or end already passed
+
+    Every event is read again and its status changed in its own transaction,
+    so changes written since the chunk was fetched are kept
+
+    Properties:
+        status: status of events which are checked future|present
+        now: datetime compared with start_datetime and end_datetime of the events
+        cursor: websafe string of cursor where the chunk starts
+
+    Returns:
+        edited: number of events which status was changed
+        next_cursor: websafe string of cursor of the next chunk, None if this is the last chunk
+    """
+    query = query_events_to_sweep(status, now)
+    event_keys, next_cursor = fetch_chunk(query, cursor, SWEEP_CHUNK_SIZE, keys_only=True)
+    edited = len([event_key for event_key in event_keys if sweep_event_status(event_key, now)])
+    return edited, next_cursor
+
+
+def schedule_status_slice(now, cursor=None):
+    """Create tasks changing status to present for one slice of events starting in next 7 days
+
+    Properties:
+        now: datetime from which the 7 days are measured
+        cursor: websafe string of cursor where the slice starts
+
+    Returns:
+        scheduled: number of events in the slice
+        next_cursor: websafe string of cursor of the next slice, None if this is the last slice
+    """
+    query = Event.query(Event.start_datetime > now, Event.start_datetime < now + timedelta(days=7))
+    events, next_cursor = fetch_chunk(query, cursor, SCHEDULING_SLICE_SIZE)
+    create_tasks_change_status_to_present(events)
+    return len(events), next_cursor
+
+
+def cancel_status_tasks(present_task_name, past_task_name):
+    """Delete tasks which would change status of the event or send reminders to its attendees"""
+    delete_task("events-status-to-present", present_task_name)
+    delete_task(REMINDERS_QUEUE, present_task_name)
+    delete_task("events-status-to-past", past_task_name)
+
+
+def delete_posts(post_ids):
+    """Delete posts with ids received in chunks of CHUNK_SIZE"""
+    post_keys = [ndb.Key(Post, post_id) for post_id in post_ids]
+    for i in range(0, len(post_keys), CHUNK_SIZE):
+        ndb.delete_multi(post_keys[i:i + CHUNK_SIZE])
+    logger.info("{} posts deleted".format(len(post_keys)))
+
+
+def archive_user(user):
+    """Save copy of the user as DeletedUser and return it"""
+    deleted_user = DeletedUser(id=user.key.id(),
+                               user_names=user.user_names,
+                               profile_picture_url=user.profile_picture_url,
+                               user_email=user.user_email,
+                               followers=user.followers,
+                               following=user.following,
+                               organised_events=user.organised_events,
+                               attending_events=user.attending_events,
+                               declined_events=user.declined_events,
+                               visited_events=user.visited_events)
+    deleted_user.put()
+    logger.info("user {} archived".format(user.key.id()))
+    return deleted_user
+
+
+def start_user_cleanup(user_id):
+    """Create job and task which removes all references to the deleted user
+
+    Properties:
+        user_id: id of the deleted user
+
+    Returns:
+        job: entity of class Job reporting progress of the cleanup
+    """
+    job = Job(job_type="cleanup_user", target=user_id, owner=user_id, stage=USER_CLEANUP_STAGES[0][0].__name__)
+    job.put()
+    add_task("/tasks/cleanup_user", {"job_id": job.key.id(), "user_id": user_id, "stage": 0})
+    logger.info("cleanup of user {} started".format(user_id))
+    return job
+
+
+def return_chunk_id(stage, cursor=None):
+    """Return string identifying chunk of the stage starting at websafe cursor"""
+    return "{}:{}".format(stage, cursor or "")
+
+
+@ndb.transactional
+def update_job(job_id, processed, chunk=None, stage=None, finished=False, counts=None):
+    """Add number of processed entities to the job and save it in transaction
+
+    Properties:
+        job_id: id of the job
+        processed: number of entities processed since last update
+        chunk: string identifying the processed chunk returned by return_chunk_id, update is skipped
+            if the chunk was already counted by the last update, if None update is never skipped
+        stage: name of the stage the job is processing, if None stage is not changed
+        finished: True if the job finished
+        counts: dictionary of counts of work done since last update added to summary of the job
+    """
+    job = ndb.Key(Job, job_id).get()
+    if not job:
+        logger.warning("job {} does not exist".format(job_id))
+        return None
+    if chunk is not None and job.last_chunk == chunk:
+        logger.info("chunk {} was already counted by job {}".format(chunk, job_id))
+        return job
+    job.last_chunk = chunk
+    job.processed += processed
+    if counts:
+        summary = dict(job.summary or {})
+        for name, count in counts.items():
+            summary[name] = summary.get(name, 0) + count
+        job.summary = summary
+    if stage:
+        job.stage = stage
+    if finished:
+        job.finished = True
+        job.finished_datetime = datetime.utcnow()
+    job.put()
+    return job
+
+
+@ndb.transactional
+def clean_entity_key_lists(entity_key, properties, dangling_keys):
+    """Remove dangling keys and duplicates from repeated key properties of the entity read in transaction
+
+    Keys which were not checked are kept, so keys added since the check are not removed
+
+    Properties:
+        entity_key: key of the entity
+        properties: list of names of repeated properties containing keys
+        dangling_keys: set of keys whose entities do not exist
+
+    Returns:
+        dictionary with number of removed dangling_keys and duplicates
+    """
+    counts = {"dangling_keys": 0, "duplicates": 0}
+    entity = entity_key.get()
+    if not entity:
+        return counts
+    edited = False
+    for property_name in properties:
+        values = getattr(entity, property_name)
+        cleaned_values = []
+        for key in values:
+            if key in dangling_keys:
+                counts["dangling_keys"] += 1
+            elif key in cleaned_values:
+                counts["duplicates"] += 1
+            else:
+                cleaned_values += [key]
+        if len(cleaned_values) != len(values):
+            setattr(entity, property_name, cleaned_values)
+            edited = True
+    if edited:
+        entity.put()
+    return counts
+
+
+def clean_key_lists(entities, properties):
+    """Remove dangling keys and duplicates from repeated key properties of entities
+
+    Existence of all keys referenced by the entities is checked with one batch get, entities which
+    have dangling keys or duplicates are read again and edited in their own transactions
+
+    Properties:
+        entities: list of entities which are checked
+        properties: list of names of repeated properties containing keys
+
+    Returns:
+        edited: number of entities which were edited
+        counts: dictionary with number of removed dangling_keys and duplicates
+    """
+    keys = list(set(key for entity in entities for property_name in properties
+                    for key in getattr(entity, property_name)))
+    dangling_keys = set(key for key, entity in zip(keys, ndb.get_multi(keys)) if not entity)
+    counts = {"dangling_keys": 0, "duplicates": 0}
+    edited = 0
+    for entity in entities:
+        values_lists = [getattr(entity, property_name) for property_name in properties]
+        if not any(len(set(values)) != len(values) or dangling_keys.intersection(values) for values in values_lists):
+            continue
+        entity_counts = clean_entity_key_lists(entity.key, properties, dangling_keys)
+        if any(entity_counts.values()):
+            edited += 1
+        for name, count in entity_counts.items():
+            counts[name] += count
+    return edited, counts
+
+
+def reschedule_status_tasks(events, now):
+    """Create tasks changing status of events which are due in next 7 days
+
+    Tasks are named, so tasks which already exist are not created again
+
+    Properties:
+        events: list of entities of class Event
+        now: datetime from which the 7 days are measured
+
+    Returns:
+        number of events for which tasks were requested
+    """
+    week_later = now + timedelta(days=7)
+    starting = [event for event in events
+                if event.status == "future" and now < event.start_datetime < week_later]
+    ending = [event for event in events
+              if event.status == "present" and event.end_datetime and now < event.end_datetime < week_later]
+    create_tasks_change_status_to_present(starting)
+    for event in ending:
+        create_task_change_status_to_past(event)
+    return len(starting) + len(ending)
+
+
+def check_chunk(stage, now, cursor=None):
+    """Run weekly check on one chunk of entities of the stage
+
+    Properties:
+        stage: index of the stage in WEEKLY_CHECK_STAGES
+        now: datetime used for rescheduling of status tasks
+        cursor: websafe string of cursor where the chunk starts
+
+    Returns:
+        checked: number of entities in the chunk
+        counts: dictionary with counts of work done on the chunk
+        next_cursor: websafe string of cursor of the next chunk, None if this is the last chunk
+    """
+    model, properties = WEEKLY_CHECK_STAGES[stage]
+    entities, next_cursor = fetch_chunk(model.query().order(model.key), cursor)
+    edited, counts = clean_key_lists(entities, properties)
+    counts["edited_entities"] = edited
+    if model is Event:
+        counts["status_tasks"] = reschedule_status_tasks(entities, now)
+    return len(entities), counts, next_cursor
+
+
+def start_weekly_check(now):
+    """Create job and task running weekly check of users and events
+
+    Properties:
+        now: datetime used by all tasks of the check
+
+    Returns:
+        job: entity of class Job reporting progress and summary of the check
+    """
+    job = Job(job_type="weekly_check", stage=WEEKLY_CHECK_STAGES[0][0].__name__, summary={})
+    job.put()
+    add_task("/tasks/weekly_check", {"job_id": job.key.id(), "stage": 0, "now": now.isoformat()},
+             queue_name=MAINTENANCE_QUEUE)
+    logger.info("weekly check {} started".format(job.key.id()))
+    return job
+
+
+def start_backfill(model_name):
+    """Create job and task which saves again all entities of model so their computed properties are filled
+
+    Properties:
+        model_name: name of the model in BACKFILL_MODELS
+
+    Returns:
+        job: entity of class Job reporting progress of the backfill
+    """
+    job = Job(job_type="backfill_search_tokens", target=model_name, stage=model_name)
+    job.put()
+    add_task("/tasks/backfill_search_tokens", {"job_id": job.key.id(), "model": model_name},
+             queue_name=MAINTENANCE_QUEUE)
+    logger.info("backfill of {} started".format(model_name))
+    return job
+
+
+@ndb.transactional
+def resave_entity(entity_key):
+    """Read the entity in transaction and save it again, so its computed properties are filled
+
+    Returns:
+        True if the entity exists and was saved
+    """
+    entity = entity_key.get()
+    if not entity:
+        return False
+    entity.put()
+    return True
+
+
+def backfill_chunk(model_name, cursor=None):
+    """Save again one chunk of entities of model so their computed properties are filled
+
+    Every entity is read again and saved in its own transaction, so changes written since the chunk
+    was fetched are not overwritten
+
+    Properties:
+        model_name: name of the model in BACKFILL_MODELS
+        cursor: websafe string of cursor where the chunk starts
+
+    Returns:
+        saved: number of entities saved
+        next_cursor: websafe string of cursor of the next chunk, None if this is the last chunk
+    """
+    model = BACKFILL_MODELS[model_name]
+    entity_keys, next_cursor = fetch_chunk(model.query().order(model.key), cursor, keys_only=True)
+    saved = len([entity_key for entity_key in entity_keys if resave_entity(entity_key)])
+    return saved, next_cursor
+
+
+def index_events(event_ids):
+    """Put documents of existing events to the full-text index and delete documents of deleted events
+
+    Properties:
+        event_ids: list of ids of events which were written or deleted
+
+    Returns:
+        indexed: number of documents put to the index
+        deleted: number of documents deleted from the index
+    """
+    events = ndb.get_multi([ndb.Key(Event, event_id) for event_id in event_ids])
+    documents = [return_event_document(event) for event in events if event]
+    deleted_ids = [str(event_id) for event_id, event in zip(event_ids, events) if not event]
+    if documents:
+        get_backend().put(documents)
+    if deleted_ids:
+        get_backend().delete(deleted_ids)
+    return len(documents), len(deleted_ids)
+
+
+def start_index_rebuild():
+    """Create job and task which puts documents of all events to the full-text index
+
+    Returns:
+        job: entity of class Job reporting progress of the rebuild
+    """
+    job = Job(job_type="rebuild_event_index", stage="Event")
+    job.put()
+    add_task("/tasks/rebuild_event_index", {"job_id": job.key.id()}, queue_name=INDEX_QUEUE)
+    logger.info("rebuild of event index started")
+    return job
+
+
+def rebuild_index_chunk(cursor=None):
+    """Put documents of one chunk of INDEX_BATCH_SIZE events to the full-text index
+    and create tasks counting them in map tiles
+
+    Properties:
+        cursor: websafe string of cursor where the chunk starts
+
+    Returns:
+        indexed: number of documents put to the index
+        next_cursor: websafe string of cursor of the next chunk, None if this is the last chunk
+    """
+    events, next_cursor = fetch_chunk(Event.query().order(Event.key), cursor, INDEX_BATCH_SIZE)
+    if events:
+        get_backend().put([return_event_document(event) for event in events])
+        send_tile_updates([event.key.id() for event in events])
+    return len(events), next_cursor
+
+
+def jsonify_job(job):
+    """Return properties of job in json
+
+    Properties:
+        job: entity of class Job
+
+    Returns:
+        Properties of job in json:
+            job_id: unique job id
+            job_type: type of the job
+            target: id of the entity the job works on
+            stage: name of the stage the job is processing
+            processed: number of entities processed by the job
+            finished: True if the job finished
+            started_datetime: time when the job was started
+            finished_datetime: time when the job finished, None if not finished yet
+            duration: seconds the job ran, None if not finished yet
+            summary: counts of work done by the job
+    """
+    finished_datetime = job.finished_datetime.isoformat() if job.finished_datetime else None
+    duration = (job.finished_datetime - job.started_datetime).total_seconds() if job.finished_datetime else None
+    json = jsonify(job_id=job.key.id(),
+                   job_type=job.job_type,
+                   target=job.target,
+                   stage=job.stage,
+                   processed=job.processed,
+                   finished=job.finished,
+                   started_datetime=job.started_datetime.isoformat(),
+                   finished_datetime=finished_datetime,
+                   duration=duration,
+                   summary=job.summary or {})
+    return json
+
+
+@error_decorator
+def return_job(job_id, current_user_id):
+    """Returns job based on job id if it is owned by current user
+
+    Raises:
+        NotFoundError: if job not found
+        ForbiddenError: if job is not owned by current user
+    """
+    job = ndb.Key(Job, job_id).get()
+    if not job:
+        logger.error("job: %s does not exist", job_id)
+        raise NotFoundError("Job with this ID does not exist")
+    check_user_authorised(current_user=current_user_id, authorised_user=job.owner)
+    return job
@@ -0,0 +1,70 @@
+"""Module containing functions normalising text for search indexes
+
+Text is folded to lower case ascii, accents are removed and it is split into words
+on every character which is not letter or digit, prefixes of words are saved as
+search tokens so search for prefix becomes equality lookup on the index.
+
+Attributes:
+    MAX_TOKEN_LENGTH: maximal length of search token, longer words are searched by their prefix
+
+"""
+
+import re
+import unicodedata
+
+MAX_TOKEN_LENGTH = 20
+
+_WORD_SEPARATOR = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalise(text):
+    """Return text in lower case without accents
+
+    Properties:
+        text: string or unicode
+
+    Raises:
+        ValueError: if text is not string
+    """
+    if isinstance(text, str):
+        try:
+            text = text.decode("utf-8")
+        except (AttributeError, UnicodeDecodeError):
+            pass
+    if not isinstance(text, basestring):
+        raise ValueError("text is not string")
+    text = unicodedata.normalize("NFKD", text)
+    text = u"".join(character for character in text if not unicodedata.combining(character))
+    return text.lower()
+
+
+def split_words(text):
+    """Return list of normalised words of text"""
+    return [word for word in _WORD_SEPARATOR.split(normalise(text)) if word]
+
+
+def query_tokens(text):
+    """Return list of unique tokens which are searched for text, longer words are cut to MAX_TOKEN_LENGTH"""
+    tokens = []
+    for word in split_words(text):
+        token = word[:MAX_TOKEN_LENGTH]
+        if token not in tokens:
+            tokens += [token]
+    return tokens
+
+
+def prefix_tokens(texts):
+    """Return sorted list of all prefixes of normalised words of texts
+
+    Properties:
+        texts: list of strings
+
+    Returns:
+        list of tokens which are saved to search index
+    """
+    tokens = set()
+    for text in texts:
+        for word in split_words(text):
+            word = word[:MAX_TOKEN_LENGTH]
+            tokens.update(word[:i] for i in range(1, len(word) + 1))
+    return sorted(tokens)
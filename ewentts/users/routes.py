@@ -9,9 +9,10 @@ from flask import Blueprint, jsonify, request
 from firebase_admin import auth
 from google.appengine.ext import ndb
 
-from ewentts.models import User, DeletedUser
+from ewentts.models import User
 from ewentts.utils import requires_auth, request_uid, return_jsonified_users, return_jsonified_events, get_per_page, \
     return_user, paginate_list, check_user_authorised
+from ewentts.tasks.utils import archive_user, start_user_cleanup
 from .utils import create_user, user_exists, jsonify_user, return_edited_user, logger, follow_user
 
 users = Blueprint("users", __name__)
@@ -82,11 +83,14 @@ def view_profile(user_id):
 def delete_user(user_id):
     """Endpoint which deletes user
 
+    User is archived as DeletedUser and deleted immediately, references to the
+    user from other users and events are removed by background job
+
     Properties:
         user_id: id of user which is to be deleted
 
     Returns:
-        200: message that event was deleted in json
+        200: properties of deleted user and id of the cleanup job in json
         403: if user without right to delete this user calls this endpoint
         404: if user not found
         405: if other method then DELETE used
@@ -94,12 +98,14 @@ def delete_user(user_id):
     current_user_id = request_uid()
     if check_user_authorised(current_user=current_user_id, authorised_user=user_id):
         user = return_user(user_id)
-        deleted_user = DeletedUser(user_names=user.user_names,
-                                   profile_picture_url=user.profile_picture_url,
-                                   user_id=user.key.id(),
-                                   user_email=user.user_email)
+        deleted_user = archive_user(user)
         user.key.delete()
-        json = jsonify_user(deleted_user)
+        job = start_user_cleanup(user_id)
+        json = jsonify(user_names=" ".join(deleted_user.user_names),
+                       profile_picture_url=deleted_user.profile_picture_url,
+                       user_id=deleted_user.key.id(),
+                       user_email=deleted_user.user_email,
+                       job_id=job.key.id())
         return json, 200
 
 
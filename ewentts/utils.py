@@ -2,24 +2,33 @@
 
 Attributes:
     logger: Logger for logging in this module
+    REMINDERS_QUEUE: name of the queue used for tasks sending reminders to attendees
+    REMINDER_LEAD: time before start of event when reminders are sent
+    TASK_HEADERS: headers set by App Engine on requests of task queues and cron
 
 """
 
+import calendar
 import inspect
 import logging
 import re
+from datetime import timedelta
 from functools import wraps
 
 from flask import request, abort, jsonify
 from firebase_admin import auth
-from geopy import Point, distance
 from google.appengine.ext import ndb
-from google.appengine.api import taskqueue
 
+from ewentts.geo import bounding_box
 from ewentts.models import Event, User
+from ewentts.scheduler import ScheduledTask, get_scheduler
 
 logger = logging.getLogger('ewentts.utils')
 
+REMINDERS_QUEUE = "event-reminders"
+REMINDER_LEAD = timedelta(hours=1)
+TASK_HEADERS = ["X-AppEngine-QueueName", "X-AppEngine-Cron"]
+
 
 class BadRequestError(Exception):
     """Raise Error when incorrect data was send to the server"""
@@ -101,6 +110,21 @@ def requires_auth(f):
     return decorated
 
 
+def requires_task(f):
+    """Decorator allowing only requests of App Engine task queues and cron, other requests are aborted with 403
+
+    App Engine removes X-AppEngine-QueueName and X-AppEngine-Cron headers from requests coming
+    from outside of the application, so presence of any of them can not be forged
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not any(request.headers.get(header) for header in TASK_HEADERS):
+            logger.warning("task {} called outside of task queue or cron".format(request.path))
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated
+
+
 def request_uid():
     """Return uid"""
     token = request_decoded_token()
@@ -138,13 +162,14 @@ def return_jsonified_users(users, list_len=False, next_page=False):
     return jsonify(json)
 
 
-def return_jsonified_events(events, list_len=False, next_page=False):
+def return_jsonified_events(events, list_len=False, next_page=False, distances=None):
     """Return events in json
 
     Properties:
         events: list of events to be transformed to json
         list_len: total length of event list, if False length not defined
         next_page: link to the next page of events, if False this is the last page
+        distances: list of distances of events in km, if None distance not included
 
     Returns:
         events, next_page, list_len in json
@@ -158,13 +183,14 @@ def return_jsonified_events(events, list_len=False, next_page=False):
                 description: string, description of the event
                 private: boolean, if event if private
                 organiser: string, event organisers name
+                distance: float, distance of the event in km, only if distances received
     """
     event_list = []
-    for event in events:
+    for i, event in enumerate(events):
         organiser = event.organiser.get()
         event_list += [{"event_name": event.event_name,
                         "event_id": event.key.id(),
-                        "event_status": event.status,
+                        "event_status": event.current_status(),
                         "start_datetime": event.start_datetime.isoformat(),
                         "end_datetime": event.end_datetime.isoformat(),
                         "location": [str(event.latitude), str(event.longitude)],
@@ -172,6 +198,8 @@ def return_jsonified_events(events, list_len=False, next_page=False):
                         "description": event.description,
                         "private": event.private,
                         "organiser": " ".join(organiser.user_names)}]
+        if distances is not None:
+            event_list[-1]["distance"] = round(distances[i], 3)
     json = {"events": event_list,
             "next_page": next_page,
             "list_len": list_len}
@@ -261,6 +289,44 @@ def paginate(query, per_page):
     return results, next_page
 
 
+def paginate_filtered(query, per_page, entity_filter, max_scanned=1000, cursor=None):
+    """Returns page of results of query which pass entity_filter
+
+    Query is iterated from cursor received until per_page results pass the filter or max_scanned
+    entities are scanned, so next page starts right after the last scanned entity
+
+    Properties:
+       query: query of events, users or posts ordered by key
+       per_page: number of how many entities are to be returned per page
+       entity_filter: function returning True if entity is to be returned
+       max_scanned: maximal number of entities scanned for one page
+       cursor: websafe string of cursor of the page, if None cursor is read from request
+
+    Returns:
+        results: list of entities
+        next_page: link to the next page
+    """
+    try:
+        cursor = ndb.Cursor.from_websafe_string(cursor if cursor is not None else request.args.get("cursor"))
+    except:
+        logger.info("first page called")
+        cursor = None
+    iterator = query.iter(start_cursor=cursor, produce_cursors=True)
+    results = []
+    scanned = 0
+    for entity in iterator:
+        scanned += 1
+        if entity_filter(entity):
+            results += [entity]
+        if len(results) == per_page or scanned == max_scanned:
+            break
+    if scanned and iterator.has_next():
+        next_page = iterator.cursor_after().urlsafe()
+    else:
+        next_page = False
+    return results, next_page
+
+
 def get_per_page():
     """Extract per_page property
 
@@ -380,46 +446,94 @@ def generate_location_search_boundaries(original_location, search_range=10):
     Returns:
         Dictionary of boundaries: maxlatitude, maxlongitude, minlatitude, minlongitude
     """
-    start = Point(original_location)
-    dist = distance.VincentyDistance(kilometers=search_range)
-    boundaries = dict()
-    new_point = dist.destination(point=start, bearing=0)
-    boundaries["maxlatitude"] = new_point.latitude
-    new_point = dist.destination(point=start, bearing=90)
-    boundaries["maxlongitude"] = new_point.longitude
-    new_point = dist.destination(point=start, bearing=180)
-    boundaries["minlatitude"] = new_point.latitude
-    new_point = dist.destination(point=start, bearing=270)
-    boundaries["minlongitude"] = new_point.longitude
-    return boundaries
+    return dict(bounding_box(original_location, search_range))
 
 
-def create_task_change_status_to_present(event):
-    """Create task which change status of event to present when due
+def status_task_version(due_datetime):
+    """Return version of task changing status of event due at due_datetime
+
+    Version changes whenever start_datetime or end_datetime of the event is edited,
+    so stale tasks can be recognised and task names are never reused for another due time
+    """
+    return str(calendar.timegm(due_datetime.timetuple()))
+
+
+def status_task_name(event_id, due_datetime):
+    """Return name of task changing status of event due at due_datetime"""
+    return "{}-{}".format(event_id, status_task_version(due_datetime))
+
+
+def return_task_change_status_to_present(event):
+    """Return task which change status of event to present when due
 
     Properties:
        event: entity of class Event
     """
     event_id = event.key.id()
     start_datetime = event.start_datetime
-    url = "/tasks/change_status_to_present?event_id=" + str(event_id)
-    taskqueue.add(method="GET", url=url, queue_name="events-status-to-present", name=str(event_id),
-                  eta=start_datetime)
+    url = "/tasks/change_status_to_present?event_id={}&version={}".format(event_id,
+                                                                           status_task_version(start_datetime))
+    return ScheduledTask(url, method="GET", name=status_task_name(event_id, start_datetime), eta=start_datetime)
+
 
+def return_reminder_task(event):
+    """Return task which sends reminders to attendees of event REMINDER_LEAD before its start
 
-def create_task_change_status_to_past(event_id):
+    Properties:
+       event: entity of class Event
+    """
+    event_id = event.key.id()
+    start_datetime = event.start_datetime
+    params = {"event_id": event_id, "version": status_task_version(start_datetime)}
+    return ScheduledTask("/tasks/send_reminders", params=params, name=status_task_name(event_id, start_datetime),
+                         eta=start_datetime - REMINDER_LEAD)
+
+
+def create_task_change_status_to_present(event):
+    """Create task which change status of event to present when due
+
+    If task with the same name already exists or was recently deleted the task is not
+    created and status of the event is changed by status sweeper,
+    task sending reminders to attendees of the event is created as well
+
+    Properties:
+       event: entity of class Event
+    """
+    task = return_task_change_status_to_present(event)
+    if not get_scheduler().add("events-status-to-present", task):
+        logger.warning("task changing status of event {} to present not created".format(event.key.id()))
+    get_scheduler().add(REMINDERS_QUEUE, return_reminder_task(event))
+
+
+def create_tasks_change_status_to_present(events):
+    """Create tasks which change status of events to present when due
+
+    Tasks are added to the queue in batches, tasks which already exist are skipped
+    and status of their events is changed by status sweeper,
+    tasks sending reminders to attendees of the events are created as well
+
+    Properties:
+       events: list of entities of class Event
+    """
+    tasks = [return_task_change_status_to_present(event) for event in events]
+    get_scheduler().add_multi("events-status-to-present", tasks)
+    get_scheduler().add_multi(REMINDERS_QUEUE, [return_reminder_task(event) for event in events])
+
+
+def create_task_change_status_to_past(event):
     """Create task which change status of event to past when due
 
     Properties:
        event: entity of class Event
     """
-    event = return_event(event_id)
+    event_id = event.key.id()
     end_datetime = event.end_datetime
-    url = "/tasks/change_status_to_past?event_id=" + str(event_id)
-    taskqueue.add(method="GET", url=url, queue_name="events-status-to-past", name=str(event_id), eta=end_datetime)
+    url = "/tasks/change_status_to_past?event_id={}&version={}".format(event_id, status_task_version(end_datetime))
+    task = ScheduledTask(url, method="GET", name=status_task_name(event_id, end_datetime), eta=end_datetime)
+    if not get_scheduler().add("events-status-to-past", task):
+        logger.warning("task changing status of event {} to past not created".format(event_id))
 
 
 def delete_task(queue_name, task_name):
     """Delete task from queue queue_name by task_name"""
-    queue = taskqueue.Queue(queue_name)
-    queue.delete_tasks(taskqueue.Task(name=task_name))
+    get_scheduler().delete(queue_name, task_name)
@@ -0,0 +1,51 @@
+import unittest
+from datetime import datetime
+
+from ewentts.days import local_days, parse_days, parse_tz_offset, validate_timezone, MAX_EVENT_DAYS
+
+
+class LocalDaysTest(unittest.TestCase):
+    def test_days_in_timezone_of_event(self):
+        start = datetime(2100, 10, 3, 23, 30)
+        self.assertEqual(local_days(start, datetime(2100, 10, 3, 23, 45)), ["2100-10-03"])
+        self.assertEqual(local_days(start, datetime(2100, 10, 3, 23, 45), "Europe/Prague"), ["2100-10-04"])
+        self.assertEqual(local_days(start, datetime(2100, 10, 4, 3), "America/New_York"), ["2100-10-03"])
+
+    def test_event_spanning_days(self):
+        self.assertEqual(local_days(datetime(2100, 10, 3, 20), datetime(2100, 10, 5, 2)),
+                         ["2100-10-03", "2100-10-04", "2100-10-05"])
+        self.assertEqual(local_days(datetime(2100, 10, 3, 20), datetime(2100, 10, 4)), ["2100-10-03"])
+        self.assertEqual(len(local_days(datetime(2100, 1, 1), datetime(2101, 1, 1))), MAX_EVENT_DAYS)
+
+    def test_validate_timezone(self):
+        self.assertEqual(validate_timezone("Europe/Prague"), "Europe/Prague")
+        with self.assertRaises(ValueError):
+            validate_timezone("Europe/Nowhere")
+
+
+class ParseDaysTest(unittest.TestCase):
+    def test_today_in_client_timezone(self):
+        now = datetime(2100, 10, 3, 23, 30)
+        self.assertEqual(parse_days("today", 0, now), ["2100-10-03"])
+        self.assertEqual(parse_days("today", 120, now), ["2100-10-04"])
+        self.assertEqual(parse_days("tomorrow", -300, now), ["2100-10-04"])
+
+    def test_range(self):
+        self.assertEqual(parse_days("2100-10-03..2100-10-05"), ["2100-10-03", "2100-10-04", "2100-10-05"])
+        self.assertEqual(parse_days("today..tomorrow", 0, datetime(2100, 10, 3)), ["2100-10-03", "2100-10-04"])
+        with self.assertRaises(ValueError):
+            parse_days("2100-10-05..2100-10-03")
+        with self.assertRaises(ValueError):
+            parse_days("2100-10-01..2100-11-01")
+
+    def test_tz_offset(self):
+        self.assertEqual(parse_tz_offset(None), 0)
+        self.assertEqual(parse_tz_offset("-300"), -300)
+        with self.assertRaises(ValueError):
+            parse_tz_offset("1000")
+        with self.assertRaises(ValueError):
+            parse_tz_offset("abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from ewentts import geo
+from ewentts.geo import distance_km, distances_km, bounding_box
+
+
+class DistanceTest(unittest.TestCase):
+    def test_distance(self):
+        self.assertAlmostEqual(distance_km((50.0755, 14.4378), (48.1486, 17.1077)), 289.2, delta=0.5)
+        self.assertEqual(distance_km((49.0, 15.0), (49.0, 15.0)), 0)
+
+    def test_distances_match_distance(self):
+        latitudes = [49.0, -33.8688, 89.9, 0.0]
+        longitudes = [15.0, 151.2093, -179.0, 180.0]
+        distances = distances_km((50.0755, 14.4378), latitudes, longitudes)
+        for i in range(len(latitudes)):
+            self.assertAlmostEqual(distances[i], distance_km((50.0755, 14.4378), (latitudes[i], longitudes[i])), 6)
+
+    def test_distances_empty(self):
+        self.assertEqual(len(distances_km((49.0, 15.0), [], [])), 0)
+
+
+class BoundingBoxTest(unittest.TestCase):
+    def setUp(self):
+        geo._box_cache.clear()
+
+    def test_box_contains_circle(self):
+        point = (49.39547, 15.59095)
+        box = bounding_box(point, 10)
+        for latitude, longitude in [(box["maxlatitude"], point[1]), (box["minlatitude"], point[1])]:
+            self.assertGreaterEqual(distance_km(point, (latitude, longitude)), 10)
+        for bearing_point in [(point[0] + 0.05, point[1] + 0.1), (point[0] - 0.05, point[1] - 0.1)]:
+            if distance_km(point, bearing_point) <= 10:
+                self.assertTrue(box["minlatitude"] <= bearing_point[0] <= box["maxlatitude"])
+                self.assertTrue(box["minlongitude"] <= bearing_point[1] <= box["maxlongitude"])
+        self.assertGreaterEqual(distance_km(point, (point[0], box["maxlongitude"])), 10)
+
+    def test_box_wraps_around_antimeridian(self):
+        box = bounding_box((0.0, 179.99), 100)
+        self.assertGreater(box["minlongitude"], box["maxlongitude"])
+
+    def test_box_near_pole(self):
+        box = bounding_box((89.99, 0.0), 10)
+        self.assertEqual(box["maxlatitude"], 90.0)
+        self.assertEqual((box["minlongitude"], box["maxlongitude"]), (-180.0, 180.0))
+
+    def test_box_memoized(self):
+        box = bounding_box((49.39547, 15.59095), 10)
+        self.assertIs(bounding_box((49.39548, 15.59094), 10), box)
+        self.assertIsNot(bounding_box((49.39547, 15.59095), 20), box)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+from ewentts.geohash import encode, location_cells, covering_precision, covering_cells
+
+
+class EncodeTest(unittest.TestCase):
+    def test_encode(self):
+        self.assertEqual(encode(57.64911, 10.40744, 7), "u4pruyd")
+        self.assertEqual(encode(-25.382708, -49.265506, 5), "6gkzw")
+
+    def test_location_cells(self):
+        self.assertEqual(location_cells(57.64911, 10.40744),
+                         ["u", "u4", "u4p", "u4pr", "u4pru", "u4pruy", "u4pruyd"])
+
+
+class CoveringCellsTest(unittest.TestCase):
+    def test_covering_precision(self):
+        self.assertEqual(covering_precision(49.4, 10), 4)
+        self.assertEqual(covering_precision(49.4, 0.05), 7)
+        self.assertEqual(covering_precision(0, 20000), 0)
+
+    def test_cells_contain_location(self):
+        cells = covering_cells(49.39547, 15.59095, 10)
+        self.assertEqual(len(cells), 9)
+        self.assertIn(encode(49.39547, 15.59095, 4), cells)
+
+    def test_cells_wrap_around_antimeridian(self):
+        cells = covering_cells(0.0, 179.99, 100)
+        self.assertIn(encode(0.0, -179.99, len(cells[0])), cells)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from dateutil.parser import parse
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from ewentts.models import Event, User
+
+
+class EventCurrentStatusTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.event = Event(event_name="Event Name",
+                           status="future",
+                           start_datetime=parse("2100-10-03T10:00:00"),
+                           end_datetime=parse("2100-10-03T20:00:00"),
+                           latitude=0.0,
+                           longitude=0.0,
+                           private=False,
+                           organiser=ndb.Key(User, "ab11"))
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_status_derived_from_datetimes(self):
+        self.assertEqual(self.event.current_status(parse("2100-10-03T09:00:00")), "future")
+        self.assertEqual(self.event.current_status(parse("2100-10-03T10:00:00")), "present")
+        self.assertEqual(self.event.current_status(parse("2100-10-03T20:00:00")), "past")
+
+    def test_status_does_not_go_back(self):
+        self.event.status = "past"
+
+        self.assertEqual(self.event.current_status(parse("2100-10-03T09:00:00")), "past")
+
+    def test_status_reconciled_on_put(self):
+        self.event.start_datetime = parse("2000-10-03T10:00:00")
+        self.event.end_datetime = parse("2000-10-03T20:00:00")
+        self.event.put()
+
+        self.assertEqual(self.event.key.get().status, "past")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from datetime import datetime, timedelta
+
+from ewentts.scheduler import LocalScheduler, ScheduledTask
+
+
+class LocalSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2019, 5, 1, 12)
+        self.dispatched = []
+        self.status_code = 200
+        self.scheduler = LocalScheduler(self.dispatch, now=self.now, retry_limit=2)
+
+    def dispatch(self, task):
+        self.dispatched += [task.url]
+        return self.status_code
+
+    def test_tasks_executed_in_order_of_eta(self):
+        self.scheduler.add("default", ScheduledTask("/late", eta=self.now + timedelta(hours=2)))
+        self.scheduler.add("default", ScheduledTask("/early", eta=self.now + timedelta(hours=1)))
+        self.scheduler.add("default", ScheduledTask("/now"))
+        self.assertEqual(self.scheduler.run_until(self.now), 1)
+        self.assertEqual(self.dispatched, ["/now"])
+        self.scheduler.advance(timedelta(hours=3))
+        self.assertEqual(self.dispatched, ["/now", "/early", "/late"])
+        self.assertEqual(self.scheduler.now, self.now + timedelta(hours=3))
+        self.assertEqual(self.scheduler.pending(), 0)
+
+    def test_task_with_same_name_added_once(self):
+        self.assertTrue(self.scheduler.add("default", ScheduledTask("/task", name="1-1")))
+        self.assertFalse(self.scheduler.add("default", ScheduledTask("/task", name="1-1")))
+        self.assertTrue(self.scheduler.add("other", ScheduledTask("/task", name="1-1")))
+        self.assertEqual(self.scheduler.pending(), 2)
+
+    def test_deleted_task_not_executed_and_name_reserved(self):
+        self.scheduler.add("default", ScheduledTask("/task", name="1-1", eta=self.now + timedelta(hours=1)))
+        self.scheduler.delete("default", "1-1")
+        self.assertFalse(self.scheduler.add("default", ScheduledTask("/task", name="1-1")))
+        self.scheduler.advance(timedelta(hours=2))
+        self.assertEqual(self.dispatched, [])
+
+    def test_failed_task_retried(self):
+        self.status_code = 500
+        self.scheduler.add("default", ScheduledTask("/task"))
+        self.scheduler.advance(timedelta(minutes=1))
+        self.assertEqual(len(self.dispatched), 3)
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["executed"], 0)
+        self.assertEqual(stats["failed"], 1)
+
+    def test_stats(self):
+        self.scheduler.add("default", ScheduledTask("/task", eta=self.now + timedelta(minutes=30)))
+        self.scheduler.advance(timedelta(hours=1))
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["executed"], 1)
+        self.assertEqual(stats["pending"], 0)
+        self.assertEqual(stats["lateness_p50"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -250,6 +250,46 @@ class TestReturnPostsEndpoint(unittest.TestCase):
         self.assertEqual(self.client.get('/event/1234/posts').status_code, 403)
 
 
+class TestImportEventsEndpoint(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        global app
+        app = create_app()
+        app.Testing = True
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer your_token'
+
+    def tearDown(self):
+        pass
+
+    def testUnauthorizedResponse(self):
+        # main
+        self.assertEqual(self.client.post('/event/import').status_code, 403)
+
+
+class TestEventSeriesEndpoints(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        global app
+        app = create_app()
+        app.Testing = True
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer your_token'
+
+    def tearDown(self):
+        pass
+
+    def testUnauthorizedResponse(self):
+        # main
+        self.assertEqual(self.client.post('/event/series').status_code, 403)
+        self.assertEqual(self.client.get('/event/series/1234').status_code, 403)
+        self.assertEqual(self.client.post('/event/series/1234/edit').status_code, 403)
+        self.assertEqual(self.client.delete('/event/series/1234').status_code, 403)
+
 
 if __name__ == '__main__':
     unittest.main()
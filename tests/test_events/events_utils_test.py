@@ -5,7 +5,8 @@ from datetime import datetime, timedelta
 from dateutil.parser import parse
 from google.appengine.ext import testbed
 
-from ewentts.events.utils import validate_start_datetime, validate_end_datetime, return_edited_event, create_event
+from ewentts.events.utils import validate_start_datetime, validate_end_datetime, return_edited_event, create_event, \
+    import_events, parse_csv_rows, parse_ndjson_rows, expand_recurrence, create_event_series
 
 sys.path.append('../')
 
@@ -23,6 +24,7 @@ class CreateEventTestCase(unittest.TestCase):
         self.testbed.setup_env(overwrite=True)
         self.testbed.init_datastore_v3_stub()
         self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub()
         self.user1 = User(user_names=["User", "Name"],
                           id="ab11",
                           profile_picture_url="https://c1.staticflickr.com/2/1520/24330829813_944c817720_b.jpg",
@@ -320,4 +322,115 @@ class ValidateEndDatetimeTest(unittest.TestCase):
         end_datetime = parse("2050-12-25 07:45:53")
 
         with self.assertRaises(ValueError):
-            validate_end_datetime(end_datetime, start_datetime)
\ No newline at end of file
+            validate_end_datetime(end_datetime, start_datetime)
+
+
+class ParseRowsTest(unittest.TestCase):
+    def test_parse_ndjson_rows(self):
+        lines = ['{"event_name": "Name", "private": false}\n', '\n', 'not json\n', '[1, 2]\n']
+        rows = list(parse_ndjson_rows(lines))
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0], (1, {"event_name": "Name", "private": False}))
+        self.assertEqual(rows[1][0], 3)
+        self.assertIsInstance(rows[1][1], ValueError)
+        self.assertIsInstance(rows[2][1], ValueError)
+
+    def test_parse_csv_rows(self):
+        lines = ["event_name,start_datetime,latitude,longitude,private,guest_list\n",
+                 "Name,2100-12-25T07:45:53 GMT,10.0,20.0,true,ab11 ab12\n",
+                 "Name,2100-12-25T07:45:53 GMT,north,20.0,false,\n"]
+        rows = list(parse_csv_rows(lines))
+
+        self.assertEqual(rows[0][0], 2)
+        self.assertEqual(rows[0][1]["location"], [10.0, 20.0])
+        self.assertEqual(rows[0][1]["private"], True)
+        self.assertEqual(rows[0][1]["guest_list"], ["ab11", "ab12"])
+        self.assertIsInstance(rows[1][1], ValueError)
+
+
+class ImportEventsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub()
+        self.user = User(user_names=["User", "Name"], id="ab11", user_email="email")
+        self.user.put()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_import_events(self):
+        body = {"event_name": "Name",
+                "start_datetime": "2100-12-25T07:45:53 GMT",
+                "location": [0.0, 0.0],
+                "private": False}
+        invalid_body = {"event_name": "Name",
+                        "start_datetime": "2000-12-25T07:45:53 GMT",
+                        "location": [0.0, 0.0],
+                        "private": False}
+        rows = [(1, body), (2, invalid_body), (3, ValueError("wrong format")), (4, body)]
+        created_keys, errors = import_events(rows, self.user.key.id())
+
+        self.assertEqual(len(created_keys), 2)
+        self.assertEqual([error["line"] for error in errors], [2, 3])
+        self.assertEqual(self.user.key.get().organised_events, created_keys)
+        self.assertEqual(created_keys[0].get().event_name, "Name")
+
+
+class ExpandRecurrenceTest(unittest.TestCase):
+    def test_expand_weekly_count(self):
+        starts = expand_recurrence(parse("2100-12-01T19:00:00"), {"frequency": "weekly", "count": 3})
+
+        self.assertEqual(starts, [parse("2100-12-01T19:00:00"), parse("2100-12-08T19:00:00"),
+                                  parse("2100-12-15T19:00:00")])
+
+    def test_expand_daily_until(self):
+        starts = expand_recurrence(parse("2100-12-01T19:00:00"),
+                                   {"frequency": "daily", "interval": 2, "until": "2100-12-06T00:00:00 UTC"})
+
+        self.assertEqual(len(starts), 3)
+
+    def test_invalid_recurrence_raises_error(self):
+        start_datetime = parse("2100-12-01T19:00:00")
+
+        with self.assertRaises(ValueError):
+            expand_recurrence(start_datetime, {"frequency": "yearly", "count": 3})
+        with self.assertRaises(ValueError):
+            expand_recurrence(start_datetime, {"frequency": "weekly"})
+        with self.assertRaises(ValueError):
+            expand_recurrence(start_datetime, {"frequency": "daily", "count": 1000})
+
+
+class CreateEventSeriesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub()
+        self.user = User(user_names=["User", "Name"], id="ab11", user_email="email")
+        self.user.put()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_create_event_series(self):
+        body = {"event_name": "Meetup",
+                "start_datetime": "2100-12-01T19:00:00 GMT",
+                "end_datetime": "2100-12-01T21:00:00 GMT",
+                "location": [0.0, 0.0],
+                "private": False,
+                "recurrence": {"frequency": "weekly", "count": 4}}
+        series = create_event_series(body, self.user.key.id())
+        events = [key.get() for key in series.occurrences]
+
+        self.assertEqual(len(events), 4)
+        self.assertEqual(events[1].start_datetime, parse("2100-12-08T19:00:00"))
+        self.assertEqual(events[1].end_datetime, parse("2100-12-08T21:00:00"))
+        self.assertEqual(events[3].series, series.key)
+        self.assertEqual(self.user.key.get().organised_events, series.occurrences)
@@ -0,0 +1,26 @@
+import unittest
+
+from ewentts import create_app
+
+
+class TestViewRemindersEndpoint(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        global app
+        app = create_app()
+        app.Testing = True
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer your_token'
+
+    def tearDown(self):
+        pass
+
+    def testUnauthorizedResponse(self):
+        # main
+        self.assertEqual(self.client.get('/event/1234/reminders').status_code, 403)
+
+    def testTasksOutsideOfTaskQueueForbidden(self):
+        self.assertEqual(self.client.post('/tasks/send_reminders').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/send_reminder_shard').status_code, 403)
@@ -0,0 +1,74 @@
+import unittest
+
+from dateutil.parser import parse
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from ewentts.models import Event, User, EventReminder
+from ewentts.reminders.sinks import set_sink
+from ewentts.reminders.utils import split_into_shards, start_reminder_fanout, deliver_reminder_shard
+from ewentts.utils import status_task_name
+
+
+class CollectingSink(object):
+    def __init__(self):
+        self.sent = []
+
+    def send(self, messages):
+        self.sent += messages
+
+
+class SplitIntoShardsTestCase(unittest.TestCase):
+    def test_split_into_shards(self):
+        self.assertEqual(split_into_shards(range(5), 2), [[0, 1], [2, 3], [4]])
+        self.assertEqual(split_into_shards([], 2), [])
+
+
+class ReminderFanoutTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub()
+        self.sink = CollectingSink()
+        set_sink(self.sink)
+        self.attendees = [User(id="user{}".format(i), user_names=["User", str(i)], user_email="email{}".format(i))
+                          for i in range(3)]
+        ndb.put_multi(self.attendees)
+        self.event = Event(event_name="Event Name",
+                           status="future",
+                           start_datetime=parse("2100-10-03T10:17:30"),
+                           end_datetime=parse("2100-10-04T10:17:30"),
+                           latitude=49.395470,
+                           longitude=15.590950,
+                           private=True,
+                           organiser=self.attendees[0].key,
+                           attendees=[user.key for user in self.attendees])
+        self.event.put()
+        self.reminder_id = status_task_name(self.event.key.id(), self.event.start_datetime)
+
+    def tearDown(self):
+        set_sink(None)
+        self.testbed.deactivate()
+
+    def test_fanout_creates_reminder_once(self):
+        start_reminder_fanout(self.event)
+        reminder = start_reminder_fanout(self.event)
+
+        self.assertEqual(reminder.recipients, 3)
+        self.assertEqual(reminder.shards, 1)
+        self.assertEqual(EventReminder.query().count(), 1)
+
+    def test_shard_delivered_once(self):
+        start_reminder_fanout(self.event)
+        user_ids = [user.key.id() for user in self.attendees]
+        self.assertEqual(deliver_reminder_shard(self.event, self.reminder_id, 0, user_ids), 3)
+        self.assertEqual(deliver_reminder_shard(self.event, self.reminder_id, 0, user_ids), 0)
+
+        self.assertEqual([message["user_id"] for message in self.sink.sent], user_ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
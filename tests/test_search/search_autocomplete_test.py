@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import unittest
+from datetime import datetime, timedelta
+
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from ewentts.models import Event, User
+from ewentts.search import autocomplete
+from ewentts.search.autocomplete import CompletionIndex, build_index, refresh_index, return_terms, get_index, \
+    set_index, REFRESH_INTERVAL
+
+
+class CompletionIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = CompletionIndex()
+        self.index.put(1, u"Jazz Night", 5)
+        self.index.put(2, u"Jazzy Brunch", 9)
+        self.index.put(3, u"Night Run", 1, expires=10)
+        self.index.put(4, u"Café Noir", 3)
+        self.index.compile()
+
+    def test_terms_are_word_suffixes(self):
+        self.assertEqual(return_terms(u"Jazz Night Club"), [u"jazz night club", u"night club", u"club"])
+
+    def test_complete_by_weight(self):
+        self.assertEqual([entry_id for entry_id, _, _ in self.index.complete("jaz", 5)], [2, 1])
+        self.assertEqual([entry_id for entry_id, _, _ in self.index.complete("jazz ", 5)], [1])
+        self.assertEqual([entry_id for entry_id, _, _ in self.index.complete("ni", 1)], [1])
+        self.assertEqual([entry_id for entry_id, _, _ in self.index.complete("cafe", 5)], [4])
+        self.assertEqual(self.index.complete("x", 5), [])
+
+    def test_expired_names_left_out(self):
+        self.assertEqual([entry_id for entry_id, _, _ in self.index.complete("ni", 5, 5)], [1, 3])
+        self.assertEqual([entry_id for entry_id, _, _ in self.index.complete("ni", 5, 20)], [1])
+
+    def test_overlay_before_compile(self):
+        self.index.put(5, u"Jazz Fest", 7)
+        self.index.put(1, u"Blues Night", 5)
+        self.index.remove(2)
+        self.assertEqual([entry_id for entry_id, _, _ in self.index.complete("jaz", 5)], [5])
+        self.index.compile()
+        self.assertEqual([entry_id for entry_id, _, _ in self.index.complete("jaz", 5)], [5])
+        self.assertEqual([entry_id for entry_id, _, _ in self.index.complete("blu", 5)], [1])
+
+    def test_compile_publishes_new_arrays(self):
+        compiled = self.index.compiled
+        terms = list(compiled[0])
+        self.index.put(5, u"Jazz Fest", 7)
+        self.index.compile()
+        self.assertIsNot(self.index.compiled, compiled)
+        self.assertEqual(compiled[0], terms)
+        self.assertEqual(compiled[5], {5: (u"Jazz Fest", 7, None)})
+        self.assertEqual(self.index.compiled[5], {})
+
+    def test_overflow(self):
+        index = CompletionIndex(max_entries=1)
+        self.assertTrue(index.put(1, u"Jazz", 0))
+        self.assertFalse(index.put(2, u"Blues", 0))
+        self.assertFalse(index.ready)
+
+
+class CompletionRefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.now = datetime.utcnow()
+        self.users = [User(user_names=["Jan", "Novak"], user_email="jan@example.com", id="ab11"),
+                      User(user_names=["Jana", "Dvorakova"], user_email="jana@example.com", id="ab12",
+                           followers=[ndb.Key(User, "ab11")])]
+        ndb.put_multi(self.users)
+
+    def tearDown(self):
+        set_index("user", None)
+        self.testbed.deactivate()
+
+    def test_build_and_refresh(self):
+        index = build_index("user", self.now)
+        self.assertEqual([entry_id for entry_id, _, _ in index.complete("jan", 5)], ["ab12", "ab11"])
+        index.since = self.now - timedelta(minutes=5)
+        self.users[0].user_names = ["Petr", "Novak"]
+        self.users[0].put()
+        self.assertTrue(refresh_index(index, "user", self.now))
+        self.assertEqual([entry_id for entry_id, _, _ in index.complete("jan", 5)], ["ab12"])
+        self.assertEqual([entry_id for entry_id, _, _ in index.complete("novak", 5)], ["ab11"])
+
+    def test_refresh_replaces_index(self):
+        index = get_index("user", self.now, wait=True)
+        self.users[0].user_names = ["Petr", "Novak"]
+        self.users[0].put()
+        refreshed = get_index("user", self.now + REFRESH_INTERVAL + timedelta(seconds=1), wait=True)
+        self.assertIsNot(refreshed, index)
+        self.assertEqual([entry_id for entry_id, _, _ in index.complete("jan", 5)], ["ab12", "ab11"])
+        self.assertEqual([entry_id for entry_id, _, _ in refreshed.complete("jan", 5)], ["ab12"])
+
+    def test_index_is_not_built_by_request(self):
+        self.assertIsNone(get_index("user", self.now))
+        with autocomplete._locks["user"]:
+            self.assertEqual(len(get_index("user", self.now, wait=True)), 2)
+
+    def test_only_public_events(self):
+        start = self.now + timedelta(days=1)
+        ndb.put_multi([Event(event_name="Jazz Night", status="future", start_datetime=start, end_datetime=start,
+                             latitude=49.395, longitude=15.590, private=private, organiser=ndb.Key(User, "ab11"))
+                       for private in (False, True)])
+        self.assertEqual(len(build_index("event", self.now).complete("jazz", 5)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from dateutil.parser import parse
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from ewentts.models import Event, User
+from ewentts.search.cache import cached_page, bump_generation, clear_local, return_cache_key
+from ewentts.search.utils import return_cache_params
+
+
+class SearchCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        clear_local()
+        self.events = [Event(event_name="Event {}".format(i), status="future",
+                             start_datetime=parse("2100-10-03T10:00:00"), latitude=49.395, longitude=15.590,
+                             private=False, organiser=ndb.Key(User, "ab11"))
+                       for i in range(3)]
+        ndb.put_multi(self.events)
+        self.computed = 0
+
+    def tearDown(self):
+        clear_local()
+        self.testbed.deactivate()
+
+    def compute(self):
+        self.computed += 1
+        return self.events[:2], "next", "plan"
+
+    def test_page_cached_and_hydrated(self):
+        self.assertEqual(cached_page("events", {"cursor": ""}, self.compute), (self.events[:2], "next", "plan"))
+        self.events[0].key.delete()
+        clear_local()
+        self.assertEqual(cached_page("events", {"cursor": ""}, self.compute), ([self.events[1]], "next", "plan"))
+        self.assertEqual(self.computed, 1)
+
+    def test_bump_generation_invalidates(self):
+        cached_page("events", {"cursor": ""}, self.compute)
+        bump_generation()
+        cached_page("events", {"cursor": ""}, self.compute)
+        self.assertEqual(self.computed, 2)
+
+    def test_not_cached_without_params(self):
+        cached_page("events", None, self.compute)
+        cached_page("events", None, self.compute)
+        self.assertEqual(self.computed, 2)
+
+    def test_params_normalised(self):
+        first = return_cache_params({"event_name": u"Jazz  Night", "latitude": "49.39521", "longitude": "15.59049",
+                                     "day": "2100-10-03"}, 10)
+        second = return_cache_params({"event_name": "jazz night", "latitude": "49.3951", "longitude": "15.5904",
+                                      "day": "2100-10-03", "location_range": "10"}, 10)
+        self.assertEqual(return_cache_key("events", first), return_cache_key("events", second))
+        self.assertIsNone(return_cache_params({"latitude": "north", "longitude": "15.59"}, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from datetime import datetime, timedelta
+
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from ewentts.models import Event, User
+from ewentts.search import grid as grid_module
+from ewentts.search.grid import SpatialGrid, build_grid, refresh_grid, find_nearest_upcoming, set_grid, get_grid, \
+    REFRESH_INTERVAL, REBUILD_INTERVAL
+
+
+class SpatialGridTest(unittest.TestCase):
+    def setUp(self):
+        self.grid = SpatialGrid()
+        self.grid.put(1, 49.395, 15.590, 100)
+        self.grid.put(2, 49.400, 15.600, 200)
+        self.grid.put(3, 50.080, 14.430, 100)
+        self.grid.put(4, 0.0, 179.99, 100)
+
+    def test_search_in_range_and_time_window(self):
+        self.assertEqual([event_id for _, event_id in self.grid.search((49.395, 15.590), 5, 0)], [1, 2])
+        self.assertEqual([event_id for _, event_id in self.grid.search((49.395, 15.590), 5, 150)], [2])
+        self.assertEqual([event_id for _, event_id in self.grid.search((0.0, -179.99), 5, 0)], [4])
+
+    def test_nearest_grows_radius(self):
+        self.assertEqual([event_id for _, event_id in self.grid.nearest((49.395, 15.590), 3, 0)], [1, 2, 3])
+        self.assertEqual(len(self.grid.nearest((-89.0, 0.0), 10, 0)), 4)
+
+    def test_remove_and_reuse_slot(self):
+        self.grid.remove(1)
+        self.grid.put(5, 49.395, 15.590, 100)
+        self.assertEqual(len(self.grid), 4)
+        self.assertEqual(len(self.grid.event_ids), 4)
+        self.assertEqual([event_id for _, event_id in self.grid.search((49.395, 15.590), 0.5, 0)], [5])
+        self.grid.remove_started(150)
+        self.assertEqual(list(self.grid.slots), [2])
+
+    def test_overflow(self):
+        grid = SpatialGrid(max_events=1)
+        self.assertTrue(grid.put(1, 49.395, 15.590, 100))
+        self.assertFalse(grid.put(2, 49.395, 15.590, 100))
+        self.assertFalse(grid.ready)
+
+
+class GridRefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.now = datetime.utcnow()
+        self.events = [Event(event_name="Event", status="future", start_datetime=self.now + timedelta(days=1),
+                             latitude=49.395 + i / 100.0, longitude=15.590, private=i == 2,
+                             organiser=ndb.Key(User, "ab11"))
+                       for i in range(3)]
+        ndb.put_multi(self.events)
+
+    def tearDown(self):
+        set_grid(None)
+        self.testbed.deactivate()
+
+    def test_build_and_refresh(self):
+        grid = build_grid(self.now)
+        self.assertEqual(sorted(grid.slots), sorted(event.key.id() for event in self.events[:2]))
+        grid.since = self.now - timedelta(minutes=5)
+        self.events[0].private = True
+        self.events[2].private = False
+        ndb.put_multi([self.events[0], self.events[2]])
+        self.assertTrue(refresh_grid(grid, self.now))
+        self.assertEqual(sorted(grid.slots), sorted(event.key.id() for event in self.events[1:]))
+
+    def test_find_nearest_upcoming_checks_events(self):
+        set_grid(build_grid(self.now))
+        self.assertEqual([event.key for _, event in find_nearest_upcoming((49.395, 15.590), 3, self.now)],
+                         [event.key for event in self.events[:2]])
+        self.events[0].key.delete()
+        self.assertEqual([event.key for _, event in find_nearest_upcoming((49.395, 15.590), 3, self.now)],
+                         [self.events[1].key])
+
+
+class GetGridTest(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.now = datetime.utcnow()
+        Event(event_name="Event", status="future", start_datetime=self.now + timedelta(days=1),
+              latitude=49.395, longitude=15.590, private=False, organiser=ndb.Key(User, "ab11")).put()
+
+    def tearDown(self):
+        set_grid(None)
+        self.testbed.deactivate()
+
+    def test_refresh_replaces_grid(self):
+        grid = get_grid(self.now, wait=True)
+        self.assertEqual(len(grid), 1)
+        refreshed = get_grid(self.now + REFRESH_INTERVAL + timedelta(seconds=1), wait=True)
+        self.assertIsNot(refreshed, grid)
+        self.assertEqual(len(grid), 1)
+
+    def test_grid_is_not_built_by_request(self):
+        self.assertIsNone(get_grid(self.now))
+        with grid_module._lock:
+            self.assertEqual(len(get_grid(self.now, wait=True)), 1)
+
+    def test_grid_which_is_not_ready_is_rebuilt(self):
+        grid = SpatialGrid(max_events=0)
+        grid.ready = False
+        grid.refreshed = self.now
+        set_grid(grid)
+        self.assertIsNone(get_grid(self.now + REFRESH_INTERVAL + timedelta(seconds=1), wait=True))
+        self.assertEqual(len(get_grid(self.now + REBUILD_INTERVAL + timedelta(seconds=1), wait=True)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from dateutil.parser import parse
+from flask import Flask, g
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from ewentts.models import Event, User
+from ewentts.search.index import InMemoryBackend, IndexQuery, return_event_document, set_backend
+from ewentts.tasks.utils import index_events
+
+
+class InMemoryBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        organiser_key = ndb.Key(User, "ab11")
+        self.jazz = Event(event_name="Summer Jazz Night", description="Live music", status="future",
+                          start_datetime=parse("2100-10-03T20:00:00"), end_datetime=parse("2100-10-03T23:00:00"),
+                          latitude=49.0, longitude=15.0, private=False, organiser=organiser_key)
+        self.party = Event(event_name="Summer Party", description="", status="future",
+                           start_datetime=parse("2100-10-02T20:00:00"), end_datetime=parse("2100-10-02T23:00:00"),
+                           latitude=50.0, longitude=15.0, private=True, organiser=organiser_key)
+        ndb.put_multi([self.jazz, self.party])
+        self.backend = InMemoryBackend()
+        set_backend(self.backend)
+
+    def tearDown(self):
+        set_backend(None)
+        self.testbed.deactivate()
+
+    def test_search_by_tokens_and_filters(self):
+        self.backend.put([return_event_document(self.jazz), return_event_document(self.party)])
+        doc_ids, cursor = self.backend.search(IndexQuery(tokens=["summ"]), 10)
+        self.assertEqual(doc_ids, [str(self.party.key.id()), str(self.jazz.key.id())])
+        self.assertEqual(cursor, None)
+        doc_ids, cursor = self.backend.search(IndexQuery(tokens=["mus"]), 10)
+        self.assertEqual(doc_ids, [str(self.jazz.key.id())])
+        doc_ids, cursor = self.backend.search(IndexQuery(tokens=["summer"], private=False), 10)
+        self.assertEqual(doc_ids, [str(self.jazz.key.id())])
+        doc_ids, cursor = self.backend.search(IndexQuery(point=(49.01, 15.0), radius=5000), 10)
+        self.assertEqual(doc_ids, [str(self.jazz.key.id())])
+
+    def test_pagination(self):
+        self.backend.put([return_event_document(self.jazz), return_event_document(self.party)])
+        doc_ids, cursor = self.backend.search(IndexQuery(), 1)
+        self.assertEqual(doc_ids, [str(self.party.key.id())])
+        doc_ids, cursor = self.backend.search(IndexQuery(), 1, cursor)
+        self.assertEqual(doc_ids, [str(self.jazz.key.id())])
+        self.assertEqual(cursor, None)
+
+    def test_index_events_puts_and_deletes(self):
+        index_events([self.jazz.key.id(), self.party.key.id()])
+        self.party.key.delete()
+        indexed, deleted = index_events([self.party.key.id()])
+
+        self.assertEqual((indexed, deleted), (0, 1))
+        self.assertEqual(list(self.backend.documents), [str(self.jazz.key.id())])
+
+    def test_writes_marked_in_request(self):
+        with Flask(__name__).test_request_context("/"):
+            self.jazz.put()
+            self.party.key.delete()
+            self.assertEqual(g.index_pending, {self.jazz.key.id(), self.party.key.id()})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from datetime import timedelta
+
+from dateutil.parser import parse
+from flask import Flask
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from ewentts.models import Event, User
+from ewentts.search.planner import Predicate, choose_plan, run_plan, CURSOR_SEPARATOR
+from ewentts.search.utils import perform_planned_events_search
+
+
+class PlannerTest(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.events = []
+        for i in range(10):
+            start_datetime = parse("2100-10-03T10:00:00") + timedelta(days=i % 2)
+            self.events += [Event(event_name="Jazz Night" if i < 8 else "Jazz Party", status="future",
+                                  start_datetime=start_datetime, end_datetime=start_datetime + timedelta(hours=2),
+                                  latitude=49.395, longitude=15.590, private=False,
+                                  organiser=ndb.Key(User, "ab11"))]
+        ndb.put_multi(self.events)
+        self.jazz = Predicate("name:jazz", Event.name_tokens, ["jazz"], lambda event: "jazz" in event.name_tokens)
+        self.party = Predicate("name:party", Event.name_tokens, ["party"], lambda event: "party" in event.name_tokens)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_most_selective_predicate_scanned(self):
+        plan = choose_plan([self.jazz, self.party])
+        self.assertEqual(plan.scan, self.party)
+        self.assertEqual(plan.residual, [self.jazz])
+        self.assertEqual(plan.estimates, {"name:jazz": 10, "name:party": 2})
+        self.assertEqual(plan.describe(), "scan=name:party(2); filter=name:jazz(10)")
+
+    def test_estimates_cached(self):
+        choose_plan([self.jazz])
+        self.assertEqual(memcache.get("search-estimate:name_tokens=jazz"), 10)
+
+    def test_cursor_keeps_scanned_predicate(self):
+        day = Predicate("day", Event.local_days, ["2100-10-03"], lambda event: "2100-10-03" in event.local_days)
+        events, next_page, plan = run_plan(Event.query(), [self.jazz, day], 3)
+        self.assertEqual(len(events), 3)
+        self.assertTrue(next_page.startswith("day" + CURSOR_SEPARATOR))
+        memcache.flush_all()
+        ndb.put_multi([Event(event_name="Other", status="future", start_datetime=parse("2100-10-03T12:00:00"),
+                             latitude=49.395, longitude=15.590, private=False, organiser=ndb.Key(User, "ab11"))
+                       for _ in range(10)])
+        self.assertEqual(choose_plan([self.jazz, day]).scan, self.jazz)
+        more, next_page, plan = run_plan(Event.query(), [self.jazz, day], 3, next_page)
+        self.assertEqual(plan.scan, day)
+        self.assertEqual(len(more), 2)
+        self.assertFalse(next_page)
+        self.assertEqual(sorted(event.key for event in events + more),
+                         sorted(event.key for event in self.events[::2]))
+
+    def test_planned_search_with_location_and_day(self):
+        app = Flask(__name__)
+        with app.test_request_context("/search/events/?day=2100-10-04&location_range=5"):
+            events, next_page, plan = perform_planned_events_search(Event.query(), "jazz par", (49.395, 15.590),
+                                                                    {"day": "2100-10-04"}, 10)
+        self.assertEqual([event.key for event in events], [self.events[9].key])
+        self.assertIn("location", plan.describe())
+
+
+if __name__ == "__main__":
+    unittest.main()
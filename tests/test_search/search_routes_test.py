@@ -58,3 +58,6 @@ class TestSearchEventEndpoint(unittest.TestCase):
     def testUnauthorizedResponse(self):
         # main
         self.assertEqual(self.client.get('/search/events/').status_code, 403)
+        self.assertEqual(self.client.get('/search/events/nearest').status_code, 403)
+        self.assertEqual(self.client.get('/search/events/tiles').status_code, 403)
+        self.assertEqual(self.client.get('/search/autocomplete').status_code, 403)
@@ -0,0 +1,73 @@
+import unittest
+from datetime import datetime
+
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from ewentts.models import Event, EventTile, User
+from ewentts.search.tiles import update_tiles, read_tiles, viewport_cells, viewport_precision, zoom_precision
+
+CZECHIA = {"minlatitude": 48.5, "minlongitude": 12.0, "maxlatitude": 51.1, "maxlongitude": 18.9}
+
+
+class ViewportTest(unittest.TestCase):
+    def test_precision_follows_zoom_and_size_of_viewport(self):
+        self.assertEqual(zoom_precision(0), 1)
+        self.assertEqual(zoom_precision(20), 6)
+        self.assertEqual(viewport_precision(7, CZECHIA), 4)
+        self.assertEqual(viewport_precision(14, CZECHIA), 4)
+        self.assertLessEqual(len(viewport_cells(CZECHIA, 4)), 512)
+
+    def test_cells_across_antimeridian(self):
+        box = {"minlatitude": -1, "minlongitude": 179.5, "maxlatitude": 1, "maxlongitude": -179.5}
+        self.assertEqual(sorted(cell for cell, _ in viewport_cells(box, 3)), ["2pb", "800", "rzz", "xbp"])
+
+
+class TileCountTest(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        # cross-group transactions need high replication datastore
+        policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1)
+        self.testbed.init_datastore_v3_stub(consistency_policy=policy)
+        self.testbed.init_memcache_stub()
+        ndb.get_context().clear_cache()
+        start = datetime(2026, 10, 18, 18)
+        self.events = [Event(event_name="Event", status="future", start_datetime=start, end_datetime=start,
+                             latitude=49.395 + i / 100.0, longitude=15.590, private=i == 2,
+                             organiser=ndb.Key(User, "ab11"))
+                       for i in range(3)]
+        ndb.put_multi(self.events)
+        self.event_ids = [event.key.id() for event in self.events]
+        self.cells = viewport_cells(CZECHIA, 3)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_public_events_counted_once(self):
+        self.assertEqual(update_tiles(self.event_ids)[0], 2)
+        self.assertEqual(update_tiles(self.event_ids), (0, 0))
+        tiles = read_tiles(self.cells, ["2026-10-18"])
+        self.assertEqual([(tile["cell"], tile["count"]) for tile in tiles], [("u2g", 2)])
+        self.assertIn(tiles[0]["representative"], self.event_ids[:2])
+        self.assertEqual(read_tiles(self.cells, ["2026-10-19"]), [])
+
+    def test_edit_and_delete_move_counts(self):
+        update_tiles(self.event_ids)
+        self.events[0].start_datetime = self.events[0].end_datetime = datetime(2026, 11, 2, 18)
+        self.events[0].put()
+        self.events[1].key.delete()
+        self.events[2].private = False
+        self.events[2].put()
+        update_tiles(self.event_ids)
+        self.assertEqual([tile["count"] for tile in read_tiles(self.cells, ["2026-10-18"])], [1])
+        self.assertEqual([tile["representative"] for tile in read_tiles(self.cells, ["2026-10-18"])],
+                         [self.event_ids[2]])
+        self.assertEqual([tile["count"] for tile in read_tiles(self.cells, ["2026-10-31", "2026-11-02"])], [1])
+        self.assertIsNone(ndb.Key(EventTile, self.event_ids[1]).get())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,23 +1,167 @@
+# -*- coding: utf-8 -*-
 import unittest
+from datetime import timedelta
 
-from ewentts.search.utils import return_next_name
-from ewentts.utils import BadRequestError
+from dateutil.parser import parse
+from flask import Flask
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
 
+from ewentts.models import User, Event
+from ewentts.search import utils as search_utils
+from ewentts.search.utils import perform_name_query, perform_users_search, \
+    perform_events_search_by_name, find_nearest_events, perform_nearest_search
 
-class TestReturnNextName(unittest.TestCase):
-    def test_return_next_name(self):
-        self.assertEqual(return_next_name("Name"), "Namf")
-        self.assertEqual(return_next_name("Namz"), "Nana")
-        self.assertEqual(return_next_name("Zzzz"), None)
-        self.assertEqual(return_next_name("N"), "O")
 
-    def test_fails_with_none(self):
-        with self.assertRaises(BadRequestError):
-            return_next_name(None)
+class TestPerformNameQuery(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.mcdonald = User(id="ab11", user_names=["Ronald", "McDonald"], user_email="email")
+        self.dvorak = User(id="ab12", user_names=[u"Antonín", u"Dvořák"], user_email="email")
+        ndb.put_multi([self.mcdonald, self.dvorak])
 
-    def test_fails_with_int(self):
-        with self.assertRaises(BadRequestError):
-            return_next_name(1)
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_search_tokens_computed(self):
+        self.assertIn(u"mcdonald", self.mcdonald.key.get().search_tokens)
+        self.assertIn(u"dvor", self.dvorak.key.get().search_tokens)
+
+    def test_prefix_search_is_case_and_accent_insensitive(self):
+        self.assertEqual(perform_name_query(User.query(), "mcdon").fetch(), [self.mcdonald])
+        self.assertEqual(perform_name_query(User.query(), "DVORAK").fetch(), [self.dvorak])
+        self.assertEqual(perform_name_query(User.query(), "ant dvo").fetch(), [self.dvorak])
+        self.assertEqual(perform_name_query(User.query(), "bob").fetch(), [])
+
+    def test_fails_without_letters(self):
+        with self.assertRaises(Exception):
+            perform_name_query(User.query(), "--")
+
+
+class TestPerformUsersSearch(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.users = [User(id="user{}".format(i), user_names=["John", "Smith{}".format(i)], user_email="email")
+                      for i in range(5)]
+        self.other = User(id="other", user_names=["John", "Doe"], user_email="email")
+        ndb.put_multi(self.users + [self.other])
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_two_names_paginated(self):
+        app = Flask(__name__)
+        with app.test_request_context("/search/user"):
+            users, next_page = perform_users_search("john", "smith", 3)
+        self.assertEqual(users, self.users[:3])
+        self.assertTrue(next_page)
+        with app.test_request_context("/search/user?cursor={}".format(next_page)):
+            users, next_page = perform_users_search("john", "smith", 3)
+        self.assertEqual(users, self.users[3:])
+        self.assertFalse(next_page)
+
+
+class TestPerformEventsSearchByName(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        names = [u"Summer Jazz Night", u"Jazz Café Evening", u"Summer Party"]
+        self.events = [Event(event_name=name, status="future",
+                             start_datetime=parse("2100-10-03T10:00:00"), end_datetime=parse("2100-10-03T20:00:00"),
+                             latitude=0.0, longitude=0.0, private=False, organiser=ndb.Key(User, "ab11"))
+                       for name in names]
+        ndb.put_multi(self.events)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_multiple_terms(self):
+        app = Flask(__name__)
+        with app.test_request_context("/search/events/names/"):
+            events, next_page = perform_events_search_by_name("summer jaz", None, 10)
+            self.assertEqual(events, [self.events[0]])
+            events, next_page = perform_events_search_by_name("jazz", "cafe", 10)
+            self.assertEqual(events, [self.events[1]])
+            events, next_page = perform_events_search_by_name("summ", None, 1)
+            self.assertEqual(len(events), 1)
+            self.assertTrue(next_page)
+
+
+class TestFindNearestEvents(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        locations = [(49.5, 15.59), (49.3951, 15.5901), (49.42, 15.56), (50.08, 14.43)]
+        self.events = [Event(event_name="Event", status="future",
+                             start_datetime=parse("2100-10-0{}T10:00:00".format(i + 1)),
+                             end_datetime=parse("2100-10-0{}T20:00:00".format(i + 1)),
+                             latitude=latitude, longitude=longitude, private=i == 2,
+                             organiser=ndb.Key(User, "ab11"))
+                       for i, (latitude, longitude) in enumerate(locations)]
+        ndb.put_multi(self.events)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_nearest_ordered_by_distance(self):
+        nearest = find_nearest_events(Event.query(), (49.395, 15.590), 3, lambda event: True)
+        self.assertEqual([event.key for _, event in nearest], [self.events[1].key, self.events[2].key,
+                                                                self.events[0].key])
+        self.assertTrue(nearest[0][0] < nearest[1][0] < nearest[2][0])
+
+    def test_nearest_fetches_whole_ring(self):
+        page_size = search_utils.NEAREST_MAX_CANDIDATES
+        search_utils.NEAREST_MAX_CANDIDATES = 1
+        try:
+            nearest = find_nearest_events(Event.query(), (49.395, 15.590), 3, lambda event: True)
+        finally:
+            search_utils.NEAREST_MAX_CANDIDATES = page_size
+        self.assertEqual([event.key for _, event in nearest], [self.events[1].key, self.events[2].key,
+                                                                self.events[0].key])
+
+    def test_nearest_with_filters(self):
+        query = Event.query(Event.private == False)
+        nearest = find_nearest_events(query, (49.395, 15.590), 2,
+                                      lambda event: event.start_datetime > parse("2100-10-01T12:00:00"))
+        self.assertEqual([event.key for _, event in nearest], [self.events[1].key, self.events[3].key])
+
+
+class TestPerformNearestSearch(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        starts = ["2000-10-01T10:00:00", "2000-10-02T10:00:00", "2100-10-01T10:00:00"]
+        locations = [(49.3951, 15.5901), (49.3952, 15.5902), (50.08, 14.43)]
+        self.events = [Event(event_name="Event", status="future", start_datetime=parse(start),
+                             end_datetime=parse(start) + timedelta(hours=1), latitude=latitude, longitude=longitude,
+                             private=False, organiser=ndb.Key(User, "ab11"))
+                       for start, (latitude, longitude) in zip(starts, locations)]
+        ndb.put_multi(self.events)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_upcoming_events_not_crowded_out_by_past_ones(self):
+        nearest = perform_nearest_search({"latitude": "49.395", "longitude": "15.590", "k": "1",
+                                          "upcoming": "true"})
+        self.assertEqual([event.key for _, event in nearest], [self.events[2].key])
 
 
 if __name__ == "__main__":
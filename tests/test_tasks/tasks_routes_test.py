@@ -0,0 +1,52 @@
+import unittest
+
+from ewentts import create_app
+
+
+class TestViewJobEndpoint(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        global app
+        app = create_app()
+        app.Testing = True
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer your_token'
+
+    def tearDown(self):
+        pass
+
+    def testUnauthorizedResponse(self):
+        # main
+        self.assertEqual(self.client.get('/job/1234').status_code, 403)
+
+
+class TestTaskEndpoints(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        global app
+        app = create_app()
+        app.Testing = True
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def tearDown(self):
+        pass
+
+    def testRequestOutsideOfTaskQueueForbidden(self):
+        self.assertEqual(self.client.post('/tasks/cleanup_event', data={"event_id": 1234}).status_code, 403)
+        self.assertEqual(self.client.post('/tasks/weekly_check').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/sweep_event_status').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/backfill_search_tokens').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/rebuild_event_index').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/cleanup_user').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/event_created').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/index_events').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/update_tiles').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/fan_out_events').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/cleanup_timeline').status_code, 403)
+        self.assertEqual(self.client.post('/tasks/create_change_status_for_next_week').status_code, 403)
+        self.assertEqual(self.client.get('/tasks/change_status_to_present?event_id=1234').status_code, 403)
+        self.assertEqual(self.client.get('/tasks/change_status_to_past?event_id=1234').status_code, 403)
@@ -0,0 +1,325 @@
+import unittest
+
+from dateutil.parser import parse
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from ewentts.models import Event, User, DeletedUser, Job, TimelineEntry
+from ewentts.tasks.utils import fetch_chunk, remove_key_from_chunk, query_users_with_event, EVENT_LIST_PROPERTIES, \
+    archive_user, return_job, update_job, return_chunk_id, query_entities_with_key, apply_event_side_effects, \
+    sweep_status_chunk, clean_key_lists, check_chunk, fan_out_chunk, delete_timeline_chunk, add_organised_events
+
+
+class FetchChunkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        ndb.put_multi([User(id="user{}".format(i), user_names=["User", str(i)], user_email="email")
+                       for i in range(5)])
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_fetch_all_chunks(self):
+        query = User.query().order(User.key)
+        users, cursor = fetch_chunk(query, chunk_size=2)
+        self.assertEqual(len(users), 2)
+        self.assertTrue(cursor)
+        users, cursor = fetch_chunk(query, cursor, chunk_size=2)
+        self.assertEqual(len(users), 2)
+        users, cursor = fetch_chunk(query, cursor, chunk_size=2)
+        self.assertEqual(len(users), 1)
+        self.assertEqual(cursor, None)
+
+
+class RemoveKeyFromChunkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.organiser = User(id="ab11", user_names=["User", "Name"], user_email="email")
+        self.organiser.put()
+        self.event = Event(event_name="Event Name",
+                           status="future",
+                           start_datetime=parse("2100-10-03T10:17:30"),
+                           end_datetime=parse("2100-10-04T10:17:30"),
+                           latitude=49.395470,
+                           longitude=15.590950,
+                           private=True,
+                           organiser=self.organiser.key)
+        self.event.put()
+        self.other_event_key = ndb.Key(Event, 1)
+        self.organiser.organised_events = [self.event.key, self.other_event_key]
+        self.organiser.put()
+        self.attendee = User(id="ab12", user_names=["Other", "Name"], user_email="email",
+                             attending_events=[self.event.key], visited_events=[self.event.key])
+        self.attendee.put()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_remove_event_from_users(self):
+        query = query_users_with_event(self.event.key)
+        edited, cursor = remove_key_from_chunk(query, EVENT_LIST_PROPERTIES, self.event.key)
+
+        self.assertEqual(edited, 2)
+        self.assertEqual(cursor, None)
+        self.assertEqual(self.organiser.key.get().organised_events, [self.other_event_key])
+        self.assertEqual(self.attendee.key.get().attending_events, [])
+        self.assertEqual(self.attendee.key.get().visited_events, [])
+
+
+class UserCleanupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.user = User(id="ab11", user_names=["User", "Name"], user_email="email")
+        self.follower = User(id="ab12", user_names=["Other", "Name"], user_email="email",
+                             following=[self.user.key])
+        self.user.followers = [self.follower.key]
+        ndb.put_multi([self.user, self.follower])
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_archive_user(self):
+        deleted_user = archive_user(self.user)
+
+        self.assertEqual(deleted_user.key, ndb.Key(DeletedUser, "ab11"))
+        self.assertEqual(deleted_user.key.get().followers, [self.follower.key])
+
+    def test_remove_user_from_followers(self):
+        query = query_entities_with_key(User, ["followers", "following"], self.user.key)
+        edited, cursor = remove_key_from_chunk(query, ["followers", "following"], self.user.key)
+
+        self.assertEqual(edited, 1)
+        self.assertEqual(self.follower.key.get().following, [])
+
+    def test_update_job(self):
+        job = Job(job_type="cleanup_user", target="ab11")
+        job.put()
+        update_job(job.key.id(), 5)
+        job = update_job(job.key.id(), 3, stage="Event", finished=True)
+
+        self.assertEqual(job.processed, 8)
+        self.assertEqual(job.stage, "Event")
+        self.assertTrue(job.finished)
+        self.assertTrue(job.finished_datetime)
+
+    def test_job_viewed_only_by_owner(self):
+        job = Job(job_type="cleanup_user", target="ab11", owner="ab11")
+        job.put()
+
+        self.assertEqual(return_job(job.key.id(), "ab11").key, job.key)
+        with self.assertRaises(Exception):
+            return_job(job.key.id(), "ab12")
+
+    def test_update_job_skips_repeated_chunk(self):
+        job = Job(job_type="cleanup_user", target="ab11")
+        job.put()
+        update_job(job.key.id(), 5, return_chunk_id(0))
+        update_job(job.key.id(), 5, return_chunk_id(0))
+        job = update_job(job.key.id(), 3, return_chunk_id(0, "cursor"))
+
+        self.assertEqual(job.processed, 8)
+
+
+class ApplyEventSideEffectsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub()
+        self.organiser = User(id="ab11", user_names=["User", "Name"], user_email="email")
+        self.organiser.put()
+        self.event = Event(event_name="Event Name",
+                           status="future",
+                           start_datetime=parse("2100-10-03T10:17:30"),
+                           end_datetime=parse("2100-10-04T10:17:30"),
+                           latitude=49.395470,
+                           longitude=15.590950,
+                           private=True,
+                           organiser=self.organiser.key)
+        self.event.put()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_side_effects_applied_once(self):
+        apply_event_side_effects(self.event)
+        apply_event_side_effects(self.event)
+
+        self.assertEqual(self.organiser.key.get().organised_events, [self.event.key])
+
+    def test_organised_events_added_to_current_user(self):
+        organiser = self.organiser.key.get()
+        organiser.following = [ndb.Key(User, "ab12")]
+        organiser.organised_events = [self.event.key]
+        organiser.put()
+        add_organised_events(self.organiser.key, [self.event.key, ndb.Key(Event, 2)])
+
+        organiser = self.organiser.key.get()
+        self.assertEqual(organiser.following, [ndb.Key(User, "ab12")])
+        self.assertEqual(organiser.organised_events, [self.event.key, ndb.Key(Event, 2)])
+
+
+class SweepStatusChunkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        organiser_key = ndb.Key(User, "ab11")
+        self.started = Event(event_name="Started", status="future",
+                             start_datetime=parse("2100-10-03T10:00:00"), end_datetime=parse("2100-10-03T20:00:00"),
+                             latitude=0.0, longitude=0.0, private=False, organiser=organiser_key)
+        self.finished = Event(event_name="Finished", status="future",
+                              start_datetime=parse("2100-10-02T10:00:00"), end_datetime=parse("2100-10-02T20:00:00"),
+                              latitude=0.0, longitude=0.0, private=False, organiser=organiser_key)
+        self.upcoming = Event(event_name="Upcoming", status="future",
+                              start_datetime=parse("2100-10-05T10:00:00"), end_datetime=parse("2100-10-05T20:00:00"),
+                              latitude=0.0, longitude=0.0, private=False, organiser=organiser_key)
+        ndb.put_multi([self.started, self.finished, self.upcoming])
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_sweep_future_events(self):
+        edited, cursor = sweep_status_chunk("future", parse("2100-10-03T12:00:00"))
+
+        self.assertEqual(edited, 2)
+        self.assertEqual(cursor, None)
+        self.assertEqual(self.started.key.get().status, "present")
+        self.assertEqual(self.finished.key.get().status, "past")
+        self.assertEqual(self.upcoming.key.get().status, "future")
+
+    def test_sweep_present_events(self):
+        sweep_status_chunk("future", parse("2100-10-03T12:00:00"))
+        edited, cursor = sweep_status_chunk("present", parse("2100-10-04T12:00:00"))
+
+        self.assertEqual(edited, 1)
+        self.assertEqual(self.started.key.get().status, "past")
+
+
+class WeeklyCheckTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.testbed.init_taskqueue_stub()
+        self.organiser = User(id="ab11", user_names=["User", "Name"], user_email="email")
+        self.organiser.put()
+        self.follower = User(id="ab12", user_names=["Other", "Name"], user_email="email")
+        self.follower.put()
+        self.event = Event(event_name="Event Name",
+                           status="future",
+                           start_datetime=parse("2100-10-03T10:17:30"),
+                           end_datetime=parse("2100-10-04T10:17:30"),
+                           latitude=49.395470,
+                           longitude=15.590950,
+                           private=True,
+                           organiser=self.organiser.key)
+        self.event.put()
+        self.deleted_event_key = ndb.Key(Event, 1)
+        self.organiser.followers = [self.follower.key, self.follower.key]
+        self.organiser.organised_events = [self.event.key, self.deleted_event_key]
+        self.organiser.put()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_clean_key_lists(self):
+        edited, counts = clean_key_lists([self.organiser, self.follower], ["followers", "organised_events"])
+
+        self.assertEqual(edited, 1)
+        self.assertEqual(counts, {"dangling_keys": 1, "duplicates": 1})
+        self.assertEqual(self.organiser.key.get().followers, [self.follower.key])
+        self.assertEqual(self.organiser.key.get().organised_events, [self.event.key])
+
+    def test_clean_key_lists_keeps_keys_added_since_check(self):
+        organiser = self.organiser.key.get()
+        organiser.organised_events += [ndb.Key(Event, 2)]
+        organiser.put()
+        clean_key_lists([self.organiser], ["organised_events"])
+
+        self.assertEqual(self.organiser.key.get().organised_events, [self.event.key, ndb.Key(Event, 2)])
+
+    def test_check_users_chunk(self):
+        checked, counts, cursor = check_chunk(0, parse("2100-10-01T10:00:00"))
+
+        self.assertEqual(checked, 2)
+        self.assertEqual(cursor, None)
+        self.assertEqual(counts["edited_entities"], 1)
+        self.assertEqual(self.organiser.key.get().organised_events, [self.event.key])
+
+    def test_check_events_chunk_reschedules_status_tasks(self):
+        checked, counts, cursor = check_chunk(1, parse("2100-10-01T10:00:00"))
+
+        self.assertEqual(checked, 1)
+        self.assertEqual(counts["status_tasks"], 1)
+
+    def test_update_job_summary(self):
+        job = Job(job_type="weekly_check", summary={})
+        job.put()
+        update_job(job.key.id(), 2, counts={"duplicates": 1})
+        update_job(job.key.id(), 3, counts={"duplicates": 2, "dangling_keys": 1}, finished=True)
+
+        job = job.key.get()
+        self.assertEqual(job.processed, 5)
+        self.assertEqual(job.summary, {"duplicates": 3, "dangling_keys": 1})
+        self.assertTrue(job.finished)
+
+
+class FanOutTestCase(unittest.TestCase):
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        self.testbed.setup_env(overwrite=True)
+        self.testbed.init_datastore_v3_stub()
+        self.testbed.init_memcache_stub()
+        self.organiser = User(id="ab11", user_names=["User", "Name"], user_email="email")
+        self.followers = [User(id="ab1{}".format(i), user_names=["Follower"], user_email="email",
+                               following=[self.organiser.key]) for i in range(2, 5)]
+        ndb.put_multi([self.organiser] + self.followers)
+        self.events = [Event(event_name="Event Name",
+                             status="future",
+                             start_datetime=parse("2100-10-0{}T10:17:30".format(i + 1)),
+                             end_datetime=parse("2100-10-0{}T12:17:30".format(i + 1)),
+                             latitude=49.395470,
+                             longitude=15.590950,
+                             private=i == 2,
+                             organiser=self.organiser.key) for i in range(3)]
+        ndb.put_multi(self.events)
+
+    def tearDown(self):
+        self.testbed.deactivate()
+
+    def test_public_events_fanned_out_once(self):
+        event_ids = [event.key.id() for event in self.events]
+        self.assertEqual(fan_out_chunk(event_ids), (6, None))
+        self.assertEqual(fan_out_chunk(event_ids), (6, None))
+        timeline = TimelineEntry.query(ancestor=self.followers[0].key).order(TimelineEntry.start_datetime).fetch()
+        self.assertEqual([entry.event for entry in timeline], [event.key for event in self.events[:2]])
+        self.assertEqual(TimelineEntry.query().count(), 6)
+
+    def test_timeline_cleanup(self):
+        fan_out_chunk([event.key.id() for event in self.events])
+        self.assertEqual(delete_timeline_chunk(self.events[0].key), (3, None))
+        self.assertEqual(TimelineEntry.query().count(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from ewentts.text import normalise, split_words, query_tokens, prefix_tokens
+
+
+class NormaliseTest(unittest.TestCase):
+    def test_normalise(self):
+        self.assertEqual(normalise("McDonald"), u"mcdonald")
+        self.assertEqual(normalise(u"Šťastný"), u"stastny")
+        self.assertEqual(normalise("Zoë"), u"zoe")
+
+    def test_fails_with_int(self):
+        with self.assertRaises(ValueError):
+            normalise(1)
+
+    def test_split_words(self):
+        self.assertEqual(split_words(u"O'Brien-Smith 2nd"), [u"o", u"brien", u"smith", u"2nd"])
+
+
+class TokensTest(unittest.TestCase):
+    def test_prefix_tokens(self):
+        self.assertEqual(prefix_tokens(["Ann", u"Žák"]), [u"a", u"an", u"ann", u"z", u"za", u"zak"])
+
+    def test_query_tokens(self):
+        self.assertEqual(query_tokens("ann ANN"), [u"ann"])
+        self.assertEqual(query_tokens("a" * 30), [u"a" * 20])
+        self.assertEqual(query_tokens("--"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,8 @@ from dateutil.parser import parse
 from google.appengine.ext import testbed
 
 from ewentts.models import Event, User
-from ewentts.utils import validate_picture_url, return_event, return_user, validate_location
+from ewentts.utils import validate_picture_url, return_event, return_user, validate_location, status_task_name, \
+    status_task_version
 
 
 class RequestDecodedTokenTestCase(unittest.TestCase):
@@ -185,4 +186,18 @@ class ValidateLocationTest(unittest.TestCase):
         with self.assertRaises(Exception):
             validate_location(*location3)
         with self.assertRaises(Exception):
-            validate_location(*location4)
\ No newline at end of file
+            validate_location(*location4)
+
+
+class StatusTaskNameTest(unittest.TestCase):
+    def test_status_task_version(self):
+        self.assertEqual(status_task_version(parse("1970-01-02T00:00:00")), "86400")
+
+    def test_status_task_name_changes_with_datetime(self):
+        name1 = status_task_name(1234, parse("2100-10-03T10:17:30"))
+        name2 = status_task_name(1234, parse("2100-10-03T10:17:30"))
+        name3 = status_task_name(1234, parse("2100-10-04T10:17:30"))
+
+        self.assertEqual(name1, name2)
+        self.assertNotEqual(name1, name3)
+        self.assertTrue(name1.startswith("1234-"))